@@ -0,0 +1,223 @@
+"""Registro de acciones del host en un fichero binario de solo añadir.
+
+Uso:
+    python actionlog.py logs/mesa1-1234.r5log [--version 120]
+
+Cada acción validada (de un jugador o una transición del host) se guarda con
+la versión del estado sobre la que se aplicó, el jugador, la acción y el punto
+de la secuencia aleatoria del mazo (semilla y número de mezcla). Cada cierto
+número de acciones se guarda también una instantánea completa del estado
+difundido. Para reconstruir una versión se parte de la instantánea anterior
+más cercana y se repiten las acciones que la siguen.
+
+Formato: FILE_HEADER (firma y versión del formato) seguido de registros con
+RECORD_HEADER (tipo, versión, jugador, semilla, mezclas y longitud) y el
+payload en MessagePack.
+"""
+import argparse
+import contextlib
+import os
+import struct
+from constants import ACTION_START_NEW_ROUND, ACTION_END_ROUND
+from network import encode_payload, decode_payload
+from engine import GameEngine
+
+LOG_MAGIC = b'R5AL'
+LOG_FORMAT_VERSION = 1
+LOG_EXTENSION = '.r5log'
+FILE_HEADER = struct.Struct('!4sB')
+RECORD_HEADER = struct.Struct('!BIbQII')
+
+RECORD_ACTION = 1
+RECORD_SNAPSHOT = 2
+
+SYSTEM_PLAYER = -1  # Jugador de las transiciones que decide el host
+SYSTEM_ACTIONS = (ACTION_START_NEW_ROUND, ACTION_END_ROUND)
+DEFAULT_SNAPSHOT_INTERVAL = 100  # Acciones entre instantáneas
+
+
+class ActionLogError(Exception):
+    """Registro ilegible o repetición que no coincide con lo registrado"""
+
+
+class LogRecord:
+    """Un registro leído del fichero"""
+    __slots__ = ('kind', 'version', 'player_id', 'seed', 'shuffles', 'payload')
+
+    def __init__(self, kind, version, player_id, seed, shuffles, payload):
+        self.kind = kind
+        self.version = version
+        self.player_id = player_id
+        self.seed = seed
+        self.shuffles = shuffles
+        self.payload = payload
+
+    def __repr__(self):
+        kind = 'acción' if self.kind == RECORD_ACTION else 'instantánea'
+        return f"LogRecord({kind}, v{self.version}, jugador {self.player_id})"
+
+
+def log_path(directory, name, seed):
+    """Ruta del registro de una partida: <directorio>/<nombre>-<semilla>.r5log"""
+    return os.path.join(directory, f"{name}-{seed}{LOG_EXTENSION}")
+
+
+class ActionLog:
+    """Escritor del registro de una partida (solo en el host)"""
+
+    def __init__(self, path, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.actions_since_snapshot = 0
+        self.has_snapshot = False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(LOG_MAGIC, LOG_FORMAT_VERSION))
+            self.file.flush()
+
+    def _write(self, kind, version, player_id, seed, shuffles, payload):
+        data = encode_payload(payload)
+        # Un solo write por registro y sin flush: el buffer se vuelca con cada instantánea y al
+        # cerrar. Tras un cierre brusco se pierde lo último y como mucho queda cortado un registro
+        self.file.write(RECORD_HEADER.pack(kind, version, player_id, seed, shuffles, len(data)) + data)
+
+    def record(self, engine, action, shuffles):
+        """Añade una acción ya validada. `shuffles` es el contador de mezclas del mazo antes de aplicarla"""
+        player_id = action.get('player_id')
+        if player_id is None:
+            player_id = SYSTEM_PLAYER
+        self._write(RECORD_ACTION, engine.version, player_id, engine.deck.seed, shuffles, action)
+        self.actions_since_snapshot += 1
+
+    def snapshot(self, engine):
+        """Añade una instantánea del estado completo tal y como se ha difundido"""
+        self._write(RECORD_SNAPSHOT, engine.version, SYSTEM_PLAYER, engine.deck.seed,
+                    engine.deck.shuffles, engine.to_dict())
+        self.file.flush()
+        self.actions_since_snapshot = 0
+        self.has_snapshot = True
+
+    def published(self, engine):
+        """Se llama tras difundir una versión: guarda una instantánea si toca"""
+        if not self.has_snapshot or self.actions_since_snapshot >= self.snapshot_interval:
+            self.snapshot(engine)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def read_records(path):
+    """Lee los registros de un fichero. Un último registro cortado (cierre brusco) se ignora"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < FILE_HEADER.size:
+        raise ActionLogError(f"{path}: fichero demasiado corto")
+    magic, format_version = FILE_HEADER.unpack_from(data)
+    if magic != LOG_MAGIC or format_version != LOG_FORMAT_VERSION:
+        raise ActionLogError(f"{path}: no es un registro de acciones compatible")
+    records = []
+    offset = FILE_HEADER.size
+    while offset + RECORD_HEADER.size <= len(data):
+        kind, version, player_id, seed, shuffles, length = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        if start + length > len(data):
+            break
+        records.append(LogRecord(kind, version, player_id, seed, shuffles,
+                                 decode_payload(data[start:start + length])))
+        offset = start + length
+    if offset != len(data):
+        print(f"{path}: se ignoran {len(data) - offset} bytes de un registro incompleto al final")
+    return records
+
+
+def replay_action(engine, action):
+    """Aplica una acción registrada al motor y devuelve sus eventos"""
+    if action.get('type') in SYSTEM_ACTIONS:
+        return engine.apply_system(action)
+    return engine.apply(action)
+
+
+class Replayer:
+    """Reconstruye cualquier versión registrada de una partida"""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = read_records(path)
+        self.snapshots = [i for i, record in enumerate(self.records) if record.kind == RECORD_SNAPSHOT]
+        if not self.snapshots:
+            raise ActionLogError(f"{path}: no hay ninguna instantánea de la que partir")
+
+    def latest_version(self):
+        """Última versión que se puede reconstruir"""
+        last = self.records[-1]
+        return last.version + 1 if last.kind == RECORD_ACTION else last.version
+
+    def state_at(self, version=None, verify=True):
+        """Devuelve un GameEngine en la versión pedida (la última si es None).
+
+        Parte de la instantánea más cercana anterior y repite las acciones
+        aplicadas sobre versiones menores. Con verify comprueba que cada acción
+        vuelve a ser válida y que el mazo está en el mismo punto de su secuencia.
+        """
+        if version is None:
+            version = self.latest_version()
+        start = self.snapshots[0]
+        for index in self.snapshots:
+            if self.records[index].version <= version:
+                start = index
+        if self.records[start].version > version:
+            raise ActionLogError(f"La versión {version} es anterior a la primera instantánea")
+        return self.fast_forward(self._restore(self.records[start]), start + 1, version, verify)
+
+    def fast_forward(self, engine, index, version, verify=True):
+        """Repite sobre `engine` las acciones desde el registro `index` hasta alcanzar `version`"""
+        for record in self.records[index:]:
+            if record.version >= version:
+                break
+            if record.kind != RECORD_ACTION:
+                continue
+            if verify and (record.seed, record.shuffles) != (engine.deck.seed, engine.deck.shuffles):
+                raise ActionLogError(f"{record!r}: el mazo está en la mezcla {engine.deck.shuffles} "
+                                     f"de la semilla {engine.deck.seed}, se esperaba la {record.shuffles} "
+                                     f"de la semilla {record.seed}")
+            events = replay_action(engine, record.payload)
+            if verify and not events:
+                raise ActionLogError(f"{record!r}: la acción {record.payload} ya no es válida")
+            engine.version = record.version + 1
+        engine.version = version
+        return engine
+
+    @staticmethod
+    def _restore(record):
+        engine = GameEngine()
+        engine.load_state(record.payload)
+        engine.version = record.version
+        return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye una partida desde su registro de acciones")
+    parser.add_argument('path', help="Fichero .r5log")
+    parser.add_argument('--version', type=int, default=None, help="Versión a reconstruir (la última por defecto)")
+    args = parser.parse_args()
+
+    replayer = Replayer(args.path)
+    actions = sum(1 for record in replayer.records if record.kind == RECORD_ACTION)
+    print(f"{args.path}: {actions} acciones, {len(replayer.snapshots)} instantáneas, "
+          f"versiones hasta la {replayer.latest_version()}, semilla {replayer.records[0].seed}")
+    # El motor anuncia cada jugada por consola: al repetir cientos de ellas solo estorba
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        engine = replayer.state_at(args.version)
+    print(f"Versión {engine.version}: ronda {engine.round_num + 1}, estado {engine.state}, "
+          f"turno del jugador {engine.current_player_idx + 1}")
+    for player in engine.players:
+        print(f"  {player.name}: {len(player.hand)} cartas en la mano, "
+              f"{len(player.combinations)} combinaciones, {player.score} puntos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Microbenchmarks de la lógica de cartas.
+
+Uso:
+    python benchmarks.py
+
+Compara las comprobaciones de seguidillas con VALUES.index(...) (como se hacían
+antes) con las tablas de ranks.py que usan ahora Player y GameEngine, y la
+búsqueda de combinaciones que aceptan una carta con el índice de combinaciones.
+"""
+import random
+import timeit
+from constants import VALUES, SUITS
+from card import Card
+from engine import GameEngine
+from player import Player
+
+REPEAT = 5
+NUMBER = 20000
+
+
+def _legacy_player_can_extend(combination, card):
+    """Rama de seguidillas de Player.can_add_to_combination con búsquedas lineales"""
+    if not all(c.suit == card.suit for c in combination["cards"]):
+        return False
+    indices = sorted([VALUES.index(c.value) for c in combination["cards"]])
+    card_idx = VALUES.index(card.value)
+    diff_before = (indices[0] - card_idx) % len(VALUES)
+    diff_after = (card_idx - indices[-1]) % len(VALUES)
+    return diff_before == 1 or diff_after == 1
+
+
+def _legacy_engine_can_extend(combination, card):
+    """Rama de seguidillas de GameEngine.can_add_to_combination con búsquedas lineales"""
+    suits = [c.suit for c in combination["cards"] if not c.is_joker]
+    if suits and not all(s == card.suit for s in suits):
+        return False
+    indices = [VALUES.index(c.value) if not c.is_joker else None for c in combination["cards"]]
+    card_val = VALUES.index(card.value)
+    for idx, c in enumerate(combination["cards"]):
+        if c.is_joker:
+            left_val = indices[idx - 1] if idx > 0 else None
+            right_val = indices[idx + 1] if idx < len(indices) - 1 else None
+            if (left_val is not None and card_val == left_val + 1) or (right_val is not None and card_val == right_val - 1):
+                return True
+    non_joker_indices = [i for i in indices if i is not None]
+    if not non_joker_indices:
+        return False
+    return card_val == min(non_joker_indices) - 1 or card_val == max(non_joker_indices) + 1
+
+
+def _legacy_engine_can_add(combination, card):
+    """GameEngine.can_add_to_combination antes del índice de combinaciones"""
+    if combination["type"] == "trio":
+        if card.is_joker and len(combination["cards"]) < 4:
+            return True
+        non_joker_values = [c.value for c in combination["cards"] if not c.is_joker]
+        return bool(non_joker_values) and card.value == non_joker_values[0]
+    if card.is_joker:
+        return False
+    return _legacy_engine_can_extend(combination, card)
+
+
+def _legacy_order(cards):
+    """Player._order_circular_sequence con búsquedas lineales"""
+    non_jokers = [c for c in cards if not c.is_joker]
+    indices = [VALUES.index(c.value) for c in non_jokers]
+    best_order, min_disorder = cards, float('inf')
+    for start in indices:
+        rotated = sorted(indices, key=lambda i: (i - start) % len(VALUES))
+        expected = [(rotated[0] + i) % len(VALUES) for i in range(len(rotated))]
+        disorder = sum(abs(a - b) for a, b in zip(rotated, expected))
+        if disorder < min_disorder:
+            min_disorder = disorder
+            best_order = sorted(cards, key=lambda c: (VALUES.index(c.value) - start) % len(VALUES) if not c.is_joker else 999)
+    return best_order
+
+
+def _sample_players(count, seed=500):
+    """Jugadores con una seguidilla de 4 a 7 cartas y una carta candidata del mismo palo"""
+    rng = random.Random(seed)
+    samples = []
+    for i in range(count):
+        suit = rng.choice(SUITS)
+        length = rng.randint(4, 7)
+        low = rng.randrange(len(VALUES) - length + 1)
+        player = Player(i, f"Jugador {i + 1}")
+        player.combinations = [{'type': 'sequence', 'cards': [Card(VALUES[low + j], suit) for j in range(length)]}]
+        samples.append((player, Card(rng.choice(VALUES), suit)))
+    return samples
+
+
+def _best(fn):
+    return min(timeit.repeat(fn, repeat=REPEAT, number=1)) / NUMBER * 1e6
+
+
+def bench_sequence_checks():
+    """Devuelve {nombre: (antes, después)} en microsegundos por llamada"""
+    samples = _sample_players(NUMBER)
+    engine = GameEngine()
+    engine.players = [player for player, _ in samples]
+    return {
+        'Player.can_add_to_combination': (
+            _best(lambda: [_legacy_player_can_extend(p.combinations[0], c) for p, c in samples]),
+            _best(lambda: [p.can_add_to_combination(c, 0) for p, c in samples])),
+        'GameEngine.can_add_to_combination': (
+            _best(lambda: [_legacy_engine_can_extend(p.combinations[0], c) for p, c in samples]),
+            _best(lambda: [engine.can_add_to_combination(c, 0, p.id) for p, c in samples])),
+        'Player._order_circular_sequence': (
+            _best(lambda: [_legacy_order(p.combinations[0]['cards']) for p, _ in samples]),
+            _best(lambda: [p._order_circular_sequence(p.combinations[0]['cards']) for p, _ in samples])),
+    }
+
+
+def bench_combination_targets(num_players=6, combos_per_player=4, seed=500):
+    """Combinaciones que aceptan cada carta de una mano, como hace la interfaz en cada frame.
+
+    Antes: can_add_to_combination por cada (jugador, combinación). Después: el índice.
+    Devuelve {nombre: (antes, después)} en microsegundos por carta consultada.
+    """
+    rng = random.Random(seed)
+    engine = GameEngine()
+    for i in range(num_players):
+        player = Player(i, f"Jugador {i + 1}")
+        for _ in range(combos_per_player):
+            if rng.random() < 0.5:
+                value = rng.choice(VALUES)
+                cards = [Card(value, rng.choice(SUITS)) for _ in range(3)]
+                player.combinations.append({'type': 'trio', 'cards': cards})
+            else:
+                suit = rng.choice(SUITS)
+                low = rng.randrange(len(VALUES) - 4)
+                cards = [Card(VALUES[low + j], suit) for j in range(4)]
+                player.combinations.append({'type': 'sequence', 'cards': cards})
+        engine.players.append(player)
+    hand = [Card.get(rng.randrange(52)) for _ in range(NUMBER)]
+
+    def legacy_scan():
+        for card in hand:
+            [(p_idx, c_idx) for p_idx, player in enumerate(engine.players)
+             for c_idx, combination in enumerate(player.combinations)
+             if _legacy_engine_can_add(combination, card)]
+
+    engine.combination_index()
+    return {
+        f'combinaciones que aceptan una carta ({num_players}x{combos_per_player})': (
+            _best(legacy_scan),
+            _best(lambda: [engine.combination_targets(card) for card in hand])),
+    }
+
+
+def main():
+    print(f"{'Comprobación':48} {'antes (us)':>12} {'después (us)':>14}")
+    results = bench_sequence_checks()
+    results.update(bench_combination_targets())
+    for name, (before, after) in results.items():
+        print(f"{name:48} {before:12.2f} {after:14.2f}")
+
+
+if __name__ == "__main__":
+    main()
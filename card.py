@@ -1,75 +1,118 @@
 import random
 from constants import SUITS, VALUES, CARD_VALUES
+from delta import apply_op
+from ranks import VALUE_RANK, SUIT_INDEX
+
+# Cada carta de una baraja se identifica con un entero de 0 a 53:
+# palo * 13 + índice del valor para las cartas normales y 52/53 para los dos comodines.
+# En partidas con varias barajas, uid = índice de baraja * 54 + código.
+CARDS_PER_DECK = len(SUITS) * len(VALUES) + 2
+JOKER_CODES = (CARDS_PER_DECK - 2, CARDS_PER_DECK - 1)
+
+# Conversión de palos a códigos seguros para JSON y viceversa
+SUIT_TO_SAFE = {'♠': 'S', '♥': 'H', '♦': 'D', '♣': 'C', None: ''}
+SAFE_TO_SUIT = {safe: suit for suit, safe in SUIT_TO_SAFE.items()}
+
+# En la red cada carta ocupa un byte: el código en los 6 bits bajos y el bit 7
+# indica si está boca arriba. El índice de baraja no viaja porque las copias
+# de distintas barajas son equivalentes para el juego.
+FACE_UP_BIT = 0x80
+CODE_MASK = 0x3F
+
+# Cada mezcla del mazo usa su propio generador, derivado de la semilla del mazo y
+# del número de mezcla: con (seed, shuffles) se puede regenerar cualquier reparto
+# sin repetir las mezclas anteriores.
+SEED_BITS = 64
+SHUFFLE_COUNTER_BITS = 32
+_seed_source = random.SystemRandom()
+
+
+def new_seed():
+    """Semilla aleatoria para un mazo nuevo (no toca el generador global)"""
+    return _seed_source.getrandbits(SEED_BITS)
+
+
+def card_code(value, suit=None):
+    """Devuelve el código entero (0-53) de una carta"""
+    if value == 'JOKER':
+        return JOKER_CODES[0]
+    return SUIT_INDEX[suit] * len(VALUES) + VALUE_RANK[value]
+
 
 class Card:
-    def __init__(self, value, suit=None):
-        self.value = value
-        self.suit = suit
-        self.is_joker = (value == 'JOKER')
-        self.face_up = False
-        
-        # Calcular el valor en puntos de la carta
-        if self.is_joker:
-            self.points = CARD_VALUES['JOKER']
-        else:
-            self.points = CARD_VALUES[value]
-    
+    """Carta inmutable. Solo existe una instancia por uid y todas las zonas la comparten."""
+    __slots__ = ('uid', 'code', 'deck_index', 'value', 'suit', 'is_joker', 'points', 'rank')
+
+    _table = {}
+
+    def __new__(cls, value, suit=None, deck_index=0):
+        return cls.get(card_code(value, suit), deck_index)
+
+    def __init__(self, value, suit=None, deck_index=0):
+        # Los atributos se fijan una sola vez en get(); aquí no hay nada que hacer
+        pass
+
+    @classmethod
+    def get(cls, code, deck_index=0):
+        """Devuelve la instancia compartida de la carta con ese código y baraja"""
+        uid = deck_index * CARDS_PER_DECK + code
+        card = cls._table.get(uid)
+        if card is None:
+            card = object.__new__(cls)
+            is_joker = code in JOKER_CODES
+            if is_joker:
+                value, suit, rank = 'JOKER', None, -1
+            else:
+                value = VALUES[code % len(VALUES)]
+                suit = SUITS[code // len(VALUES)]
+                rank = code % len(VALUES)
+            for name, attr in (('uid', uid), ('code', code), ('deck_index', deck_index),
+                               ('value', value), ('suit', suit), ('is_joker', is_joker),
+                               ('points', CARD_VALUES[value]), ('rank', rank)):
+                object.__setattr__(card, name, attr)
+            cls._table[uid] = card
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Las cartas son inmutables")
+
+    def __reduce__(self):
+        # Al deserializar se recupera la instancia compartida en lugar de crear otra
+        return (Card.get, (self.code, self.deck_index))
+
     def __str__(self):
         if self.is_joker:
             return "🃏"
         return f"{self.value}{self.suit}"
-    
-    def __eq__(self, other):
-        if not isinstance(other, Card):
-            return False
-        if self.is_joker or other.is_joker:
-            return False
-        return self.value == other.value and self.suit == other.suit
-    
-    def flip(self):
-        self.face_up = not self.face_up
-        
-    def to_dict(self):
-        # Convertir los palos a códigos seguros para JSON
-        suit_map = {
-            '♠': 'S',
-            '♥': 'H',
-            '♦': 'D',
-            '♣': 'C',
-            None: ''
-        }
-        
-        safe_suit = suit_map.get(self.suit, '')
-        
-        # Asegurarse de que todos los valores son serializables
+
+    def __repr__(self):
+        return f"Card({self})"
+
+    def to_dict(self, face_up=True):
+        # La carta no guarda si está boca arriba: depende de la zona en la que esté.
+        # Los puntos se deducen de la carta y no se incluyen
         return {
-            'value': str(self.value) if self.value else "",
-            'suit': safe_suit,
-            'is_joker': bool(self.is_joker),
-            'face_up': bool(self.face_up),
-            'points': int(self.points)
+            'value': str(self.value),
+            'suit': SUIT_TO_SAFE[self.suit],
+            'is_joker': self.is_joker,
+            'face_up': face_up
         }
-    
+
+    def to_byte(self, face_up=True):
+        """Codifica la carta en un byte"""
+        return self.code | FACE_UP_BIT if face_up else self.code
+
+    @staticmethod
+    def from_byte(byte):
+        """Devuelve la carta compartida codificada en un byte"""
+        return Card.get(byte & CODE_MASK)
+
     @staticmethod
     def from_dict(data):
-        # Convertir los códigos seguros de vuelta a palos Unicode
-        suit_map = {
-            'S': '♠',
-            'H': '♥',
-            'D': '♦',
-            'C': '♣',
-            '': None
-        }
-        
-        value = data['value']
-        suit = suit_map.get(data['suit'], data['suit'])
-        
-        card = Card(value, suit)
-        card.is_joker = bool(data['is_joker'])
-        card.face_up = bool(data['face_up'])
-        card.points = int(data['points'])
-        return card
-    
+        # Las copias de distintas barajas son equivalentes para el juego
+        suit = SAFE_TO_SUIT.get(data['suit'], data['suit'])
+        return Card(data['value'], suit)
+
     def __hash__(self):
         return hash((self.value, self.suit, self.is_joker))
 
@@ -79,24 +122,65 @@ class Card:
         return self.value == other.value and self.suit == other.suit and self.is_joker == other.is_joker
 
 
+class PackedCards:
+    """Secuencia de cartas empaquetada a un byte por carta para enviarla por la red"""
+    __slots__ = ('data',)
+
+    def __init__(self, data=b''):
+        self.data = bytes(data)
+
+    @staticmethod
+    def pack(cards, face_up=True):
+        return PackedCards(card.to_byte(face_up) for card in cards)
+
+    def unpack(self):
+        return [Card.from_byte(byte) for byte in self.data]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __eq__(self, other):
+        return isinstance(other, PackedCards) and self.data == other.data
+
+    def __hash__(self):
+        return hash(self.data)
+
+    def __repr__(self):
+        return f"PackedCards({self.data.hex()})"
+
+
 class Deck:
-    def __init__(self, num_decks=1):
+    _uids = {}  # num_decks -> uids de todas las cartas en orden
+
+    def __init__(self, num_decks=1, seed=None, shuffled=True):
         self.cards = []
         self.num_decks = num_decks
-        self.reset()
+        self.hidden_count = 0  # Cartas que un cliente sabe que hay pero no conoce
+        self.seed = new_seed() if seed is None else seed
+        self.shuffles = 0      # Mezclas hechas con esta semilla
+        if shuffled:
+            self.reset()  # Sin mezclar, el mazo empieza vacío (p. ej. para rellenarlo desde la red)
 
     def reset(self):
-        self.cards = []
-        for _ in range(self.num_decks):
-            for suit in SUITS:
-                for value in VALUES:
-                    self.cards.append(Card(value, suit))
-            self.cards.append(Card('JOKER'))
-            self.cards.append(Card('JOKER'))
-        self.shuffle()
+        uids = Deck._uids.get(self.num_decks)
+        if uids is None:
+            uids = Deck._uids[self.num_decks] = tuple(range(self.num_decks * CARDS_PER_DECK))
+        self.cards = self._shuffled(list(uids))
 
     def shuffle(self):
-        random.shuffle(self.cards)
+        """Mezcla las cartas que haya en el mazo (p. ej. el descarte al agotarse)"""
+        self.cards = self._shuffled([card.uid for card in self.cards])
+
+    def rng(self, shuffle_num):
+        """Generador de la mezcla número shuffle_num de este mazo"""
+        return random.Random((self.seed << SHUFFLE_COUNTER_BITS) | shuffle_num)
+
+    def _shuffled(self, uids):
+        # Se mezclan enteros y se convierten a cartas al final con la tabla de instancias
+        self.rng(self.shuffles).shuffle(uids)
+        self.shuffles += 1
+        table = Card._table
+        return [table.get(uid) or Card.get(uid % CARDS_PER_DECK, uid // CARDS_PER_DECK) for uid in uids]
     
     def deal(self, num_cards=1):
         if num_cards > len(self.cards):
@@ -104,36 +188,64 @@ class Deck:
         
         dealt_cards = []
         for _ in range(num_cards):
-            card = self.cards.pop()
-            card.face_up = True
-            dealt_cards.append(card)
+            dealt_cards.append(self.cards.pop())
         
         return dealt_cards if num_cards > 1 else dealt_cards[0]
     
     def __len__(self):
-        return len(self.cards)
+        return len(self.cards) + self.hidden_count
     
     def to_dict(self):
         return {
-            'cards': [card.to_dict() for card in self.cards],
-            'num_decks': self.num_decks
+            'cards': PackedCards.pack(self.cards, face_up=False),
+            'num_decks': self.num_decks,
+            'hidden_count': self.hidden_count,
+            'seed': self.seed,
+            'shuffles': self.shuffles
         }
 
+    @staticmethod
+    def hide_cards(data):
+        """Versión del mazo serializado que ven los jugadores: solo el número de cartas.
+        La semilla tampoco se envía, porque con ella se podría predecir el mazo"""
+        view = dict(data)
+        view['hidden_count'] = len(view.pop('cards')) + data.get('hidden_count', 0)
+        view.pop('seed', None)
+        view.pop('shuffles', None)
+        return view
+
     
+    def apply_patch(self, op):
+        """Aplica una diferencia recibida del host sin reconstruir el mazo"""
+        for key, field_op in op[1].items():
+            if key == 'cards':
+                self.cards[:] = apply_op(PackedCards.pack(self.cards, face_up=False), field_op).unpack()
+            else:
+                setattr(self, key, apply_op(getattr(self, key, None), field_op))
+
+    def update_from_dict(self, data):
+        """Actualiza el mazo en el sitio con su estado completo"""
+        self.num_decks = data.get('num_decks', 1)
+        self.cards[:] = data['cards'].unpack() if 'cards' in data else []
+        self.hidden_count = data.get('hidden_count', 0)
+        if 'seed' in data:
+            self.seed = data['seed']
+        self.shuffles = data.get('shuffles', 0)
+
     @staticmethod
     def from_dict(data):
-        num_decks = data.get('num_decks', 1)
-        deck = Deck(num_decks=num_decks)
-        deck.cards = [Card.from_dict(card_data) for card_data in data['cards']]
+        # Sin mezclar: las cartas vienen en data
+        deck = Deck(num_decks=data.get('num_decks', 1), seed=data.get('seed'), shuffled=False)
+        deck.update_from_dict(data)
         return deck
 
 
 class DiscardPile:
     def __init__(self):
         self.cards = []
+        self.hidden_count = 0  # Cartas bajo las visibles que un cliente no conoce
     
     def add(self, card):
-        card.face_up = True
         self.cards.append(card)
     
     def take(self):
@@ -147,15 +259,38 @@ class DiscardPile:
         return self.cards[-1]
     
     def __len__(self):
-        return len(self.cards)
+        return len(self.cards) + self.hidden_count
     
     def to_dict(self):
         return {
-            'cards': [card.to_dict() for card in self.cards]
+            'cards': PackedCards.pack(self.cards),
+            'hidden_count': self.hidden_count
+        }
+
+    @staticmethod
+    def hide_cards(data):
+        """Versión del descarte serializado que ven los jugadores: la carta superior y el número de cartas"""
+        packed = data['cards'].data
+        return {
+            'cards': PackedCards(packed[-1:]),
+            'hidden_count': max(len(packed) - 1, 0) + data.get('hidden_count', 0)
         }
     
+    def apply_patch(self, op):
+        """Aplica una diferencia recibida del host sin reconstruir el descarte"""
+        for key, field_op in op[1].items():
+            if key == 'cards':
+                self.cards[:] = apply_op(PackedCards.pack(self.cards), field_op).unpack()
+            else:
+                setattr(self, key, apply_op(getattr(self, key, None), field_op))
+
+    def update_from_dict(self, data):
+        """Actualiza el descarte en el sitio con su estado completo"""
+        self.cards[:] = data['cards'].unpack()
+        self.hidden_count = data.get('hidden_count', 0)
+
     @staticmethod
     def from_dict(data):
         pile = DiscardPile()
-        pile.cards = [Card.from_dict(card_data) for card_data in data['cards']]
+        pile.update_from_dict(data)
         return pile
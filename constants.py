@@ -37,6 +37,20 @@ SUBTITLE_COLOR = (200, 0, 0) # Un rojo bonito para los subtítulos de las reglas
 # Constantes de red
 DEFAULT_PORT = 5555
 BUFFER_SIZE = 4096
+PROTOCOL_VERSION = 5  # Versión del protocolo de tramas (1: delimitador <END>, 2: cartas como diccionarios, 3: sin sesiones, 4: sin pings)
+MAX_FRAME_SIZE = 16 * 1024 * 1024  # Tamaño máximo aceptado para una trama (16 MB)
+MAX_OUTBOUND_BYTES = 4 * 1024 * 1024  # Bytes pendientes de enviar a un cliente antes de expulsarlo
+MAX_STALLED_STATES = 200  # Estados descartados seguidos sin que el cliente lea nada antes de expulsarlo
+PING_INTERVAL = 2.0  # Segundos entre pings a cada conexión
+IDLE_TIMEOUT = 10.0  # Segundos sin recibir nada (ni pongs) para dar una conexión por caída
+DEGRADED_RTT = 0.5  # RTT medio (s) a partir del cual una conexión se considera degradada
+SESSION_GRACE_PERIOD = 120.0  # Segundos que se reserva el asiento de un cliente desconectado
+SESSION_VIEW_HISTORY = 32  # Vistas enviadas que se guardan por cliente para reanudar con un parche
+RECONNECT_ATTEMPTS = 10  # Intentos del cliente para reanudar la sesión tras un corte
+RECONNECT_DELAY = 1.0  # Segundos antes del primer intento (crece con cada intento, hasta 5 veces)
+COMPRESSION_THRESHOLD = 1024  # Tamaño (bytes) a partir del cual se comprimen las tramas de estado
+COMPRESSION_LEVEL = 6  # Nivel de zlib: 1 gasta menos CPU (LAN), 9 ahorra más bytes (WAN)
+ACTION_LOG_DIR = ''  # Directorio de los registros de acciones del host ('' para no guardarlos)
 
 # Constantes del juego
 CARD_WIDTH = 75
@@ -79,6 +93,10 @@ ACTION_ADD_TO_COMBINATION = 3
 ACTION_DISCARD = 4
 ACTION_REPLACE_JOKER = 5
 
+# Transiciones que decide el host (nunca se aceptan de un jugador)
+ACTION_START_NEW_ROUND = 6
+ACTION_END_ROUND = 7
+
 # Constantes para las reglas
 RULES_BG_ALPHA = 200          # Opacidad del overlay (0-255)
 RULES_PANEL_COLOR = (245, 245, 245)
@@ -0,0 +1,108 @@
+"""Cálculo y aplicación de diferencias entre estados del juego.
+
+Una diferencia es una operación anidada que transforma un estado en otro:
+    ['=', valor]                       sustituye el valor completo
+    ['d', {clave: op}, [eliminadas]]   modifica algunas claves de un diccionario
+    ['l', longitud, [[índice, op]]]    modifica elementos de una lista y la recorta o amplía
+"""
+
+REPLACE = '='
+DICT = 'd'
+LIST = 'l'
+
+
+def diff(old, new):
+    """Devuelve la operación que transforma old en new, o None si son iguales"""
+    if type(old) is dict and type(new) is dict:
+        changes = {}
+        for key, value in new.items():
+            if key in old:
+                op = diff(old[key], value)
+                if op is not None:
+                    changes[key] = op
+            else:
+                changes[key] = [REPLACE, value]
+        removed = [key for key in old if key not in new]
+        if changes or removed:
+            return [DICT, changes, removed]
+        return None
+
+    if type(old) is list and type(new) is list:
+        ops = []
+        common = min(len(old), len(new))
+        for i in range(common):
+            op = diff(old[i], new[i])
+            if op is not None:
+                ops.append([i, op])
+        for i in range(common, len(new)):
+            ops.append([i, [REPLACE, new[i]]])
+        if not ops and len(old) == len(new):
+            return None
+        if new and len(ops) >= len(new):
+            # Ha cambiado todo: es más barato enviar la lista entera
+            return [REPLACE, new]
+        return [LIST, len(new), ops]
+
+    if type(old) is type(new) and old == new:
+        return None
+    return [REPLACE, new]
+
+
+def apply_op(value, op):
+    """Aplica una operación sin modificar value (copia solo lo que cambia)"""
+    kind = op[0]
+    if kind == REPLACE:
+        return op[1]
+    if kind == DICT:
+        result = dict(value)
+        for key, sub_op in op[1].items():
+            result[key] = apply_op(result.get(key), sub_op)
+        for key in op[2]:
+            result.pop(key, None)
+        return result
+    if kind == LIST:
+        length = op[1]
+        result = list(value[:length])
+        result.extend([None] * (length - len(result)))
+        for i, sub_op in op[2]:
+            result[i] = apply_op(result[i], sub_op)
+        return result
+    raise ValueError(f"Operación de diferencia desconocida: {kind}")
+
+
+def patch_list(items, op, build, patch_item=None):
+    """Aplica una operación de lista sobre una lista de objetos, en el sitio.
+
+    build construye un objeto a partir de su diccionario y patch_item, si se
+    indica, modifica un objeto existente con una operación de diccionario.
+    """
+    if op[0] == REPLACE:
+        items[:] = [build(data) for data in op[1]]
+        return
+    length = op[1]
+    del items[length:]
+    items.extend([None] * (length - len(items)))
+    for i, sub_op in op[2]:
+        if sub_op[0] == REPLACE:
+            items[i] = build(sub_op[1])
+        elif patch_item is not None:
+            patch_item(items[i], sub_op)
+        else:
+            items[i] = build(apply_op(items[i].to_dict(), sub_op))
+
+
+def diff_state(old, new):
+    """Construye el parche entre dos estados completos del juego, o None si no hay cambios"""
+    ops = diff(old, new)
+    if ops is None:
+        return None
+    return {
+        'base': old.get('version', 0),
+        'version': new.get('version', 0),
+        'ops': ops
+    }
+
+
+def apply_state_patch(state, patch):
+    """Devuelve el estado resultante de aplicar un parche sobre state"""
+    return apply_op(state, patch['ops'])
@@ -0,0 +1,663 @@
+"""Motor de reglas del juego, sin dependencias de pygame ni de red.
+
+GameEngine guarda el estado de la partida y aplica las acciones de los
+jugadores con apply(action), que devuelve la lista de eventos producidos.
+La red y la interfaz son adaptadores alrededor del motor (ver game.Game).
+"""
+import traceback
+import time
+from constants import *
+from card import Deck, DiscardPile
+from player import Player
+from ranks import VALUE_RANK
+from melds import CombinationIndex
+
+# Eventos que devuelve apply()
+EVENT_DRAW_DECK = 'draw_deck'
+EVENT_DECK_RESHUFFLED = 'deck_reshuffled'
+EVENT_DRAW_DISCARD = 'draw_discard'
+EVENT_DISCARD_OFFERED = 'discard_offered'
+EVENT_DISCARD_OFFER_ENDED = 'discard_offer_ended'
+EVENT_LAY_DOWN = 'lay_down'
+EVENT_ADD_TO_COMBINATION = 'add_to_combination'
+EVENT_DISCARD = 'discard'
+EVENT_TURN_START = 'turn_start'
+EVENT_ROUND_END = 'round_end'
+EVENT_ROUND_START = 'round_start'
+
+
+class GameEngine:
+    def __init__(self, num_players=0, seed=None):
+        self.players = []
+        num_decks = max(1, (num_players + 2) // 3)  # 1 mazo por cada 3 jugadores
+        # La semilla del mazo fija todos los repartos y mezclas de la partida (queda en deck.seed)
+        self.deck = Deck(num_decks=num_decks, seed=seed)
+        self.discard_pile = DiscardPile()
+        self.current_player_idx = 0
+        self.round_num = 0
+        self.state = GAME_STATE_WAITING
+        self.winner = None
+        self.deck_checked = False
+        self.eliminated_players = []
+        self.round_scores = [0 for _ in range(13)]  # Máximo 13 jugadores
+        self.round_winner = None
+        self.rejected_discard = []             # Jugadores que rechazaron la carta del descarte inicial
+        self.discard_offer = False     # Inicialmente no hay oferta de descarte
+        self.discard_offered_to = -1           # Nadie tiene la oferta inicialmente
+        self.discard_origin_player = -1        # No hay jugador origen inicialmente
+        self.version = 0                       # Versión del estado (la incrementa quien lo difunde)
+        self.events = []                       # Eventos producidos por la acción en curso
+        self._applying = False                 # Dentro de apply (la acción de un jugador)
+        self._combination_index = None         # Combinaciones por cartas admitidas (ver combination_index)
+        self.action_log = None                 # Registro de acciones (actionlog.ActionLog) en el host
+
+    def _emit(self, event_type, **data):
+        """Registra un evento de la acción en curso"""
+        data['type'] = event_type
+        self.events.append(data)
+
+    def start_game(self, num_players, deal=True):
+        """Crea los jugadores y reparte. Devuelve las cartas repartidas a cada jugador.
+
+        Con deal=False las cartas no se añaden a las manos (la interfaz las
+        añade después de animar el reparto).
+        """
+        for i in range(num_players):
+            self.players.append(Player(i, f"Jugador {i+1}"))
+
+        # Designar el primer "mano"
+        self.players[0].is_mano = True
+
+        if not self.deck_checked:
+            self.check_deck_duplicates("Inicio juego → ")
+            self.deck_checked = True
+
+        # Preparar cartas a repartir
+        cards_to_deal = []
+        for player in self.players:
+            cards = self.deck.deal(10)
+            cards_to_deal.append(cards)
+            if deal:
+                player.add_to_hand(cards)
+
+        # Colocar la primera carta en el descarte
+        self.discard_pile.add(self.deck.deal())
+
+        # Establecer el estado del juego
+        self.state = GAME_STATE_PLAYING
+        self.invalidate_combination_index()
+        self._emit(EVENT_ROUND_START, round_num=self.round_num)
+        return cards_to_deal
+
+    def start_new_round(self):
+        """Inicia una nueva ronda"""
+        # Incrementar el número de ronda
+        self.round_num = (self.round_num + 1) % len(ROUNDS)
+
+        # Reiniciar el mazo y el descarte
+        self.deck.reset()
+        self.deck_checked = False  # Para volver a permitir validación
+        self.check_deck_duplicates(f"Ronda {self.round_num + 1} → ")
+        self.discard_pile = DiscardPile()
+        self.sequences_laid_down = 0
+        self.trios_laid_down = 0
+        self.discard_offer = False  # No iniciar oferta automáticamente
+        self.rejected_discard = []
+        self.discard_offered_to = self.current_player_idx  # El jugador actual es el primero en decidir
+        self.discard_origin_player = self.current_player_idx  # El jugador actual es el origen
+
+        # Reiniciar los jugadores
+        for player in self.players:
+            player.has_laid_down_trio = False
+            player.has_laid_down_sequence = False
+            player.sequences_laid_down = 0
+            player.trios_laid_down = 0
+            player.hand = []
+            player.combinations = []
+            player.has_laid_down = False
+            player.took_discard = False
+            player.took_penalty = False
+            player.has_completed_round_requirement = False  # Reset round requirement
+
+        # Designar el nuevo "mano" (el ganador de la ronda anterior)
+        for i, player in enumerate(self.players):
+            player.is_mano = (i == self.current_player_idx)
+
+        # Repartir cartas
+        for player in self.players:
+            player.add_to_hand(self.deck.deal(10))
+
+        # Colocar la primera carta en el descarte
+        self.discard_pile.add(self.deck.deal())
+
+        # Establecer el estado del juego
+        self.state = GAME_STATE_PLAYING
+        self.invalidate_combination_index()
+        self._emit(EVENT_ROUND_START, round_num=self.round_num)
+
+    def apply(self, action):
+        """Aplica la acción de un jugador si es válida y devuelve los eventos que produjo"""
+        self.events = []
+        shuffles = self.deck.shuffles
+        self._applying = True
+        try:
+            self._dispatch(action)
+        finally:
+            self._applying = False
+        events, self.events = self.events, []
+        if events and self.action_log is not None:
+            self.action_log.record(self, action, shuffles)
+        return events
+
+    def _dispatch(self, action):
+        """Ejecuta la acción de un jugador; los eventos quedan en self.events"""
+        action_type = action.get('type')
+        player_id = action.get('player_id')
+
+        if action_type == ACTION_DRAW_DECK:
+            if self.current_player_idx == player_id:
+                self.draw_from_deck()
+                self.check_and_end_round()
+
+        elif action_type == 'reject_discard':
+            self.reject_discard(player_id)
+
+        elif action_type == ACTION_DRAW_DISCARD:
+            if self.current_player_idx == player_id:
+                self.draw_from_discard(action.get('is_penalty', False))
+                self.check_and_end_round()
+
+        elif action_type == 'take_discard_penalty':
+            # Permitir que el jugador tome del descarte con penalización durante la oferta
+            if self.discard_offer and self.discard_offered_to == player_id:
+                self.draw_from_discard(is_penalty=True)
+                self.check_and_end_round()
+
+        elif action_type == ACTION_PLAY_COMBINATION:
+            if self.current_player_idx == player_id:
+                self.lay_down()
+                self.check_and_end_round()
+
+        elif action_type == ACTION_ADD_TO_COMBINATION:
+            self.add_card_to_combination(
+                action['card_idx'],
+                action['combination_idx'],
+                action.get('target_player_idx'),
+                actor_idx=player_id
+            )
+            self.check_and_end_round()
+
+        elif action_type == ACTION_DISCARD:
+            if self.current_player_idx == player_id:
+                self.discard(action['card_idx'])
+                self.check_and_end_round()
+
+    def apply_system(self, action):
+        """Aplica una transición que decide el host (nueva ronda o fin de ronda) y devuelve sus eventos.
+
+        Se llama a los métodos de GameEngine directamente para que las
+        subclases que los redefinen puedan usar apply_system desde ellos.
+        Si se llega aquí desde la acción de un jugador (p. ej. la jugada que
+        gana la ronda), la transición forma parte de esa acción: sus eventos
+        se añaden a los de la acción y solo se registra la acción del jugador.
+        """
+        nested = self._applying
+        start = len(self.events) if nested else 0
+        if not nested:
+            self.events = []
+        shuffles = self.deck.shuffles
+        action_type = action.get('type')
+
+        if action_type == ACTION_START_NEW_ROUND:
+            GameEngine.start_new_round(self)
+        elif action_type == ACTION_END_ROUND:
+            if self.state == GAME_STATE_PLAYING:
+                GameEngine.end_round(self, action.get('winner'))
+
+        if nested:
+            return self.events[start:]
+        events, self.events = self.events, []
+        if events and self.action_log is not None:
+            self.action_log.record(self, action, shuffles)
+        return events
+
+    def draw_from_deck(self):
+        """El jugador actual toma una carta del mazo"""
+        if self.state != GAME_STATE_PLAYING:
+            return False
+
+        player = self.players[self.current_player_idx]
+
+        # Verificar si el jugador ya tomó una carta
+        if player.took_discard or player.took_penalty:
+            return False
+
+        # Tomar una carta del mazo
+        card = self.deck.deal()
+        if not card:
+            # Si el mazo está vacío, mezclar el descarte (excepto la carta superior)
+            if len(self.discard_pile.cards) <= 1:
+                return False
+
+            top_card = self.discard_pile.take()
+            self.deck.cards = self.discard_pile.cards
+            self.discard_pile.cards = []
+            if top_card:
+                self.discard_pile.add(top_card)
+            self.deck.shuffle()
+            self._emit(EVENT_DECK_RESHUFFLED)
+
+            # Intentar de nuevo
+            card = self.deck.deal()
+            if not card:
+                return False
+
+        player.add_to_hand(card)
+        player.took_penalty = True  # Marcar que el jugador tomó una carta
+
+        # Terminar la fase de oferta si estaba activa
+        self.discard_offer = False
+        self.discard_offered_to = -1
+        self.discard_origin_player = -1
+
+        print(f"[HOST] Jugador {self.current_player_idx} tomó del mazo")
+        self._emit(EVENT_DRAW_DECK, player_id=self.current_player_idx)
+        return True
+
+    def draw_from_discard(self, is_penalty=False):
+        """Toma la carta superior del descarte: el jugador actual o, durante la oferta, el que la tiene"""
+        if self.state != GAME_STATE_PLAYING:
+            return False
+
+        # Determinar el jugador que toma la carta
+        if self.discard_offer:
+            player = self.players[self.discard_offered_to]
+        else:
+            player = self.players[self.current_player_idx]
+
+        # Verificar si el jugador ya tomó una carta
+        if player.took_discard or player.took_penalty:
+            print("[DEBUG] El jugador ya tomó una carta este turno.")
+            return False
+
+        # Tomar la carta superior del descarte
+        card = self.discard_pile.take()
+        if card:
+            player.add_to_hand(card)
+            print(f"[DEBUG] {player} tomó la carta del descarte: {card}")
+        else:
+            print("[DEBUG] No hay carta en el descarte para tomar.")
+            return False
+
+        if self.discard_offer:
+            if is_penalty:
+                # Penalización: toma carta extra del mazo
+                penalty_card = self.deck.deal()
+                if penalty_card:
+                    player.add_to_hand(penalty_card)
+                    print(f"[DEBUG] {player} tomó carta de penalización del mazo: {penalty_card}")
+                player.took_penalty = True
+                player.took_discard = False
+            else:
+                player.took_discard = True
+                player.took_penalty = False
+
+            # Terminar la fase de oferta
+            self.discard_offer = False
+            self.rejected_discard = []
+            self.discard_offered_to = -1
+            self.discard_origin_player = -1
+
+            # Si tomó con penalización y no era el mano, darle el turno
+            if is_penalty and self.current_player_idx != self.players.index(player):
+                self.current_player_idx = self.players.index(player)
+                for p in self.players:
+                    p.is_mano = False
+                player.is_mano = True
+        else:
+            player.took_discard = True
+            player.took_penalty = False
+
+        print(f"[HOST] Jugador {self.current_player_idx} tomó del descarte{' (con penalización)' if is_penalty else ''}")
+        self._emit(EVENT_DRAW_DISCARD, player_id=player.id, is_penalty=is_penalty)
+        return True
+
+    def reject_discard(self, player_id):
+        """Un jugador rechaza la carta del descarte: el mano inicia la oferta y los demás la pasan"""
+        # Si es el jugador MANO iniciando la oferta
+        if self.current_player_idx == player_id and not self.discard_offer:
+            print(f"[HOST] Iniciando fase de oferta desde jugador MANO")
+            self.discard_offer = True
+            self.rejected_discard = [player_id]
+            self.discard_origin_player = player_id
+            self.discard_offered_to = (player_id + 1) % len(self.players)
+            self.players[self.discard_offered_to].took_discard = False
+            self.players[self.discard_offered_to].took_penalty = False
+            print(f"[HOST] Ofreciendo carta al jugador {self.discard_offered_to}")
+            self._emit(EVENT_DISCARD_OFFERED, player_id=self.discard_offered_to)
+            return True
+
+        # Si es otro jugador rechazando durante la oferta
+        if self.discard_offer and self.discard_offered_to == player_id:
+            print(f"[HOST] Jugador {player_id} rechaza durante la oferta")
+            # Asegurarse de agregar SIEMPRE al jugador que rechaza
+            if player_id not in self.rejected_discard:
+                self.rejected_discard.append(player_id)
+                print(f"[HOST] Rechazaron: {self.rejected_discard}")
+
+            # Buscar siguiente jugador elegible
+            current = player_id
+            next_player = (current + 1) % len(self.players)
+            while next_player in self.rejected_discard or next_player == self.discard_origin_player:
+                next_player = (next_player + 1) % len(self.players)
+                if next_player == current:
+                    # Todos los jugadores (excepto el origen) han rechazado
+                    next_player = self.discard_origin_player
+                    break
+
+            # Si volvimos al jugador origen, termina la oferta
+            if next_player == self.discard_origin_player:
+                print("[HOST] Todos rechazaron la carta o volvimos al origen. Terminando fase de oferta.")
+                self.discard_offer = False
+                self.rejected_discard = []
+                self.discard_offered_to = self.discard_origin_player
+                print(f"[HOST] El jugador {self.current_player_idx} debe tomar del mazo")
+                self._emit(EVENT_DISCARD_OFFER_ENDED)
+            else:
+                print(f"[HOST] Ahora se ofrece al jugador {next_player}")
+                self.discard_offered_to = next_player
+                self.players[next_player].took_discard = False
+                self.players[next_player].took_penalty = False
+                self._emit(EVENT_DISCARD_OFFERED, player_id=next_player)
+            return True
+        return False
+
+    def lay_down(self):
+        """El jugador actual baja sus combinaciones"""
+        if self.state != GAME_STATE_PLAYING:
+            return False
+
+        player = self.players[self.current_player_idx]
+
+        # Solo bloquear en ronda 4 (donde debe bajarse todo junto)
+        if self.round_num == 3 and player.has_laid_down:
+            return False
+
+        # Bajar las combinaciones
+        laid_before = len(player.combinations)
+        if not player.lay_down(self.round_num):
+            return False
+        for combination_idx in range(laid_before, len(player.combinations)):
+            self._reindex_combination(self.current_player_idx, combination_idx)
+        self._emit(EVENT_LAY_DOWN, player_id=self.current_player_idx)
+
+        # Verificar si el jugador ha ganado la ronda después de bajarse
+        if self.check_round_win_condition(player):
+            self.end_round(winner_idx=self.current_player_idx)
+        return True
+
+    def add_card_to_combination(self, card_idx, combination_idx, player_idx, actor_idx):
+        """El jugador actor_idx añade una carta de su mano a una combinación de player_idx"""
+        local_player = self.players[actor_idx]
+        target_player = self.players[player_idx if player_idx is not None else actor_idx]
+        target_player_idx = player_idx if player_idx is not None else actor_idx
+        # Validar índices
+        if card_idx < 0 or card_idx >= len(local_player.hand):
+            return False
+        if combination_idx < 0 or combination_idx >= len(target_player.combinations):
+            return False
+
+        card = local_player.hand[card_idx]
+
+        # Validar si la carta puede agregarse usando la función central
+        if not self.can_add_to_combination(card, combination_idx, target_player_idx):
+            return False
+
+        replaced_joker = False
+        if target_player.combinations[combination_idx]["type"] == "sequence":
+            combo_cards = target_player.combinations[combination_idx]["cards"]
+            meta = self.combination_index().meta[(target_player_idx, combination_idx)]
+            indices = [VALUE_RANK[c.value] if not c.is_joker else None for c in combo_cards]
+            card_val = VALUE_RANK[card.value]
+            for idx in meta['jokers']:
+                left_val = indices[idx - 1] if idx > 0 else None
+                right_val = indices[idx + 1] if idx < len(indices) - 1 else None
+                if (left_val is not None and card_val == left_val + 1) or (right_val is not None and card_val == right_val - 1):
+                    # Reemplazar el joker por la carta real
+                    joker_card = combo_cards[idx]
+                    combo_cards[idx] = card
+                    local_player.hand.pop(card_idx)
+                    local_player.add_to_hand(joker_card)
+                    replaced_joker = True
+                    break
+            if not replaced_joker:
+                # Agregar la carta junto al extremo que continúa, sin reordenar la seguidilla
+                naturals = [i for i, c in enumerate(combo_cards) if not c.is_joker]
+                if card_val == meta['low'] - 1:
+                    combo_cards.insert(naturals[0], card)
+                else:
+                    combo_cards.insert(naturals[-1] + 1, card)
+                local_player.hand.pop(card_idx)
+        elif target_player.combinations[combination_idx]["type"] == "trio":
+            combo_cards = target_player.combinations[combination_idx]["cards"]
+            # Si la carta es joker y hay menos de 4 cartas, simplemente agregarlo
+            if card.is_joker and len(combo_cards) < 4:
+                target_player.combinations[combination_idx]["cards"].append(card)
+                local_player.hand.pop(card_idx)
+                replaced_joker = True
+            else:
+                # Reemplazar un joker por una carta real
+                non_joker_values = [cc.value for cc in combo_cards if not cc.is_joker]
+                for idx, c in enumerate(combo_cards):
+                    if c.is_joker and non_joker_values and card.value == non_joker_values[0]:
+                        joker_card = combo_cards[idx]
+                        combo_cards[idx] = card
+                        local_player.hand.pop(card_idx)
+                        local_player.add_to_hand(joker_card)
+                        replaced_joker = True
+                        break
+                if not replaced_joker:
+                    # Agregar la carta normalmente
+                    target_player.combinations[combination_idx]["cards"].append(card)
+                    local_player.hand.pop(card_idx)
+        self._reindex_combination(target_player_idx, combination_idx)
+
+        self._emit(EVENT_ADD_TO_COMBINATION, player_id=actor_idx, target_player_idx=target_player_idx,
+                   combination_idx=combination_idx, replaced_joker=replaced_joker)
+
+        # Verificar si ganó la ronda
+        if self.check_round_win_condition(local_player):
+            self.end_round(winner_idx=self.current_player_idx)
+        return True
+
+    def can_add_to_combination(self, card, combination_idx, player_idx):
+        if player_idx < 0 or player_idx >= len(self.players):
+            return False
+
+        target_player = self.players[player_idx]
+
+        if combination_idx < 0 or combination_idx >= len(target_player.combinations):
+            return False
+
+        return self.combination_index().accepts_card(card, player_idx, combination_idx)
+
+    def combination_targets(self, card):
+        """Combinaciones de la mesa (jugador, combinación) a las que se puede añadir la carta"""
+        return self.combination_index().targets(card)
+
+    def combination_index(self):
+        """Índice de combinaciones por cartas admitidas; se reconstruye si está invalidado"""
+        if self._combination_index is None:
+            self._combination_index = CombinationIndex()
+            self._combination_index.rebuild(self.players)
+        return self._combination_index
+
+    def invalidate_combination_index(self):
+        """Llamar cuando cambian las combinaciones por otra vía que no sea el motor (p. ej. un estado recibido)"""
+        self._combination_index = None
+
+    def _reindex_combination(self, player_idx, combination_idx):
+        if self._combination_index is not None:
+            combination = self.players[player_idx].combinations[combination_idx]
+            self._combination_index.update(player_idx, combination_idx, combination)
+
+    def discard(self, card_idx):
+        """El jugador actual descarta una carta"""
+        if self.state != GAME_STATE_PLAYING:
+            return False
+
+        player = self.players[self.current_player_idx]
+
+        # Verificar si el jugador ha tomado una carta
+        if not player.took_discard and not player.took_penalty:
+            return False
+
+        # Verificar si el índice de la carta es válido
+        if card_idx < 0 or card_idx >= len(player.hand):
+            return False
+
+        # Descartar la carta de esa posición (con varias barajas puede haber copias iguales)
+        card = player.hand.pop(card_idx)
+        self.discard_pile.add(card)
+        self._emit(EVENT_DISCARD, player_id=self.current_player_idx)
+
+        # Verificar si el jugador ha ganado la ronda después de descartar
+        if self.check_round_win_condition(player):
+            self.end_round(winner_idx=self.current_player_idx)
+        else:
+            # Pasar al siguiente jugador e iniciar la fase de oferta
+            old_player_idx = self.current_player_idx
+            self.next_player()
+            print(f"[HOST] Jugador {old_player_idx} descartó. Turno del jugador {self.current_player_idx}")
+        return True
+
+    def next_player(self):
+        """Pasa al siguiente jugador"""
+        # Quitar el flag de mano al jugador actual
+        self.players[self.current_player_idx].is_mano = False
+
+        # Avanzar al siguiente jugador
+        self.current_player_idx = (self.current_player_idx + 1) % len(self.players)
+
+        # Asignar el flag de mano al nuevo jugador
+        self.players[self.current_player_idx].is_mano = True
+
+        # Reiniciar flags del jugador
+        player = self.players[self.current_player_idx]
+        player.took_discard = False
+        player.took_penalty = False
+
+        # Iniciar fase de oferta de descarte
+        self.discard_offer = False  # No iniciar oferta automáticamente
+        self.rejected_discard = []
+        self.discard_offered_to = self.current_player_idx  # El jugador actual es el primero en decidir
+        self._emit(EVENT_TURN_START, player_id=self.current_player_idx)
+
+    def check_round_win_condition(self, player):
+        """Verifica si un jugador ha cumplido las condiciones para ganar la ronda"""
+        # El jugador debe tener 0 cartas en la mano Y haber cumplido el requisito de la ronda
+        return player.hand_size() == 0 and player.has_completed_round_requirement
+
+    def end_round(self, winner_idx=None):
+        """Termina la ronda y calcula las puntuaciones"""
+        self.state = GAME_STATE_ROUND_END
+        self.round_winner = winner_idx
+        self.round_transition_ready = False
+
+        # Calcular puntuaciones de la ronda
+        self.round_scores = []
+        for i, player in enumerate(self.players):
+            if i == winner_idx:
+                # El ganador no suma puntos
+                round_points = 0
+            else:
+                # Los demás jugadores suman los puntos de las cartas en su mano
+                round_points = player.calculate_hand_points()
+
+            self.round_scores.append(round_points)
+            # Añadir los puntos al total del jugador
+            player.score += round_points
+
+        print(f"Ronda {self.round_num + 1} terminada. Ganador: Jugador {winner_idx + 1 if winner_idx is not None else 'Ninguno'}")
+        print(f"Puntuaciones de la ronda: {self.round_scores}")
+        self._emit(EVENT_ROUND_END, winner=winner_idx, scores=list(self.round_scores))
+
+    def check_deck_duplicates(self, mensaje=""):
+        seen = set()
+        for card in self.deck.cards:
+            seen.add((card.value, card.suit, id(card)))
+            print(f"{mensaje}Total cartas únicas: {len(seen)} / Total en mazo: {len(self.deck.cards)}")
+
+    def check_and_end_round(self):
+        """Verifica si algún jugador cumplió requisitos y se quedó sin cartas, y termina la ronda si es así."""
+        if self.state != GAME_STATE_PLAYING:
+            return False  # La ronda ya terminó: no volver a sumar puntos
+        for idx, player in enumerate(self.players):
+            if self.check_round_win_condition(player):
+                self.end_round(winner_idx=idx)
+                return True
+        return False
+
+    def analysis_cache_stats(self):
+        """Aciertos y fallos de la caché de análisis de manos de cada jugador"""
+        return [player.analysis_cache.stats() for player in self.players]
+
+    def to_dict(self):
+        """Convierte el estado del juego a un diccionario para enviar por la red"""
+        try:
+            return {
+                'players': [player.to_dict() for player in self.players],
+                'deck': self.deck.to_dict(),
+                'discard_pile': self.discard_pile.to_dict(),
+                'current_player_idx': self.current_player_idx,
+                'round_num': self.round_num,
+                # Copias: el estado difundido no debe cambiar cuando el motor siga jugando
+                'round_scores': list(getattr(self, 'round_scores', [0 for _ in self.players])),
+                'round_winner': getattr(self, 'round_winner', None),
+                'state': self.state,
+                'winner': self.winner.id if self.winner else None,
+                'eliminated_players': [player.id for player in self.eliminated_players],
+                'discard_offer': self.discard_offer,
+                'discard_offered_to': self.discard_offered_to,
+                'discard_origin_player': self.discard_origin_player,
+                'rejected_discard': list(self.rejected_discard),
+                'version': self.version,
+                'timestamp': time.time()
+            }
+        except Exception as e:
+            print(f"Error al convertir el juego a diccionario: {e}")
+            traceback.print_exc()
+            return {}
+
+    def load_state(self, data):
+        """Restaura un estado completo del host (el de to_dict, con el mazo y la semilla)"""
+        self.players = [Player.from_dict(player_data) for player_data in data['players']]
+        self.deck = Deck.from_dict(data['deck'])
+        self.discard_pile = DiscardPile.from_dict(data['discard_pile'])
+        self.current_player_idx = data['current_player_idx']
+        self.round_num = data['round_num']
+        self.round_scores = data.get('round_scores', [0 for _ in self.players])
+        self.round_winner = data.get('round_winner')
+        self.state = data['state']
+        self.winner = next((p for p in self.players if p.id == data['winner']), None)
+        self.eliminated_players = [p for p in self.players if p.id in data['eliminated_players']]
+        self.discard_offer = data.get('discard_offer', False)
+        self.discard_offered_to = data.get('discard_offered_to', -1)
+        self.discard_origin_player = data.get('discard_origin_player', -1)
+        self.rejected_discard = list(data.get('rejected_discard', []))
+        self.version = data.get('version', 0)
+        self.deck_checked = True
+        self.invalidate_combination_index()
+
+    @staticmethod
+    def state_view(state, player_id):
+        """Recorta un estado serializado a lo que puede ver un jugador: su mano,
+        el número de cartas de los rivales y del mazo, y la carta superior del descarte"""
+        view = dict(state)
+        view['players'] = [
+            player if player['id'] == player_id else Player.hide_hand(player)
+            for player in state['players']
+        ]
+        view['deck'] = Deck.hide_cards(state['deck'])
+        view['discard_pile'] = DiscardPile.hide_cards(state['discard_pile'])
+        return view
@@ -399,10 +399,7 @@ def main():
         if network.is_host():
             if hasattr(game, "cards_to_deal"):
                 ui.animate_deal(game)
-                for player, cards in zip(game.players, game.cards_to_deal):
-                    player.add_to_hand(cards)
-                del game.cards_to_deal
-                network.send_game_state(game.to_dict())
+                game.finish_deal()
             network.game_action_handler = game.handle_network_action
     except Exception as e:
         print(f"Error al inicializar el juego: {e}")
@@ -424,11 +421,16 @@ def main():
         screen.fill(BG_COLOR)
         # Asegúrate de usar la fuente 'font' que ya tienes definida en 'main'
         # No redefinir pygame.font.SysFont(None, 32) aquí, ya está arriba.
-        wait_text = font.render("Esperando inicialización del juego...", True, TEXT_COLOR)
+        if network.is_host() or network.game_started:
+            wait_text = font.render("Esperando inicialización del juego...", True, TEXT_COLOR)
+            time_left = int(timeout - (time.time() - wait_start_time))
+            time_text = font.render(f"Tiempo restante: {time_left} segundos", True, TEXT_COLOR)
+        else:
+            # Sentado en la mesa: se espera sin límite a que se llene y el host anuncie el inicio
+            wait_start_time = time.time()
+            wait_text = font.render("Esperando a que empiece la partida...", True, TEXT_COLOR)
+            time_text = font.render("La partida empieza cuando se llene la mesa", True, TEXT_COLOR)
         screen.blit(wait_text, (SCREEN_WIDTH // 2 - wait_text.get_width() // 2, SCREEN_HEIGHT // 2))
-        
-        time_left = int(timeout - (time.time() - wait_start_time))
-        time_text = font.render(f"Tiempo restante: {time_left} segundos", True, TEXT_COLOR)
         screen.blit(time_text, (SCREEN_WIDTH // 2 - time_text.get_width() // 2, SCREEN_HEIGHT // 2 + 40))
         
         conn_text = font.render(f"Conectado: {'Sí' if network.connected else 'No'}", True, TEXT_COLOR)
@@ -442,7 +444,7 @@ def main():
         game_state = network.receive_game_state()
         if game_state is not None:
             print("Estado del juego recibido, iniciando juego...")
-            game.update_from_dict(game_state)
+            game.sync_from_network()
             waiting_for_init = False
         
         for event in pygame.event.get():
@@ -458,6 +460,7 @@ def main():
         screen.blit(error_text, (SCREEN_WIDTH // 2 - error_text.get_width() // 2, SCREEN_HEIGHT // 2))
         pygame.display.flip()
         time.sleep(3)
+        game.close()
         main() # Llama a main() para reiniciar desde el menú principal
         return
     
@@ -476,8 +479,8 @@ def main():
                 if event.type == pygame.MOUSEBUTTONDOWN or event.type == pygame.KEYDOWN:
                     if network.is_host():
                         showing_round_scores = False
+                        # start_new_round difunde el estado una sola vez
                         game.start_new_round()
-                        network.send_game_state(game.to_dict())
                 continue
 
             if event.type == pygame.MOUSEBUTTONDOWN:
@@ -485,9 +488,7 @@ def main():
             game.handle_event(event)
 
         if not network.is_host():
-            game_state = network.receive_game_state()
-            if game_state:
-                game.update_from_dict(game_state)
+            game.sync_from_network()
         
         if game.state != last_game_state:
             if game.state == GAME_STATE_ROUND_END and not showing_round_scores:
@@ -506,9 +507,22 @@ def main():
         game.update()
         screen.fill(BG_COLOR)
         ui.draw(game)
+        link = network.get_link_stats()
+        if link is not None:
+            # Latencia hasta el host (o la del cliente más lento si somos el host)
+            link_color = (255, 0, 0) if link['degraded'] else TEXT_COLOR
+            link_text = font.render(f"Ping {link['rtt_ms']:.0f} ms (±{link['jitter_ms']:.0f})", True, link_color)
+            screen.blit(link_text, (SCREEN_WIDTH - link_text.get_width() - 10, SCREEN_HEIGHT - link_text.get_height() - 10))
+        if network.reconnecting:
+            # El hilo de red está reanudando la sesión: el asiento sigue reservado en el host
+            reconnect_text = font.render("Conexión perdida, reconectando...", True, (255, 0, 0))
+            screen.blit(reconnect_text, (SCREEN_WIDTH // 2 - reconnect_text.get_width() // 2, 20))
         pygame.display.flip()
         clock.tick(FPS)
     
+    # La partida ha terminado o se ha cortado: cerrar su registro de acciones
+    game.close()
+
     if not network.connected:
         error_text = font.render("Conexión perdida. Volviendo al menú principal...", True, (255, 0, 0))
         screen.fill(BG_COLOR)
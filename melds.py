@@ -0,0 +1,498 @@
+"""Análisis de combinaciones (tríos y seguidillas) con máscaras de bits.
+
+Una mano se resume en:
+  - una máscara de 14 bits por palo: el bit r indica que hay una carta de rango r
+    (índice en VALUES) y el bit 13 repite el As para las seguidillas J-Q-K-A;
+  - el número de cartas de cada valor (para los tríos);
+  - los comodines disponibles.
+
+Con esa representación las preguntas "¿hay un trío?" o "¿hay una seguidilla?"
+se responden con operaciones de bits y tablas precalculadas, sin recorrer la
+mano ni buscar índices en listas.
+"""
+import random
+from collections import OrderedDict
+from constants import CARD_VALUES, SUITS, VALUES
+
+NUM_RANKS = len(VALUES)
+ACE_HIGH_BIT = NUM_RANKS       # Posición del As cuando va después del Rey
+MASK_BITS = NUM_RANKS + 1
+TRIO_SIZE = 3
+MIN_SEQUENCE = 4
+
+NUM_CODES = len(SUITS) * NUM_RANKS
+JOKER = -1  # Hueco de una combinación ocupado por un comodín
+
+# Combinaciones exigidas para bajarse en cada ronda (constants.ROUNDS): (tríos, seguidillas)
+ROUND_REQUIREMENTS = [
+    (1, 1),  # Ronda 1: un trío y una seguidilla
+    (0, 2),  # Ronda 2: dos seguidillas
+    (3, 0),  # Ronda 3: tres tríos
+    (2, 1),  # Ronda 4: una seguidilla y dos tríos
+]
+
+RANK_POINTS = [CARD_VALUES[value] for value in VALUES]
+JOKER_POINTS = CARD_VALUES['JOKER']
+
+# Número de bits a 1 de cada máscara de 14 bits
+POPCOUNT = [0] * (1 << MASK_BITS)
+for _mask in range(1, 1 << MASK_BITS):
+    POPCOUNT[_mask] = POPCOUNT[_mask >> 1] + (_mask & 1)
+
+# Tramos de rangos consecutivos (low, high, máscara, máscara de los extremos), de más
+# largo a más corto. Ningún tramo usa el As por los dos lados a la vez.
+RUN_WINDOWS = []
+for _length in range(NUM_RANKS, 0, -1):
+    for _low in range(MASK_BITS - _length + 1):
+        _high = _low + _length - 1
+        RUN_WINDOWS.append((_low, _high, ((1 << _length) - 1) << _low, (1 << _low) | (1 << _high)))
+
+# Para cada máscara, el máximo de cartas que caben en un tramo de MIN_SEQUENCE rangos
+_SHORT_WINDOWS = [w[2] for w in RUN_WINDOWS if w[1] - w[0] + 1 == MIN_SEQUENCE]
+BEST_SHORT_RUN = [max(POPCOUNT[_mask & window] for window in _SHORT_WINDOWS)
+                  for _mask in range(1 << MASK_BITS)]
+
+
+# Mejor tramo para cada (máscara, comodines); se calcula la primera vez que se pide
+_best_runs = {}
+
+
+def best_run(mask, jokers):
+    """Tramo de la máscara que más cartas normales aprovecha con esos comodines.
+
+    Devuelve (cartas normales, -comodines necesarios, low, high) o None. Los
+    extremos del tramo son cartas normales y los huecos se rellenan con comodines.
+    """
+    jokers = min(jokers, NUM_RANKS)
+    key = (mask, jokers)
+    if key in _best_runs:
+        return _best_runs[key]
+    best = None
+    for low, high, window, ends in RUN_WINDOWS:
+        if mask & ends != ends:
+            continue
+        naturals = POPCOUNT[mask & window]
+        needed = max(high - low + 1, MIN_SEQUENCE) - naturals
+        if needed <= jokers and (best is None or (naturals, -needed) > best[:2]):
+            best = (naturals, -needed, low, high)
+    _best_runs[key] = best
+    return best
+
+
+# Huella de una mano: suma de una clave aleatoria de 64 bits por carta. No depende
+# del orden, admite cartas repetidas y se actualiza al sumar o restar una carta.
+FINGERPRINT_MASK = (1 << 64) - 1
+_fingerprint_random = random.Random(500)
+CARD_KEYS = [_fingerprint_random.getrandbits(64) for _ in range(NUM_CODES)]
+JOKER_KEY = _fingerprint_random.getrandbits(64)  # Los dos comodines son equivalentes
+DEFAULT_CACHE_SIZE = 64
+
+
+def card_key(card):
+    return JOKER_KEY if card.is_joker else CARD_KEYS[card.code]
+
+
+def hand_fingerprint(cards):
+    """Huella de un conjunto de cartas (ver card_key)"""
+    return sum(card_key(card) for card in cards) & FINGERPRINT_MASK
+
+
+class AnalysisCache:
+    """Resultados de análisis de manos ya vistas, con expulsión LRU"""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        """Devuelve el resultado guardado para la clave o lo calcula con compute()"""
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        self.misses += 1
+        value = compute()
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+def suit_mask(ranks_mask):
+    """Añade el bit del As alto a una máscara de 13 bits"""
+    return ranks_mask | ((ranks_mask & 1) << ACE_HIGH_BIT)
+
+
+class HandAnalysis:
+    """Representación compacta de una mano para buscar combinaciones.
+
+    Las búsquedas take_* devuelven listas de cartas de la mano y las descuentan
+    de la representación, de modo que se pueden encadenar sin reconstruirla.
+    """
+    __slots__ = ('hand', 'masks', 'counts', 'jokers', 'by_code')
+
+    def __init__(self, hand):
+        masks = [0] * len(SUITS)
+        counts = [0] * NUM_RANKS
+        jokers = []
+        for card in hand:
+            if card.is_joker:
+                jokers.append(card)
+                continue
+            masks[card.code // NUM_RANKS] |= 1 << card.rank
+            counts[card.rank] += 1
+        self.hand = hand
+        self.masks = [suit_mask(mask) for mask in masks]
+        self.counts = counts
+        self.jokers = jokers
+        self.by_code = None  # Cartas agrupadas por código; solo hacen falta al sacar combinaciones
+
+    def has_trio(self):
+        """Hay al menos una carta normal que, con sus iguales y los comodines, forma un trío"""
+        best = max(self.counts)
+        return best > 0 and best + len(self.jokers) >= TRIO_SIZE
+
+    def has_sequence(self):
+        """Hay un palo con MIN_SEQUENCE rangos seguidos completables con los comodines"""
+        jokers = len(self.jokers)
+        for mask in self.masks:
+            best = BEST_SHORT_RUN[mask]
+            if best and best + jokers >= MIN_SEQUENCE:
+                return True
+        return False
+
+    def take_trios(self, count):
+        """Saca hasta `count` tríos, empezando por los valores con más cartas.
+        Cada trío parte de una carta normal: no hay tríos solo de comodines"""
+        trios = []
+        ranks = sorted((r for r in range(NUM_RANKS) if self.counts[r]), key=lambda r: -self.counts[r])
+        for rank in ranks:
+            # Con varias barajas un mismo valor puede dar más de un trío
+            while len(trios) < count and self.counts[rank]:
+                naturals = min(self.counts[rank], TRIO_SIZE)
+                if naturals + len(self.jokers) < TRIO_SIZE:
+                    break
+                trio = self._take_rank(rank, naturals)
+                trio.extend(self._take_jokers(TRIO_SIZE - naturals))
+                trios.append(trio)
+        return trios
+
+    def take_sequences(self, count):
+        """Saca hasta `count` seguidillas, cada vez la que más cartas normales aprovecha"""
+        sequences = []
+        while len(sequences) < count:
+            sequence = self._take_best_sequence()
+            if sequence is None:
+                break
+            sequences.append(sequence)
+        return sequences
+
+    def _take_best_sequence(self):
+        jokers = len(self.jokers)
+        best = None  # (cartas normales, -comodines, palo, low, high)
+        for suit, mask in enumerate(self.masks):
+            if not mask:
+                continue
+            run = best_run(mask, jokers)
+            if run is not None and (best is None or run[:2] > best[:2]):
+                best = (run[0], run[1], suit, run[2], run[3])
+        if best is None:
+            return None
+        _, _, suit, low, high = best
+        sequence = []
+        for position in range(low, high + 1):
+            rank = position % NUM_RANKS
+            if self.masks[suit] >> position & 1:
+                sequence.extend(self._take_code(suit * NUM_RANKS + rank))
+            else:
+                sequence.extend(self._take_jokers(1))
+        # Seguidillas cortas: completar con comodines por arriba, o por abajo si ya llega al As
+        padding = self._take_jokers(MIN_SEQUENCE - len(sequence))
+        if high + len(padding) > ACE_HIGH_BIT:
+            return padding + sequence
+        return sequence + padding
+
+    def _take_rank(self, rank, amount):
+        cards = []
+        for suit in range(len(SUITS)):
+            code = suit * NUM_RANKS + rank
+            while len(cards) < amount and self.masks[suit] >> rank & 1:
+                cards.extend(self._take_code(code))
+        return cards
+
+    def _take_code(self, code):
+        """Saca una carta con ese código y actualiza máscaras y contadores"""
+        if self.by_code is None:
+            self.by_code = {}
+            for card in self.hand:
+                if not card.is_joker:
+                    self.by_code.setdefault(card.code, []).append(card)
+        cards = self.by_code[code]
+        card = cards.pop()
+        rank = card.rank
+        self.counts[rank] -= 1
+        if not cards:
+            del self.by_code[code]
+            suit = code // NUM_RANKS
+            bits = 1 << rank
+            if rank == 0:
+                bits |= 1 << ACE_HIGH_BIT
+            self.masks[suit] &= ~bits
+        return [card]
+
+    def _take_jokers(self, amount):
+        if amount <= 0:
+            return []
+        taken = self.jokers[:amount]
+        del self.jokers[:amount]
+        return taken
+
+
+def solve_requirement(hand, trio_count, sequence_count):
+    """Busca la bajada exacta de `trio_count` tríos y `sequence_count` seguidillas.
+
+    Explora todas las formas de repartir la mano (con memoria de los estados ya
+    vistos) y devuelve (tríos, seguidillas) con las cartas de la mano que dejan
+    menos puntos sin bajar, o None si la mano no cumple el requisito.
+    Los comodines solo completan huecos: un trío lleva comodines hasta tener tres
+    cartas y una seguidilla los lleva entre sus cartas o hasta tener cuatro.
+    Todo trío tiene al menos una carta normal (uno o dos comodines la completan);
+    tres comodines solos no forman trío, como ya pasaba al bajarse antes.
+    """
+    counts = [0] * NUM_CODES
+    jokers = []
+    for card in hand:
+        if card.is_joker:
+            jokers.append(card)
+        else:
+            counts[card.code] += 1
+    result = _search(bytes(counts), len(jokers), trio_count, sequence_count, 0, {})
+    if result is None:
+        return None
+
+    # Pasar de códigos a las cartas concretas de la mano
+    by_code = {}
+    for card in hand:
+        if not card.is_joker:
+            by_code.setdefault(card.code, []).append(card)
+    trios, sequences = [], []
+    plan = result[1]
+    while plan is not None:
+        (kind, codes), plan = plan
+        cards = [jokers.pop() if code == JOKER else by_code[code].pop() for code in codes]
+        (trios if kind == 'trio' else sequences).append(cards)
+    return trios, sequences
+
+
+def _search(counts, jokers, trios_left, sequences_left, start, memo):
+    """Mejor forma de bajar las combinaciones pendientes con las cartas de `counts`.
+
+    Devuelve (puntos bajados, plan) o None. El plan es una lista enlazada
+    ((tipo, códigos), resto). Primero se eligen las seguidillas y después los
+    tríos, siempre en orden creciente (`start`) para no repetir permutaciones.
+    """
+    if not trios_left and not sequences_left:
+        return 0, None
+    key = (counts, jokers, trios_left, sequences_left, start)
+    if key in memo:
+        return memo[key]
+    best = None
+    if _can_still_lay(counts, jokers, trios_left, sequences_left):
+        if sequences_left:
+            kind, options = 'sequence', _sequence_options(counts, jokers, start)
+        else:
+            kind, options = 'trio', _trio_options(counts, jokers, start)
+        for codes, used_jokers, rest, next_start in options:
+            if sequences_left:
+                # Al bajar la última seguidilla se empieza con los tríos desde el primer valor
+                remaining = (trios_left, sequences_left - 1, next_start if sequences_left > 1 else 0)
+            else:
+                remaining = (trios_left - 1, 0, next_start)
+            sub = _search(rest, jokers - used_jokers, *remaining, memo)
+            if sub is None:
+                continue
+            points = sub[0] + used_jokers * JOKER_POINTS + sum(
+                RANK_POINTS[code % NUM_RANKS] for code in codes if code != JOKER)
+            if best is None or points > best[0]:
+                best = (points, ((kind, codes), sub[1]))
+    memo[key] = best
+    return best
+
+
+def _can_still_lay(counts, jokers, trios_left, sequences_left):
+    """Poda: descarta los estados en los que ya no caben las combinaciones pendientes"""
+    if sum(counts) + jokers < trios_left * TRIO_SIZE + sequences_left * MIN_SEQUENCE:
+        return False
+    if trios_left:
+        best = max(sum(counts[rank::NUM_RANKS]) for rank in range(NUM_RANKS))
+        if not best or best + jokers < TRIO_SIZE:
+            return False
+    if sequences_left:
+        if not any(BEST_SHORT_RUN[mask] and BEST_SHORT_RUN[mask] + jokers >= MIN_SEQUENCE
+                   for mask in _suit_masks(counts)):
+            return False
+    return True
+
+
+def _suit_masks(counts):
+    masks = []
+    for suit in range(len(SUITS)):
+        mask = 0
+        for rank in range(NUM_RANKS):
+            if counts[suit * NUM_RANKS + rank]:
+                mask |= 1 << rank
+        masks.append(suit_mask(mask))
+    return masks
+
+
+def _sequence_options(counts, jokers, start):
+    """Seguidillas posibles: (códigos, comodines, cartas restantes, índice del tramo)"""
+    for suit, mask in enumerate(_suit_masks(counts)):
+        for index, (low, high, window, ends) in enumerate(RUN_WINDOWS):
+            option = suit * len(RUN_WINDOWS) + index
+            if option < start or mask & ends != ends:
+                continue
+            naturals = POPCOUNT[mask & window]
+            used_jokers = max(high - low + 1, MIN_SEQUENCE) - naturals
+            if used_jokers > jokers:
+                continue
+            rest = bytearray(counts)
+            codes = []
+            for position in range(low, high + 1):
+                if mask >> position & 1:
+                    code = suit * NUM_RANKS + position % NUM_RANKS
+                    rest[code] -= 1
+                    codes.append(code)
+                else:
+                    codes.append(JOKER)
+            padding = [JOKER] * (used_jokers - codes.count(JOKER))
+            codes = padding + codes if high + len(padding) > ACE_HIGH_BIT else codes + padding
+            # El mismo tramo puede repetirse si quedan copias de otra baraja
+            yield tuple(codes), used_jokers, bytes(rest), option
+
+
+def _trio_options(counts, jokers, start):
+    """Tríos posibles: (códigos, comodines, cartas restantes, valor)"""
+    for rank in range(start, NUM_RANKS):
+        available = [suit * NUM_RANKS + rank for suit in range(len(SUITS))
+                     for _ in range(counts[suit * NUM_RANKS + rank])]
+        # Un trío puede llevar todas las cartas de su valor o dejar algunas para otro trío
+        for naturals in range(len(available), 0, -1):
+            used_jokers = max(0, TRIO_SIZE - naturals)
+            if used_jokers > jokers:
+                break
+            rest = bytearray(counts)
+            for code in available[:naturals]:
+                rest[code] -= 1
+            yield tuple(available[:naturals]) + (JOKER,) * used_jokers, used_jokers, bytes(rest), rank
+
+
+# Claves del índice de combinaciones: una carta concreta (código 0-51), cualquier
+# palo de un valor (NUM_CODES + rango) o un comodín
+ANY_SUIT_KEY = NUM_CODES
+JOKER_ACCEPT_KEY = -1
+
+
+def accept_keys(card):
+    """Claves con las que se busca una carta en el índice de combinaciones"""
+    if card.is_joker:
+        return (JOKER_ACCEPT_KEY,)
+    return (card.code, ANY_SUIT_KEY + card.rank)
+
+
+def describe_combination(combination):
+    """Metadatos de una combinación bajada: tipo, palo, rangos extremos, posiciones
+    de los comodines y las claves (accept_keys) de las cartas que admite.
+
+    Las cartas admitidas siguen las reglas de GameEngine.can_add_to_combination:
+    un trío admite su valor y un comodín mientras tenga menos de cuatro cartas;
+    una seguidilla admite cartas de su palo junto a un comodín (para
+    reemplazarlo) o justo antes o después de sus extremos, sin dar la vuelta.
+    """
+    cards = combination["cards"]
+    jokers = [i for i, card in enumerate(cards) if card.is_joker]
+    naturals = [card for card in cards if not card.is_joker]
+    ranks = [card.rank for card in naturals]
+    meta = {
+        'type': combination["type"],
+        'suit': None,
+        'low': min(ranks) if ranks else None,
+        'high': max(ranks) if ranks else None,
+        'jokers': jokers,
+        'accepts': frozenset()
+    }
+    accepts = set()
+    if combination["type"] == "trio":
+        if len(cards) < 4:
+            accepts.add(JOKER_ACCEPT_KEY)
+        if naturals:
+            accepts.add(ANY_SUIT_KEY + naturals[0].rank)
+    elif combination["type"] == "sequence" and naturals:
+        suit = naturals[0].code // NUM_RANKS
+        if all(card.code // NUM_RANKS == suit for card in naturals):
+            meta['suit'] = SUITS[suit]
+            wanted = {meta['low'] - 1, meta['high'] + 1}
+            for position in jokers:
+                if position > 0 and not cards[position - 1].is_joker:
+                    wanted.add(cards[position - 1].rank + 1)
+                if position < len(cards) - 1 and not cards[position + 1].is_joker:
+                    wanted.add(cards[position + 1].rank - 1)
+            accepts.update(suit * NUM_RANKS + rank for rank in wanted if 0 <= rank < NUM_RANKS)
+    meta['accepts'] = frozenset(accepts)
+    return meta
+
+
+class CombinationIndex:
+    """Índice de todas las combinaciones de la mesa por las cartas que admiten.
+
+    Responde "¿qué combinaciones aceptan esta carta?" con una consulta a un
+    diccionario. Se actualiza combinación a combinación (update) o entero (rebuild).
+    """
+
+    def __init__(self):
+        self.meta = {}      # (jugador, combinación) -> metadatos
+        self.accepts = {}   # clave -> {(jugador, combinación)}
+
+    def rebuild(self, players):
+        self.meta.clear()
+        self.accepts.clear()
+        for player_idx, player in enumerate(players):
+            for combination_idx, combination in enumerate(player.combinations):
+                self.update(player_idx, combination_idx, combination)
+
+    def update(self, player_idx, combination_idx, combination):
+        """Vuelve a indexar una combinación nueva o modificada"""
+        target = (player_idx, combination_idx)
+        old = self.meta.get(target)
+        if old is not None:
+            for key in old['accepts']:
+                self.accepts[key].discard(target)
+        meta = describe_combination(combination)
+        self.meta[target] = meta
+        for key in meta['accepts']:
+            self.accepts.setdefault(key, set()).add(target)
+
+    def accepts_card(self, card, player_idx, combination_idx):
+        meta = self.meta.get((player_idx, combination_idx))
+        return meta is not None and any(key in meta['accepts'] for key in accept_keys(card))
+
+    def targets(self, card):
+        """(jugador, combinación) que aceptan la carta, en orden de la mesa"""
+        found = set()
+        for key in accept_keys(card):
+            found.update(self.accepts.get(key, ()))
+        return sorted(found)
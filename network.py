@@ -1,21 +1,540 @@
 import socket
 import threading
-import msgpack
 import time
+import selectors
+import msgpack
 import traceback
-from constants import DEFAULT_PORT, BUFFER_SIZE
+from constants import (DEFAULT_PORT, MAX_OUTBOUND_BYTES, MAX_STALLED_STATES, SESSION_GRACE_PERIOD, RECONNECT_ATTEMPTS,
+                       RECONNECT_DELAY, PING_INTERVAL, IDLE_TIMEOUT, COMPRESSION_THRESHOLD)
+from collections import deque
+from itertools import islice
+from protocol import (FrameDecoder, ProtocolError, LinkStats, CompressionStats, FLAG_PING, FLAG_PONG, frame_parts,
+                      pong_frame, compress_frame, negotiate_compression, SUPPORTED_COMPRESSION, send_buffers,
+                      consume_buffers, sendall_buffers)
+from delta import diff_state, apply_state_patch
+from card import PackedCards
+from session import SessionTable
+
+# Tipo de extensión de MessagePack para las pilas de cartas empaquetadas
+PACKED_CARDS_EXT = 1
+
+MAX_CLIENTS = 12  # El host es el jugador 0: como mucho 13 jugadores
+
+
+class HandshakeRejected(ConnectionError):
+    """El host rechazó el saludo (partida llena, sesión caducada...)"""
+
+
+def _encode_ext(obj):
+    """Serializa los tipos propios que MessagePack no conoce"""
+    if isinstance(obj, PackedCards):
+        return msgpack.ExtType(PACKED_CARDS_EXT, obj.data)
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def _decode_ext(code, data):
+    """Reconstruye los tipos propios al deserializar"""
+    if code == PACKED_CARDS_EXT:
+        return PackedCards(data)
+    return msgpack.ExtType(code, data)
+
+
+def encode_payload(obj):
+    """Serializa un objeto con MessagePack (incluidas las pilas de cartas empaquetadas)"""
+    return msgpack.packb(obj, use_bin_type=True, default=_encode_ext)
+
+
+def decode_payload(data):
+    """Inverso de encode_payload"""
+    return msgpack.unpackb(data, raw=False, ext_hook=_decode_ext)
+
+
+def pack_message(message):
+    """Serializa un mensaje y devuelve la cabecera y el payload de su trama"""
+    return frame_parts(encode_payload(message))
+
+
+def unpack_message(message_data):
+    """Deserializa el contenido de una trama"""
+    return decode_payload(message_data)
+
+
+class Connection:
+    """Conexión de un cliente atendida por el bucle de eventos del host"""
+
+    def __init__(self, sock, address):
+        self.socket = sock
+        self.address = address
+        self.id = None
+        self.session = None  # Sesión del jugador sentado (ver session.SessionTable)
+        self.link = LinkStats()  # RTT, jitter y tiempo sin recibir nada
+        self.compression = None  # Compresión acordada en el saludo (None: tramas sin comprimir)
+        self.decoder = FrameDecoder()
+        self.outbound = deque()  # Buffers pendientes de escribir en el socket
+        self.outbound_bytes = 0  # Total de bytes en outbound
+        self.closed = False
+        self.closing = False  # Se cerrará en cuanto se envíe lo que tiene en cola
+        self.evicted = False  # Marcada para cerrarse por no leer a tiempo
+        # Solo hay un estado pendiente por conexión: si llega otro antes de que
+        # empiece a escribirse, lo sustituye (gana el más reciente)
+        self.pending_state = None    # (estado, buffers) aún sin pasar a la cola de salida
+        self.committed_state = None  # Estado que tendrá el cliente al recibir lo ya encolado
+        self.dropped_states = 0      # Estados sustituidos antes de enviarse
+        self.stalled_states = 0      # Estados sustituidos seguidos sin que la cola avance
+
+    def queue_depth(self):
+        """Número de buffers y estados pendientes de enviar"""
+        return len(self.outbound) + (1 if self.pending_state is not None else 0)
+
+    def bytes_pending(self):
+        """Bytes pendientes de enviar, incluido el estado pendiente"""
+        pending = 0
+        if self.pending_state is not None:
+            pending = sum(len(buffer) for buffer in self.pending_state[1])
+        return self.outbound_bytes + pending
+
+
+class EventLoopServer:
+    """Atiende todas las conexiones de un socket de escucha desde un único hilo.
+
+    Las lecturas y escrituras son no bloqueantes. Otros hilos solo encolan
+    buffers en la cola de salida de cada conexión y despiertan al bucle, que
+    los escribe con una sola llamada al sistema sin mantener el cerrojo.
+
+    Las colas están acotadas: un cliente que acumula más de max_outbound_bytes
+    o que no lee mientras se le descartan max_stalled_states estados se expulsa.
+
+    Cada ping_interval segundos se envía un ping a cada conexión para medir su
+    RTT; una conexión de la que no llega nada (ni los pongs) en idle_timeout
+    segundos se da por caída y se cierra.
+    """
+
+    MAX_SEND_BUFFERS = 64  # Buffers por llamada a sendmsg
+
+    def __init__(self, listen_socket, on_connect, on_message, on_disconnect,
+                 max_outbound_bytes=MAX_OUTBOUND_BYTES, max_stalled_states=MAX_STALLED_STATES,
+                 ping_interval=PING_INTERVAL, idle_timeout=IDLE_TIMEOUT):
+        self.listen_socket = listen_socket
+        self.on_connect = on_connect
+        self.on_message = on_message
+        self.on_disconnect = on_disconnect
+        self.max_outbound_bytes = max_outbound_bytes
+        self.max_stalled_states = max_stalled_states
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.selector = selectors.DefaultSelector()
+        self.running = False
+        self.lock = threading.Lock()  # Protege las colas de salida
+        self.connections = set()  # Conexiones abiertas
+        self.evictions = 0  # Clientes expulsados por lentos
+        self.dead_peers = 0  # Conexiones cerradas por no recibir nada en idle_timeout
+        self._next_heartbeat = 0.0
+        self._pending_writes = set()  # Conexiones con datos nuevos que escribir
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+
+    def start(self):
+        """Arranca el bucle de eventos en un hilo propio"""
+        self.listen_socket.setblocking(False)
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self.selector.register(self.listen_socket, selectors.EVENT_READ, None)
+        self.selector.register(self._wakeup_recv, selectors.EVENT_READ, self._wakeup_recv)
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        """Detiene el bucle de eventos"""
+        self.running = False
+        self._wakeup()
+
+    def send(self, connection, data):
+        """Encola una trama (bytes o tupla de buffers) para la conexión. Se puede llamar desde cualquier hilo"""
+        buffers = data if isinstance(data, (tuple, list)) else (data,)
+        with self.lock:
+            if connection.closed or connection.closing or connection.evicted:
+                return False
+            size = sum(len(buffer) for buffer in buffers)
+            if connection.bytes_pending() + size > self.max_outbound_bytes:
+                self._evict(connection, f"{connection.bytes_pending()} bytes sin leer")
+            else:
+                for buffer in buffers:
+                    if buffer:
+                        connection.outbound.append(memoryview(buffer))
+                connection.outbound_bytes += size
+            self._pending_writes.add(connection)
+        self._wakeup()
+        return not connection.evicted
+
+    def send_state(self, connection, state, data, base):
+        """Deja un estado pendiente para la conexión, sustituyendo al que hubiera.
+
+        data es la trama que lleva al cliente de base a state (None si no
+        hace falta enviar nada). Si base ya no es el estado comprometido de la
+        conexión, no se encola nada y se devuelve None para que el llamante
+        recalcule la trama. Devuelve False si la conexión está cerrada.
+        base=None indica una trama completa, válida sobre cualquier estado.
+        """
+        with self.lock:
+            if connection.closed or connection.closing or connection.evicted:
+                return False
+            if base is not None and connection.committed_state is not base:
+                return None
+            if connection.pending_state is not None:
+                connection.dropped_states += 1
+                connection.stalled_states += 1
+                if connection.stalled_states > self.max_stalled_states:
+                    self._evict(connection, f"{connection.stalled_states} estados sin leer")
+            if data is None:
+                connection.pending_state = None
+            else:
+                buffers = data if isinstance(data, (tuple, list)) else (data,)
+                connection.pending_state = (state, [memoryview(buffer) for buffer in buffers if buffer])
+            self._pending_writes.add(connection)
+        self._wakeup()
+        return not connection.evicted
+
+    def close(self, connection):
+        """Cierra la conexión cuando termine de enviar lo que tiene en cola. Se puede llamar desde cualquier hilo"""
+        with self.lock:
+            if connection.closed:
+                return
+            connection.closing = True
+            self._pending_writes.add(connection)
+        self._wakeup()
+
+    def drain(self, timeout):
+        """Espera a que se vacíen las colas de salida de todas las conexiones.
+        Devuelve False si pasado timeout todavía quedan datos por enviar"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                pending = sum(connection.bytes_pending() for connection in self.connections)
+            if not pending:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    def _evict(self, connection, reason):
+        """Marca una conexión lenta para que el bucle la cierre. Se llama con el cerrojo adquirido"""
+        if not connection.evicted:
+            print(f"Cliente {connection.id} expulsado por no leer a tiempo: {reason}")
+            connection.evicted = True
+            self.evictions += 1
+
+    def stats(self):
+        """Métricas de cada conexión abierta: cola de salida, RTT, jitter y tiempo sin recibir nada"""
+        now = time.monotonic()
+        with self.lock:
+            return [
+                dict({
+                    'id': connection.id,
+                    'queue_depth': connection.queue_depth(),
+                    'bytes_pending': connection.bytes_pending(),
+                    'dropped_states': connection.dropped_states,
+                    'compression': connection.compression
+                }, **connection.link.to_dict(now))
+                for connection in self.connections
+            ]
+
+    def _wakeup(self):
+        """Despierta al bucle de eventos si está esperando en select"""
+        try:
+            self._wakeup_send.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Ya hay un aviso pendiente o el bucle se está cerrando
+
+    def run(self):
+        """Bucle principal: acepta, lee y escribe según lo que esté listo"""
+        while self.running:
+            # El timeout despierta al bucle para los pings aunque no haya tráfico
+            for key, mask in self.selector.select(timeout=self.ping_interval / 2):
+                if key.data is None:
+                    self._accept()
+                elif key.data is self._wakeup_recv:
+                    self._drain_wakeup()
+                else:
+                    connection = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._read(connection)
+                    if mask & selectors.EVENT_WRITE and not connection.closed:
+                        self._write(connection)
+            self._heartbeat(time.monotonic())
+        for key in list(self.selector.get_map().values()):
+            if isinstance(key.data, Connection):
+                self._close(key.data)
+        self.selector.close()
+
+    def _heartbeat(self, now):
+        """Envía los pings que tocan y cierra las conexiones que ya no responden"""
+        if now < self._next_heartbeat:
+            return
+        self._next_heartbeat = now + self.ping_interval / 2
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            if connection.closed:
+                continue
+            idle = connection.link.idle(now)
+            if idle >= self.idle_timeout:
+                print(f"Cliente {connection.id} sin responder desde hace {idle:.0f} s: se da por caído")
+                self.dead_peers += 1
+                self._close(connection)
+            elif connection.link.should_ping(now, self.ping_interval):
+                self.send(connection, connection.link.ping(now))
+
+    def _accept(self):
+        try:
+            client_socket, address = self.listen_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            print(f"Error al aceptar conexión: {e}")
+            return
+        client_socket.setblocking(False)
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = Connection(client_socket, address)
+        self.selector.register(client_socket, selectors.EVENT_READ, connection)
+        with self.lock:
+            self.connections.add(connection)
+        self.on_connect(connection)
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_recv.recv(1024):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        with self.lock:
+            pending = self._pending_writes
+            self._pending_writes = set()
+        for connection in pending:
+            if connection.evicted:
+                self._close(connection)
+            elif not connection.closed:
+                self._write(connection)
+
+    def _read(self, connection):
+        try:
+            if not connection.decoder.recv_from(connection.socket):
+                self._close(connection)
+                return
+            now = time.monotonic()
+            connection.link.received(now)
+            for flags, message_data in connection.decoder.frames():
+                if flags & FLAG_PING:
+                    self.send(connection, pong_frame(message_data))
+                elif flags & FLAG_PONG:
+                    connection.link.pong(message_data, now)
+                else:
+                    self.on_message(connection, message_data)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except ProtocolError as e:
+            # Cliente con una versión antigua del protocolo: rechazarlo sin más
+            print(f"Cliente {connection.address} rechazado: {e}")
+            self._close(connection)
+        except OSError as e:
+            print(f"Error al leer del cliente {connection.id}: {e}")
+            self._close(connection)
+
+    def _write(self, connection):
+        # Solo este hilo consume la cola, así que la escritura se hace sin el
+        # cerrojo: los demás hilos pueden seguir encolando mientras tanto
+        with self.lock:
+            if not connection.outbound and connection.pending_state is not None:
+                # La cola está vacía: el estado pendiente pasa a escribirse y ya no se sustituye
+                state, buffers = connection.pending_state
+                connection.pending_state = None
+                connection.committed_state = state
+                connection.stalled_states = 0
+                connection.outbound.extend(buffers)
+                connection.outbound_bytes += sum(len(buffer) for buffer in buffers)
+            buffers = list(islice(connection.outbound, self.MAX_SEND_BUFFERS))
+        sent = 0
+        if buffers:
+            try:
+                sent = send_buffers(connection.socket, buffers)
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError as e:
+                print(f"Error al escribir al cliente {connection.id}: {e}")
+                self._close(connection)
+                return
+        with self.lock:
+            consume_buffers(connection.outbound, sent)
+            connection.outbound_bytes -= sent
+            if sent:
+                connection.stalled_states = 0
+            remaining = connection.bytes_pending()
+        if not remaining and connection.closing:
+            self._close(connection)
+            return
+        # Pedir aviso de escritura solo mientras queden bytes pendientes
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if remaining else 0)
+        self.selector.modify(connection.socket, events, connection)
+
+    def _close(self, connection):
+        with self.lock:
+            if connection.closed:
+                return
+            connection.closed = True
+            connection.outbound.clear()
+            connection.outbound_bytes = 0
+            connection.pending_state = None
+            self.connections.discard(connection)
+        try:
+            self.selector.unregister(connection.socket)
+        except (KeyError, ValueError):
+            pass
+        try:
+            connection.socket.close()
+        except OSError:
+            pass
+        self.on_disconnect(connection)
+
+
+class StatePublisher:
+    """Difunde las versiones sucesivas del estado de una partida a sus clientes.
+
+    Cada cliente recibe su propia vista del estado (según state_view) como
+    parche sobre la última que tiene garantizada. Las vistas y sus tramas se
+    construyen y codifican una sola vez por versión: los clientes que se unen
+    tarde, los que reanudan su sesión y los reenvíos reutilizan los mismos bytes.
+    Las tramas de al menos compress_threshold bytes se comprimen, también una
+    sola vez, para los clientes que aceptaron la compresión.
+    """
+
+    def __init__(self, server=None, state_view=None, compress_threshold=COMPRESSION_THRESHOLD):
+        self.server = server
+        self.state_view = state_view  # Función (estado, id) -> vista del estado para un jugador
+        self.compress_threshold = compress_threshold  # None: no se ofrece compresión a los clientes
+        self.compression = CompressionStats()
+        self.game_state = None  # Último estado difundido, tal y como lo da to_dict()
+        self.views = {}  # Vistas del estado actual ya construidas, por ID de jugador
+        # Tramas ya codificadas del estado actual, por (ID de jugador, versión de la base);
+        # la base None es el estado completo. Se descartan al publicar otra versión
+        self.frames = {}
+        self.frame_hits = 0    # Tramas reutilizadas
+        self.frame_misses = 0  # Tramas codificadas
+        # El cálculo de los parches y su envío van juntos para que los
+        # clientes reciban los parches en el mismo orden que las versiones
+        self.lock = threading.Lock()
+
+    def publish(self, game_state, connections):
+        """Difunde un nuevo estado a las conexiones indicadas"""
+        with self.lock:
+            if self.game_state is None or game_state.get('version') != self.game_state.get('version'):
+                self.game_state = game_state
+                self.views = {}
+                self.frames = {}
+            success = True
+            for connection in connections:
+                if not self._send_view(connection):
+                    print(f"Error al enviar el estado al cliente {connection.id}: conexión cerrada")
+                    success = False
+            return success
+
+    def send_snapshot(self, connection):
+        """Envía a un cliente su vista completa del estado actual, si lo hay"""
+        with self.lock:
+            if not self.game_state:
+                return False
+            return self._send_view(connection, snapshot=True)
+
+    def send_catch_up(self, connection, base_view):
+        """Envía a un cliente que reanuda su sesión solo lo que cambió desde base_view,
+        la última vista que tiene. Sin base_view se le envía el estado completo"""
+        with self.lock:
+            if not self.game_state:
+                return False
+            if base_view is None:
+                return self._send_view(connection, snapshot=True)
+            # La conexión es nueva y aún no tiene nada comprometido: su base es lo que ya tiene el cliente
+            connection.committed_state = base_view
+            return self._send_view(connection)
+
+    def _view_for(self, player_id):
+        """Devuelve la vista del estado actual para un jugador, construyéndola una sola vez por versión"""
+        if self.state_view is None:
+            return self.game_state
+        view = self.views.get(player_id)
+        if view is None:
+            view = self.state_view(self.game_state, player_id)
+            self.views[player_id] = view
+        return view
+
+    def _frame_for(self, player_id, view, base, compressed=False):
+        """Devuelve la trama que lleva a un jugador de base a view, codificándola una sola vez por versión"""
+        key = (player_id, None if base is None else base.get('version'), compressed)
+        if key in self.frames:
+            self.frame_hits += 1
+            return self.frames[key]
+        if compressed:
+            data = self._frame_for(player_id, view, base)
+            if data is not None:
+                header, payload = data
+                if len(payload) >= self.compress_threshold:
+                    data = compress_frame(payload, self.compression)
+                else:
+                    self.compression.skipped += 1
+            self.frames[key] = data
+            return data
+        self.frame_misses += 1
+        if base is None:
+            data = pack_message({'game_state': view})
+        else:
+            patch = diff_state(base, view)
+            data = None if patch is None else pack_message({'game_patch': patch})
+        self.frames[key] = data
+        return data
+
+    def accepts_compression(self, hello):
+        """Compresión que se acuerda con un cliente según las que ofrece en su saludo"""
+        return negotiate_compression(hello.get('compression'), self.compress_threshold is not None)
+
+    def _send_view(self, connection, snapshot=False):
+        """Deja pendiente para un cliente su vista del estado actual, como parche sobre
+        el último estado que tiene garantizado. Se llama con el cerrojo adquirido"""
+        view = self._view_for(connection.id)
+        if connection.session is not None:
+            connection.session.remember(view)
+        while True:
+            base = None if snapshot else connection.committed_state
+            data = self._frame_for(connection.id, view, base, connection.compression is not None)
+            result = self.server.send_state(connection, view, data, base)
+            if result is not None:
+                return result
+            # El bucle de eventos comprometió el estado pendiente mientras
+            # se calculaba el parche: recalcularlo sobre el nuevo estado
+
 
 class Network:
-    def __init__(self, mode, ip=None, port=DEFAULT_PORT):
+    def __init__(self, mode, ip=None, port=DEFAULT_PORT, table=None, grace_period=SESSION_GRACE_PERIOD,
+                 compress_threshold=COMPRESSION_THRESHOLD):
         self.mode = mode
         self.ip = ip if ip else socket.gethostbyname(socket.gethostname())
         self.port = port
+        self.table = table  # Mesa a la que unirse en un servidor dedicado (solo para clientes)
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.id = 0  # ID del jugador local
         self.connected = False
         self.clients = []  # Lista de conexiones de clientes (solo para el host)
         self.game_state = None  # Estado del juego actual
+        # Difunde el estado a los clientes (solo para el host). Sin umbral no se comprime nada
+        self.publisher = StatePublisher(compress_threshold=compress_threshold)
+        self.game_updates = []  # Estados y parches recibidos pendientes de aplicar (solo para clientes)
+        self.awaiting_resync = False  # El cliente pidió un estado completo y descarta parches
+        self.sessions = SessionTable(grace_period)  # Asientos de los clientes (solo para el host)
+        self.session_token = None  # Token para reanudar la sesión tras un corte (solo para clientes)
+        self.resumed = False  # El último saludo recuperó el asiento anterior (solo para clientes)
+        self.reconnecting = False  # Intentando reanudar la sesión (solo para clientes)
+        self.game_started = False  # La partida ha empezado: el host lo anunció o ya llegó un estado
+        self.link = LinkStats()  # RTT y jitter hasta el host (solo para clientes)
+        self.compression = None  # Compresión acordada con el host (solo para clientes)
+        self.decompression = CompressionStats()  # Tramas comprimidas recibidas (solo para clientes)
         self.lock = threading.Lock()  # Para sincronización
+        self.send_lock = threading.Lock()  # Ordena los envíos del cliente para que no se mezclen las tramas
         
         if mode == "host":
             self.host()
@@ -37,8 +556,15 @@ class Network:
             print(f"Servidor iniciado en {local_ip}:{self.port}")
             print(f"También puedes usar 127.0.0.1:{self.port} para conexiones locales")
             
-            # Iniciar hilo para aceptar conexiones
-            threading.Thread(target=self.accept_connections, daemon=True).start()
+            # Atender a todos los clientes desde un único bucle de eventos
+            self.server = EventLoopServer(
+                self.socket,
+                on_connect=self._on_client_connected,
+                on_message=self._on_client_message,
+                on_disconnect=self._on_client_disconnected
+            )
+            self.publisher.server = self.server
+            self.server.start()
         except Exception as e:
             print(f"Error al iniciar el servidor: {e}")
             traceback.print_exc()
@@ -46,6 +572,10 @@ class Network:
     def join(self):
         """Se une a un servidor existente"""
         try:
+            # Verificar si la dirección incluye la mesa de un servidor dedicado (ip:puerto/mesa)
+            if '/' in self.ip:
+                self.ip, self.table = self.ip.split('/', 1)
+
             # Verificar si la IP incluye puerto
             if ':' in self.ip:
                 self.ip, port_str = self.ip.split(':')
@@ -58,8 +588,7 @@ class Network:
             self.connected = True
             
             # Recibir ID del servidor
-            data = self.socket.recv(BUFFER_SIZE)
-            self.id = int(data.decode())
+            self.id = self._receive_client_id()
             
             # Iniciar hilo para recibir mensajes
             threading.Thread(target=self.receive_messages, daemon=True).start()
@@ -76,8 +605,7 @@ class Network:
                 self.connected = True
                 
                 # Recibir ID del servidor
-                data = self.socket.recv(BUFFER_SIZE)
-                self.id = int(data.decode())
+                self.id = self._receive_client_id()
                 
                 # Iniciar hilo para recibir mensajes
                 threading.Thread(target=self.receive_messages, daemon=True).start()
@@ -87,6 +615,10 @@ class Network:
                 print(f"Error al conectar con localhost: {e}")
                 traceback.print_exc()
                 self.connected = False
+        except ProtocolError as e:
+            print(f"Servidor incompatible: {e}")
+            self.socket.close()
+            self.connected = False
         except ConnectionRefusedError:
             print(f"Conexión rechazada. Asegúrate de que el servidor esté en ejecución y el puerto {self.port} esté abierto.")
             self.connected = False
@@ -95,204 +627,367 @@ class Network:
             traceback.print_exc()
             self.connected = False
     
-    def accept_connections(self):
-        """Acepta conexiones entrantes (solo para el host)"""
-        while self.connected:
-            try:
-                client_socket, addr = self.socket.accept()
-                
-                # Asignar ID al cliente
-                client_id = len(self.clients) + 1
-                client_socket.send(str(client_id).encode())
-                
-                # Añadir cliente a la lista
-                with self.lock:
-                    self.clients.append({
-                        'socket': client_socket,
-                        'address': addr,
-                        'id': client_id
-                    })
-                
-                # Iniciar hilo para recibir mensajes del cliente
-                threading.Thread(target=self.handle_client, args=(client_socket, client_id), daemon=True).start()
-                
-                print(f"Cliente {client_id} conectado desde {addr}")
-                
-                # Enviar el estado actual del juego al nuevo cliente si existe
-                if self.game_state:
-                    try:
-                        # Dividir el mensaje en partes más pequeñas para evitar problemas de buffer
-                        packed_data = msgpack.packb({'game_state': self.game_state}, use_bin_type=True)
-                        # Enviar en fragmentos de 1024 bytes
-                        for i in range(0, len(packed_data), 1024):
-                            fragment = packed_data[i:i+1024]
-                            client_socket.send(fragment)
-                            time.sleep(0.01)
-                        # Enviar un marcador de fin de mensaje
-                        client_socket.send(b'<END>')
-                        
-                        print(f"Estado del juego enviado al cliente {client_id}")
-                    except Exception as e:
-                        print(f"Error al enviar estado inicial al cliente {client_id}: {e}")
-                        traceback.print_exc()
-            except Exception as e:
-                print(f"Error al aceptar conexión: {e}")
-                traceback.print_exc()
-                break
-    
-    def handle_client(self, client_socket, client_id):
-        """Maneja los mensajes de un cliente específico (solo para el host)"""
-        buffer = b""
-        
-        while self.connected:
-            try:
-                data = client_socket.recv(BUFFER_SIZE)
-                if not data:
-                    break
-                
-                # Acumular datos en el buffer
-                buffer += data
-                
-                # Verificar si tenemos un mensaje completo
-                if b'<END>' in buffer:
-                    message_data, buffer = buffer.split(b'<END>', 1)
-                    try:
-                        message = msgpack.unpackb(message_data, raw=False)
-                        if 'action' in message:
-                            self.process_action(message['action'])
-                        if self.game_state:
-                            self.broadcast(msgpack.packb({'game_state': self.game_state}, use_bin_type=True) + b'<END>')
-                    except Exception as e:
-                        print(f"Error al decodificar mensaje del cliente {client_id}: {e}")
-                        print(f"Datos recibidos: {message_data[:100]}...")
-                        traceback.print_exc()
+    def _on_client_connected(self, connection):
+        """Registra un cliente recién aceptado por el bucle de eventos (solo para el host).
+        Se sienta cuando llega su saludo"""
+        print(f"Cliente conectado desde {connection.address}")
 
-            
-            except Exception as e:
-                print(f"Error al manejar cliente {client_id}: {e}")
-                traceback.print_exc()
-                break
-        
-        # Eliminar cliente de la lista
+    def _welcome(self, connection, hello):
+        """Sienta a un cliente en un asiento libre, o en el suyo si reanuda su sesión (solo para el host)"""
+        token = hello.get('resume')
+        if token:
+            session, previous = self.sessions.resume(token, connection)
+            if session is None:
+                self._reject(connection, "la sesión ha caducado")
+                return
+            with self.lock:
+                self.clients = [c for c in self.clients if c is not previous] + [connection]
+            if previous is not None:
+                self.server.close(previous)
+            connection.compression = self.publisher.accepts_compression(hello)
+            self.server.send(connection, self._pack({'client_id': session.seat, 'session': session.token,
+                                                     'resumed': True, 'compression': connection.compression}))
+            print(f"Cliente {session.seat} reanuda su sesión desde {connection.address}")
+            # Solo lo que se perdió desde la última versión que tiene el cliente
+            self.publisher.send_catch_up(connection, session.view_at(hello.get('version')))
+            return
+
+        for session in self.sessions.expire():
+            print(f"Asiento {session.seat} liberado: el cliente no volvió a tiempo")
+        taken = self.sessions.seats()
+        seat = next((i for i in range(1, MAX_CLIENTS + 1) if i not in taken), None)
+        if seat is None:
+            self._reject(connection, "la partida está completa")
+            return
+        session = self.sessions.open(seat, connection)
         with self.lock:
-            self.clients = [c for c in self.clients if c['id'] != client_id]
-        
-        print(f"Cliente {client_id} desconectado")
+            self.clients.append(connection)
+
+        connection.compression = self.publisher.accepts_compression(hello)
+        self.server.send(connection, self._pack({'client_id': seat, 'session': session.token,
+                                                 'resumed': False, 'compression': connection.compression}))
+        print(f"Cliente {seat} sentado desde {connection.address}")
+
+        # Enviar el estado actual del juego al nuevo cliente si existe
+        if self.publisher.send_snapshot(connection):
+            print(f"Estado del juego enviado al cliente {seat}")
+
+    def _reject(self, connection, reason):
+        """Rechaza el saludo de un cliente y cierra su conexión (solo para el host)"""
+        print(f"Conexión de {connection.address} rechazada: {reason}")
+        self.server.send(connection, self._pack({'error': reason}))
+        self.server.close(connection)
+
+    def _on_client_message(self, connection, message_data):
+        """Procesa una trama recibida de un cliente (solo para el host)"""
+        try:
+            message = self._unpack(message_data)
+            if connection.id is None:
+                if 'hello' in message:
+                    self._welcome(connection, message['hello'])
+                else:
+                    self._reject(connection, "se esperaba el saludo")
+            elif 'action' in message:
+                # El jugador lo decide la conexión, no lo que diga el cliente.
+                # Los cambios que provoque la acción los difunde el juego como parche
+                action = dict(message['action'])
+                action['player_id'] = connection.id
+                self.process_action(action)
+            elif 'resync' in message:
+                # El cliente perdió la secuencia de parches: enviarle el estado completo
+                self.publisher.send_snapshot(connection)
+        except Exception as e:
+            print(f"Error al decodificar mensaje del cliente {connection.id}: {e}")
+            print(f"Datos recibidos: {message_data[:100]}...")
+            traceback.print_exc()
+
+    def _on_client_disconnected(self, connection):
+        """Elimina un cliente de la lista y le reserva el asiento (solo para el host)"""
+        with self.lock:
+            self.clients = [c for c in self.clients if c is not connection]
+        if self.sessions.disconnect(connection) is not None:
+            print(f"Cliente {connection.id} desconectado; su asiento queda reservado {self.sessions.grace_period:.0f} s")
+        else:
+            print(f"Cliente {connection.id} desconectado")
     
     def receive_messages(self):
-        """Recibe mensajes del servidor (solo para clientes)"""
-        buffer = b""
-        
+        """Recibe mensajes del servidor (solo para clientes). Si la conexión se corta, intenta reanudar la sesión"""
+        while self.connected:
+            if not self._receive_until_closed() or not self._resume_session():
+                break
+        self.connected = False
+        print("Desconectado del servidor")
+
+    def _receive_until_closed(self):
+        """Procesa los mensajes hasta que se corta la conexión o el host deja de responder.
+        Devuelve False si no merece la pena reanudarla"""
+        # recv vuelve al menos cada PING_INTERVAL para enviar pings y vigilar al host
+        self.socket.settimeout(PING_INTERVAL)
+        self.link.received(time.monotonic())
         while self.connected:
             try:
-                data = self.socket.recv(BUFFER_SIZE)
-                if not data:
-                    break
-                
-                # Acumular datos en el buffer
-                buffer += data
-                
-                # Procesar todos los mensajes completos en el buffer
-                while b'<END>' in buffer:
-                    message_data, buffer = buffer.split(b'<END>', 1)
+                # Procesar primero lo que ya esté en el buffer (p. ej. recibido con el ID)
+                for flags, message_data in self.decoder.frames():
+                    if self._handle_control(flags, message_data):
+                        continue
                     try:
-                        message = msgpack.unpackb(message_data, raw=False)
+                        message = self._unpack(message_data)
                         if 'game_state' in message:
                             with self.lock:
                                 self.game_state = message['game_state']
+                                self.game_updates.append(message)
+                                self.awaiting_resync = False
+                                self.game_started = True
                                 print("Estado del juego actualizado correctamente")
+                        elif 'game_patch' in message:
+                            self._receive_game_patch(message)
                         elif 'start_game' in message:
                             print("Recibido mensaje de inicio de juego")
+                            if 'client_id' in message:
+                                self.id = int(message['client_id'])
+                            self.game_started = True
+                        elif 'shutdown' in message:
+                            print(f"El servidor se está cerrando{': ' + message['reason'] if message.get('reason') else ''}")
+                            self.session_token = None
                     except Exception as e:
                         print(f"Error al decodificar MessagePack: {e}")
                         print(f"Datos recibidos: {message_data[:100]}...")
                         traceback.print_exc()
-            # Si no hay mensaje completo, esperar más datos
+
+                if not self._heartbeat():
+                    return True
+
+                # Si no hay mensaje completo, esperar más datos
+                if not self.decoder.recv_from(self.socket):
+                    return True
+                self.link.received(time.monotonic())
 
             except socket.timeout:
-                print("Timeout al recibir datos, reintentando...")
                 continue
+
+            except ProtocolError as e:
+                print(f"Mensaje del servidor con protocolo incompatible: {e}")
+                return False
             
             except Exception as e:
                 print(f"Error al recibir mensajes: {e}")
                 traceback.print_exc()
-                break
-        
-        self.connected = False
-        print("Desconectado del servidor")
+                return True
+        return False
+
+    def _handle_control(self, flags, payload):
+        """Responde a los pings del host y registra sus pongs. Devuelve True si era una trama de control"""
+        if flags & FLAG_PING:
+            try:
+                with self.send_lock:
+                    sendall_buffers(self.socket, (pong_frame(payload),))
+            except OSError as e:
+                print(f"Error al responder al ping del host: {e}")
+            return True
+        if flags & FLAG_PONG:
+            self.link.pong(payload, time.monotonic())
+            return True
+        return False
+
+    def _heartbeat(self):
+        """Envía un ping al host si toca. Devuelve False si el host lleva IDLE_TIMEOUT sin enviar nada"""
+        now = time.monotonic()
+        idle = self.link.idle(now)
+        if idle >= IDLE_TIMEOUT:
+            print(f"El host no responde desde hace {idle:.0f} s")
+            return False
+        if self.link.should_ping(now, PING_INTERVAL):
+            try:
+                with self.send_lock:
+                    sendall_buffers(self.socket, (self.link.ping(now),))
+            except OSError as e:
+                print(f"Error al enviar ping al host: {e}")
+        return True
+
+    def _resume_session(self):
+        """Vuelve a conectar con el host y recupera el asiento con el token de sesión (solo para clientes)"""
+        if not self.session_token or not self.connected:
+            return False
+        self.reconnecting = True
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+        try:
+            for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+                time.sleep(RECONNECT_DELAY * min(attempt, 5))
+                if not self.connected:
+                    return False
+                print(f"Conexión perdida, reanudando la sesión (intento {attempt} de {RECONNECT_ATTEMPTS})...")
+                try:
+                    sock = socket.create_connection((self.ip, self.port), timeout=10)
+                    with self.send_lock:
+                        self.socket = sock
+                    client_id = self._receive_client_id()
+                except HandshakeRejected as e:
+                    print(f"No se pudo reanudar la sesión: {e}")
+                    return False
+                except (OSError, ProtocolError) as e:
+                    print(f"No se pudo reconectar: {e}")
+                    continue
+                if not self.resumed or client_id != self.id:
+                    print("El host no conservó el asiento")
+                    return False
+                print(f"Sesión reanudada con ID {self.id}")
+                return True
+            return False
+        finally:
+            self.reconnecting = False
     
     def send_action(self, action):
         if not self.connected:
             return False
         try:
-            message = msgpack.packb({'action': action}, use_bin_type=True)
-            self.socket.send(message)
-            self.socket.send(b'<END>')
+            with self.send_lock:
+                sendall_buffers(self.socket, self._pack({'action': action}))
             return True
         except Exception as e:
             print(f"Error al enviar acción: {e}")
             traceback.print_exc()
             return False
     
+    @property
+    def state_view(self):
+        """Función (estado, id) -> vista del estado para un jugador (solo para el host)"""
+        return self.publisher.state_view
+
+    @state_view.setter
+    def state_view(self, state_view):
+        self.publisher.state_view = state_view
+
     def send_game_state(self, game_state):
+        """Difunde un nuevo estado: cada cliente recibe un parche sobre la última vista que recibió (solo para el host)"""
         if not self.connected or self.mode != "host":
             return False
-        with self.lock:
-            self.game_state = game_state
         try:
-            simplified_state = self._simplify_game_state(game_state)
-            packed_data = msgpack.packb({'game_state': simplified_state}, use_bin_type=True)
-            message = packed_data + b'<END>'
-            return self.broadcast(message)
+            with self.lock:
+                clients = list(self.clients)
+            success = self.publisher.publish(game_state, clients)
+            with self.lock:
+                self.game_state = self.publisher.game_state
+            return success
         except Exception as e:
             print(f"Error al serializar el estado del juego: {e}")
             print(f"Objeto problemático: {str(game_state)[:200]}...")
             traceback.print_exc()
             return False
-    def _simplify_game_state(self, obj):
-        """Convierte objetos complejos a tipos básicos de Python para serialización JSON"""
-        if isinstance(obj, dict):
-            return {str(k): self._simplify_game_state(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self._simplify_game_state(item) for item in obj]
-        elif hasattr(obj, 'to_dict'):
-            return self._simplify_game_state(obj.to_dict())
-        elif isinstance(obj, (int, float, bool, str)) or obj is None:
-            return obj
-        else:
-            # Convertir cualquier otro tipo a string para evitar problemas de serialización
-            return str(obj)
-    
+
+    def _receive_game_patch(self, message):
+        """Aplica un parche recibido sobre el último estado conocido (solo para clientes)"""
+        patch = message['game_patch']
+        with self.lock:
+            if self.awaiting_resync:
+                return
+            if self.game_state is not None and patch['base'] == self.game_state.get('version'):
+                self.game_state = apply_state_patch(self.game_state, patch)
+                self.game_updates.append(message)
+                return
+        print(f"Parche {patch['base']} -> {patch['version']} fuera de secuencia, pidiendo estado completo")
+        self.request_resync()
+
+    def request_resync(self):
+        """Pide al host el estado completo del juego (solo para clientes)"""
+        with self.lock:
+            self.awaiting_resync = True
+        if not self.connected:
+            return False
+        try:
+            with self.send_lock:
+                sendall_buffers(self.socket, self._pack({'resync': True}))
+            return True
+        except Exception as e:
+            print(f"Error al pedir el estado completo: {e}")
+            return False
+
+    def _pack(self, message):
+        """Serializa un mensaje y devuelve la cabecera y el payload de su trama"""
+        return pack_message(message)
+
+    def _unpack(self, message_data):
+        """Deserializa el contenido de una trama"""
+        return unpack_message(message_data)
+
+    def _receive_client_id(self):
+        """Saluda al servidor y espera la trama con el ID asignado (solo para clientes).
+
+        Un servidor dedicado sienta al cliente en la mesa que pide. Con un
+        token de sesión se pide el asiento anterior y se indica la versión del
+        último estado recibido para que solo se envíe lo que falta. Si el
+        cliente no la tiene desactivada, ofrece las compresiones que entiende.
+        """
+        self.decoder = FrameDecoder(stats=self.decompression)
+        hello = {'table': self.table}
+        if self.publisher.compress_threshold is not None:
+            hello['compression'] = list(SUPPORTED_COMPRESSION)
+        if self.session_token:
+            hello['resume'] = self.session_token
+            with self.lock:
+                if self.game_state is not None and not self.awaiting_resync:
+                    hello['version'] = self.game_state.get('version')
+        sendall_buffers(self.socket, self._pack({'hello': hello}))
+        while True:
+            if not self.decoder.recv_from(self.socket):
+                raise ConnectionError("El servidor cerró la conexión durante el saludo")
+            for flags, message_data in self.decoder.frames():
+                if self._handle_control(flags, message_data):
+                    continue
+                message = self._unpack(message_data)
+                if 'error' in message:
+                    raise HandshakeRejected(f"El servidor rechazó la conexión: {message['error']}")
+                if 'client_id' in message:
+                    self.session_token = message.get('session')
+                    self.resumed = message.get('resumed', False)
+                    self.compression = message.get('compression')
+                    # Las tramas que lleguen después quedan en el decodificador
+                    return int(message['client_id'])
+
     def broadcast(self, message):
         """Envía un mensaje a todos los clientes (solo para el host)"""
         if not self.connected or self.mode != "host":
             return False
         
-        success = True
         with self.lock:
-            for client in self.clients:
-                try:
-                    # Dividir el mensaje en fragmentos más pequeños si es necesario
-                    if len(message) > 1024 and not message.endswith(b'<END>'):
-                        # Si el mensaje no tiene ya un marcador de fin, dividirlo en fragmentos
-                        for i in range(0, len(message) - 5, 1024):  # -5 para evitar cortar el <END>
-                            fragment = message[i:i+1024]
-                            client['socket'].send(fragment)
-                            time.sleep(0.01)  # Pequeña pausa para evitar saturación
-                    else:
-                        # Enviar el mensaje completo
-                        client['socket'].send(message)
-                except Exception as e:
-                    print(f"Error al enviar mensaje a cliente {client['id']}: {e}")
-                    traceback.print_exc()
-                    success = False
+            clients = list(self.clients)
+        
+        # Las tramas se encolan en el buffer de salida de cada conexión y
+        # el bucle de eventos las escribe sin bloquear
+        success = True
+        for client in clients:
+            if not self.server.send(client, message):
+                print(f"Error al enviar mensaje a cliente {client.id}: conexión cerrada")
+                success = False
         
         return success
     
+    def get_client_stats(self):
+        """Métricas por cliente: cola de salida, estados descartados, RTT, jitter y tiempo sin recibir nada (solo para el host)"""
+        if self.mode != "host" or not self.connected:
+            return []
+        return self.server.stats()
+
+    def get_link_stats(self):
+        """RTT y jitter hasta el host (clientes) o de la peor conexión (host); None si aún no hay medidas"""
+        if self.mode != "host":
+            return self.link.to_dict() if self.link.rtt is not None else None
+        measured = [stats for stats in self.get_client_stats() if stats['rtt_ms'] is not None]
+        return max(measured, key=lambda stats: stats['rtt_ms']) if measured else None
+
+    def get_compression_stats(self):
+        """Ratio y coste de CPU de la compresión: de lo enviado (host) o de lo recibido (clientes)"""
+        if self.mode == "host":
+            with self.publisher.lock:
+                return self.publisher.compression.to_dict()
+        return dict(self.decompression.to_dict(), algorithm=self.compression)
+
     def get_player_count(self):
-        """Obtiene el número de jugadores conectados"""
+        """Obtiene el número de jugadores: asientos ocupados o reservados más el host"""
         if self.mode == "host":
-            return len(self.clients) + 1  # Clientes + host
+            return len(self.sessions) + 1
         return 0
     
     def get_id(self):
@@ -308,14 +1003,28 @@ class Network:
         if not self.connected or self.mode != "host":
             return False
         
-        # Enviar mensaje de inicio de juego
-        message = msgpack.packb({'start_game': True}, use_bin_type=True) + b'<END>'
-        return self.broadcast(message)
+        # Sin partida no hay nada que reanudar: los asientos reservados se liberan y
+        # los ocupados se numeran seguidos para que cada jugador tenga a alguien detrás.
+        # Cada cliente recibe su ID definitivo con el mensaje de inicio
+        self.game_started = True
+        success = True
+        for session in self.sessions.compact(first_seat=1):
+            if not self.server.send(session.connection, self._pack({'start_game': True, 'client_id': session.seat})):
+                print(f"Error al enviar el inicio de juego al cliente {session.seat}: conexión cerrada")
+                success = False
+        return success
     
     def receive_game_state(self):
         """Obtiene el estado del juego actual"""
         with self.lock:
             return self.game_state
+
+    def receive_game_updates(self):
+        """Devuelve y vacía los estados completos y parches recibidos, en orden (solo para clientes)"""
+        with self.lock:
+            updates = self.game_updates
+            self.game_updates = []
+        return updates
     
     def process_action(self, action):
         """Procesa una acción recibida de un cliente (solo para el host)"""
@@ -326,6 +1035,8 @@ class Network:
     def close(self):
         """Cierra la conexión"""
         self.connected = False
+        if self.mode == "host" and hasattr(self, 'server'):
+            self.server.stop()
         try:
             self.socket.close()
         except:
@@ -1,11 +1,112 @@
 from constants import CARD_VALUES, VALUES, SUITS
-from card import Card
-ALT_VALUES = VALUES[1:] + ['A']
+from ranks import VALUE_RANK, CIRCULAR_DISTANCE, circular_start
+from card import PackedCards, JOKER_CODES
+from delta import apply_op, patch_list
+from melds import (HandAnalysis, AnalysisCache, ROUND_REQUIREMENTS, FINGERPRINT_MASK,
+                   card_key, solve_requirement)
+
+
+class Hand:
+    """Mano de un jugador: conserva el orden en que se muestran las cartas y permite
+    comprobar si hay una carta y quitarla en O(1).
+
+    Cada carta ocupa una posición; al quitarla queda un hueco que se compacta la
+    próxima vez que se accede por índice. Las copias de una carta de distintas
+    barajas son iguales (==) pero no la misma instancia: remove() quita primero
+    la instancia exacta y, si no está, la primera copia equivalente.
+    También mantiene la huella de la mano (melds.card_key) al añadir y quitar.
+    """
+    __slots__ = ('_slots', '_positions', '_holes', 'fingerprint')
+
+    def __init__(self, cards=()):
+        self._slots = []       # Cartas en orden de la mano; None en los huecos
+        self._positions = {}   # Clave de igualdad -> posiciones de las cartas iguales, en orden
+        self._holes = 0
+        self.fingerprint = 0
+        self.extend(cards)
+
+    @staticmethod
+    def _key(card):
+        # Los dos comodines son iguales entre sí
+        return JOKER_CODES[0] if card.is_joker else card.code
+
+    def append(self, card):
+        self._positions.setdefault(self._key(card), []).append(len(self._slots))
+        self._slots.append(card)
+        self.fingerprint = (self.fingerprint + card_key(card)) & FINGERPRINT_MASK
+
+    def extend(self, cards):
+        for card in cards:
+            self.append(card)
+
+    def remove(self, card):
+        """Quita la carta (o una igual) y la devuelve. Devuelve None si no hay ninguna"""
+        key = self._key(card)
+        positions = self._positions.get(key)
+        if not positions:
+            return None
+        for i, position in enumerate(positions):
+            if self._slots[position] is card:
+                break
+        else:
+            i = 0  # La primera copia equivalente en el orden de la mano
+        return self._take(key, i)
+
+    def pop(self, index=-1):
+        """Quita y devuelve la carta en esa posición de la mano"""
+        self._compact()
+        position = range(len(self._slots))[index]
+        card = self._slots[position]
+        key = self._key(card)
+        return self._take(key, self._positions[key].index(position))
+
+    def _take(self, key, i):
+        positions = self._positions[key]
+        position = positions.pop(i)
+        if not positions:
+            del self._positions[key]
+        card = self._slots[position]
+        self._slots[position] = None
+        self._holes += 1
+        self.fingerprint = (self.fingerprint - card_key(card)) & FINGERPRINT_MASK
+        if self._holes > len(self._slots) // 2:
+            self._compact()
+        return card
+
+    def _compact(self):
+        """Elimina los huecos y recalcula las posiciones"""
+        if not self._holes:
+            return
+        self._slots = [card for card in self._slots if card is not None]
+        self._positions = {}
+        for position, card in enumerate(self._slots):
+            self._positions.setdefault(self._key(card), []).append(position)
+        self._holes = 0
+
+    def __getitem__(self, index):
+        self._compact()
+        return self._slots[index]
+
+    def __len__(self):
+        return len(self._slots) - self._holes
+
+    def __iter__(self):
+        if not self._holes:
+            return iter(self._slots)
+        return (card for card in self._slots if card is not None)
+
+    def __contains__(self, card):
+        return self._key(card) in self._positions
+
+    def __repr__(self):
+        return f"Hand({list(self)})"
+
 
 class Player:
     def __init__(self, id, name):
         self.id = id
         self.name = name
+        self.analysis_cache = AnalysisCache()  # Análisis de la mano por huella y ronda
         self.hand = []
         self.combinations = []
         self.score = 0
@@ -18,18 +119,32 @@ class Player:
         self.sequences_laid_down = 0
         self.trios_laid_down = 0
         self.has_completed_round_requirement = False  # Nuevo flag
+        self.hidden_count = 0  # Cartas de la mano que este cliente no puede ver (mano de un rival)
+
+    def hand_size(self):
+        """Número de cartas en la mano, incluidas las que no se conocen"""
+        return len(self.hand) + self.hidden_count
+
+    @property
+    def hand(self):
+        return self._hand
+
+    @hand.setter
+    def hand(self, cards):
+        self._hand = cards if isinstance(cards, Hand) else Hand(cards)
 
     def add_to_hand(self, cards):
         if isinstance(cards, list):
-            self.hand.extend(cards)
+            self._hand.extend(cards)
         else:
-            self.hand.append(cards)
+            self._hand.append(cards)
     
     def remove_from_hand(self, card):
-        for i, c in enumerate(self.hand):
-            if c == card:
-                return self.hand.pop(i)
-        return None
+        return self._hand.remove(card)
+
+    def _analysis_key(self, *args):
+        """Clave de la caché: huella y tamaño de la mano más lo que dependa de la consulta"""
+        return (self._hand.fingerprint, len(self._hand)) + args
     
     def calculate_hand_points(self):
         """Calcula los puntos de las cartas que quedan en la mano"""
@@ -41,28 +156,9 @@ class Player:
             # Ya cumplió la bajada obligatoria, puede bajar cualquier trío o seguidilla extra (excepto ronda 4)
             if round_num == 3:
                 return False  # En ronda 4 no se puede bajar extra, debe quedarse sin cartas
-            return self._has_trio() or self._has_sequence()
-        else:
-            # Debe cumplir la bajada obligatoria de la ronda
-            if round_num == 0:
-                # Ronda 1: Un trío y una seguidilla (ambos a la vez)
-                trios = self._get_trios(1)
-                sequences = self._get_sequences(1)
-                return len(trios) >= 1 and len(sequences) >= 1
-            elif round_num == 1:
-                # Ronda 2: Dos seguidillas (ambas a la vez)
-                sequences = self._get_sequences(2)
-                return len(sequences) >= 2
-            elif round_num == 2:
-                # Ronda 3: Dos tríos (ambos a la vez)
-                trios = self._get_trios(2)
-                return len(trios) >= 2
-            elif round_num == 3:
-                # Ronda 4: Dos tríos y una seguidilla (las 3 combinaciones a la vez)
-                trios = self._get_trios(2)
-                sequences = self._get_sequences(1)
-                return len(trios) >= 2 and len(sequences) >= 1
-        return False
+            return self.analysis_cache.get(self._analysis_key('extra'), self._has_extra_meld)
+        # Debe cumplir la bajada obligatoria de la ronda (todas las combinaciones a la vez)
+        return self._get_round_melds(round_num) is not None
 
     def lay_down(self, round_num):
         laid_down = False
@@ -71,89 +167,23 @@ class Player:
         if self.has_completed_round_requirement:
             if round_num == 3:
                 return False  # En ronda 4 no se puede bajar extra, debe quedarse sin cartas
-            # Bajar todos los tríos posibles
-            while self._has_trio():
-                trio = self._get_trio()
-                if trio:
-                    self.combinations.append({"type": "trio", "cards": trio})
-                    for card in trio:
-                        self.remove_from_hand(card)
-                    self.trios_laid_down += 1
-                    laid_down = True
-            # Bajar todas las seguidillas posibles
-            while self._has_sequence():
-                sequence = self._get_sequence()
-                if sequence:
-                    self.combinations.append({"type": "sequence", "cards": sequence})
-                    for card in sequence:
-                        self.remove_from_hand(card)
-                    self.sequences_laid_down += 1
-                    laid_down = True
+            # Bajar todos los tríos posibles y después todas las seguidillas
+            analysis = HandAnalysis(self.hand)
+            trios = analysis.take_trios(len(self.hand))
+            sequences = analysis.take_sequences(len(self.hand))
+            laid_down = self._lay_down_melds(trios, sequences)
             if laid_down:
                 print(f"Jugador {self.id + 1} bajó combinaciones extra. Cartas restantes: {len(self.hand)}")
             return laid_down
 
         # Bajada obligatoria según la ronda
-        if round_num == 0:
-            trios = self._get_trios(1)
-            sequences = self._get_sequences(1)
-            if len(trios) >= 1 and len(sequences) >= 1:
-                # Bajar el trío
-                for trio in trios[:1]:
-                    self.combinations.append({"type": "trio", "cards": trio})
-                    for card in trio:
-                        self.remove_from_hand(card)
-                    self.trios_laid_down += 1
-                    laid_down = True
-                # Bajar la seguidilla
-                for seq in sequences[:1]:
-                    self.combinations.append({"type": "sequence", "cards": seq})
-                    for card in seq:
-                        self.remove_from_hand(card)
-                    self.sequences_laid_down += 1
-                    laid_down = True
-                self.has_completed_round_requirement = True
-                print(f"Jugador {self.id + 1} cumplió requisito ronda 1: 1 trío, 1 seguidilla")
-        elif round_num == 1:
-            sequences = self._get_sequences(2)
-            if len(sequences) >= 2:
-                for seq in sequences[:2]:
-                    self.combinations.append({"type": "sequence", "cards": seq})
-                    for card in seq:
-                        self.remove_from_hand(card)
-                    self.sequences_laid_down += 1
-                    laid_down = True
-                self.has_completed_round_requirement = True
-                print(f"Jugador {self.id + 1} cumplió requisito ronda 2: 2 seguidillas")
-        elif round_num == 2:
-            trios = self._get_trios(2)
-            if len(trios) >= 2:
-                for trio in trios[:2]:
-                    self.combinations.append({"type": "trio", "cards": trio})
-                    for card in trio:
-                        self.remove_from_hand(card)
-                    self.trios_laid_down += 1
-                    laid_down = True
-                self.has_completed_round_requirement = True
-                print(f"Jugador {self.id + 1} cumplió requisito ronda 3: 2 tríos")
-        elif round_num == 3:
-            trios = self._get_trios(2)
-            sequences = self._get_sequences(1)
-            if len(trios) >= 2 and len(sequences) >= 1:
-                for trio in trios[:2]:
-                    self.combinations.append({"type": "trio", "cards": trio})
-                    for card in trio:
-                        self.remove_from_hand(card)
-                    self.trios_laid_down += 1
-                    laid_down = True
-                for seq in sequences[:1]:
-                    self.combinations.append({"type": "sequence", "cards": seq})
-                    for card in seq:
-                        self.remove_from_hand(card)
-                    self.sequences_laid_down += 1
-                    laid_down = True
-                self.has_completed_round_requirement = True
-                print(f"Jugador {self.id + 1} cumplió requisito ronda 4: 2 tríos, 1 seguidilla")
+        melds = self._get_round_melds(round_num)
+        if melds is not None:
+            trios, sequences = melds
+            laid_down = self._lay_down_melds(trios, sequences)
+            self.has_completed_round_requirement = True
+            print(f"Jugador {self.id + 1} cumplió requisito ronda {round_num + 1}: "
+                  f"{len(trios)} tríos, {len(sequences)} seguidillas")
 
         if laid_down:
             self.has_laid_down = True
@@ -161,6 +191,48 @@ class Player:
 
         return laid_down
 
+    def _has_extra_meld(self):
+        analysis = HandAnalysis(self.hand)
+        return analysis.has_trio() or analysis.has_sequence()
+
+    def _get_round_melds(self, round_num):
+        """Tríos y seguidillas que cumplen el requisito de la ronda dejando menos puntos en la mano,
+        o None si no se puede. El resultado se guarda en la caché mientras la mano no cambie"""
+        if not 0 <= round_num < len(ROUND_REQUIREMENTS):
+            return None
+        return self.analysis_cache.get(self._analysis_key('round', round_num),
+                                       lambda: self._solve_round_melds(round_num))
+
+    def _solve_round_melds(self, round_num):
+        trio_count, sequence_count = ROUND_REQUIREMENTS[round_num]
+        analysis = HandAnalysis(self.hand)
+        # Descartar con las máscaras antes de lanzar la búsqueda exacta
+        if (trio_count and not analysis.has_trio()) or (sequence_count and not analysis.has_sequence()):
+            return None
+        return solve_requirement(self.hand, trio_count, sequence_count)
+
+    def _lay_down_melds(self, trios, sequences):
+        """Pasa los tríos y seguidillas de la mano a la mesa.
+
+        Las cartas se quitan por posición: de cada carta, la última copia de la
+        mano, como las elige solve_requirement. Así la mano queda igual aunque el
+        resultado venga de la caché con copias de otra baraja o la partida se
+        repita desde un registro, donde no consta la baraja de cada carta.
+        """
+        positions = {}
+        for position, card in enumerate(self.hand):
+            positions.setdefault(Hand._key(card), []).append(position)
+        melds = [("trio", [positions[Hand._key(card)].pop() for card in trio]) for trio in trios]
+        melds += [("sequence", [positions[Hand._key(card)].pop() for card in sequence]) for sequence in sequences]
+        taken = {position: self.hand[position] for _, meld in melds for position in meld}
+        for position in sorted(taken, reverse=True):
+            self.hand.pop(position)
+        for kind, meld in melds:
+            self.combinations.append({"type": kind, "cards": [taken[position] for position in meld]})
+        self.trios_laid_down += len(trios)
+        self.sequences_laid_down += len(sequences)
+        return bool(trios or sequences)
+
     def can_add_to_combination(self, card, combination_idx, player_idx=None):
         if player_idx is not None and player_idx != self.id and not self.has_laid_down:
             return False
@@ -182,20 +254,16 @@ class Player:
             if not all(c.suit == card.suit for c in combination["cards"]):
                 return False
 
-            # Obtener la lista de valores de la secuencia actual
-            current_values = [c.value for c in combination["cards"]]
-            value_list = VALUES  # Orden base circular
-
-            # Buscar índices circulares
-            indices = sorted([value_list.index(v) for v in current_values])
-            card_idx = value_list.index(card.value)
+            # Índices de la secuencia actual (orden base circular)
+            indices = sorted([VALUE_RANK[c.value] for c in combination["cards"]])
+            card_idx = VALUE_RANK[card.value]
 
             # Verificar si se puede añadir antes o después en orden circular
             first_idx = indices[0]
             last_idx = indices[-1]
 
-            diff_before = (first_idx - card_idx) % len(value_list)
-            diff_after = (card_idx - last_idx) % len(value_list)
+            diff_before = CIRCULAR_DISTANCE[card_idx][first_idx]
+            diff_after = CIRCULAR_DISTANCE[last_idx][card_idx]
 
             return diff_before == 1 or diff_after == 1
 
@@ -232,7 +300,6 @@ class Player:
             return card.value == non_jokers[0].value if non_jokers else True
 
         elif combination["type"] == "sequence":
-            value_list = VALUES
             cards_copy = combination["cards"][:]
             cards_copy[joker_idx] = card
 
@@ -240,11 +307,9 @@ class Player:
                 return False
 
             # Convertir a índices circulares
-            indices = sorted([value_list.index(c.value) for c in cards_copy if not c.is_joker])
+            indices = sorted([VALUE_RANK[c.value] for c in cards_copy if not c.is_joker])
             for i in range(1, len(indices)):
-                prev = indices[i - 1]
-                curr = indices[i]
-                gap = (curr - prev) % len(value_list)
+                gap = CIRCULAR_DISTANCE[indices[i - 1]][indices[i]]
                 if gap != 1:
                     return False
 
@@ -270,297 +335,53 @@ class Player:
     
     def _order_circular_sequence(self, cards):
         """Ordena una secuencia circularmente coherente"""
-        value_list = VALUES
-
-        # Excluir Jokers para encontrar el orden base
-        non_jokers = [c for c in cards if not c.is_joker]
-        if not non_jokers:
+        # Excluir Jokers para encontrar el orden base; van al final
+        ranks = [VALUE_RANK[c.value] for c in cards if not c.is_joker]
+        if not ranks:
             return cards
-
-        # Buscar el punto de inicio que mejor preserve la secuencia circular
-        indices = [value_list.index(c.value) for c in non_jokers]
-        best_order = cards
-        min_disorder = float('inf')
-
-        for start in indices:
-            rotated = sorted(indices, key=lambda i: (i - start) % len(value_list))
-            expected = [(rotated[0] + i) % len(value_list) for i in range(len(rotated))]
-            disorder = sum(abs(a - b) for a, b in zip(rotated, expected))
-            if disorder < min_disorder:
-                min_disorder = disorder
-                best_order = sorted(cards, key=lambda c: (value_list.index(c.value) - start) % len(value_list) if not c.is_joker else 999)
-
-        return best_order
+        distance = CIRCULAR_DISTANCE[circular_start(ranks)]
+        return sorted(cards, key=lambda c: distance[VALUE_RANK[c.value]] if not c.is_joker else 999)
 
     
     def _has_trio(self):
         """Verifica si el jugador tiene un trío en su mano"""
-        value_counts = {}
-        for card in self.hand:
-            if card.is_joker:
-                continue
-            value_counts[card.value] = value_counts.get(card.value, 0) + 1
-        
-        # Contar Jokers disponibles
-        joker_count = sum(1 for card in self.hand if card.is_joker)
-        
-        # Verificar si hay un trío (con o sin Jokers)
-        for value, count in value_counts.items():
-            if count + joker_count >= 3:
-                return True
-        
-        return False
-    
+        return HandAnalysis(self.hand).has_trio()
+
     def _has_sequence(self):
         """Verifica si el jugador tiene una seguidilla en su mano"""
-        for use_alt_values in [False, True]:
-            value_list = ALT_VALUES if use_alt_values else VALUES
-            if self._has_sequence_with_values(value_list):
-                return True
-        return False
-
-    def _has_sequence_with_values(self, value_list):
-        suits = {}
-        for card in self.hand:
-            if card.is_joker:
-                continue
-            if card.suit not in suits:
-                suits[card.suit] = []
-            suits[card.suit].append(card)
-
-        joker_count = sum(1 for card in self.hand if card.is_joker)
-
-        for suit, cards in suits.items():
-            sorted_cards = sorted(cards, key=lambda c: value_list.index(c.value))
-            for i in range(len(sorted_cards)):
-                sequence = [sorted_cards[i]]
-                available_jokers = joker_count
-                for j in range(i + 1, len(sorted_cards)):
-                    prev_idx = value_list.index(sequence[-1].value)
-                    curr_idx = value_list.index(sorted_cards[j].value)
-
-                    gap = curr_idx - prev_idx
-                    if gap == 1:
-                        sequence.append(sorted_cards[j])
-                    elif gap > 1 and available_jokers >= (gap - 1):
-                        for _ in range(gap - 1):
-                            sequence.append(None)  # Joker placeholder
-                            available_jokers -= 1
-                        sequence.append(sorted_cards[j])
-                    else:
-                        break
-
-                    if len(sequence) >= 4:
-                        return True
-
-                if len(sequence) + available_jokers >= 4:
-                    return True
-
-        return False
+        return HandAnalysis(self.hand).has_sequence()
 
-    
     def _count_sequences(self):
-        """Cuenta cuántas seguidillas puede formar el jugador"""
-        # Esta es una simplificación; en una implementación real, 
-        # necesitaríamos verificar cada combinación posible
+        """Cuenta cuántas seguidillas puede formar el jugador a la vez"""
         count = 0
-        if self._has_sequence():
+        while solve_requirement(self.hand, 0, count + 1) is not None:
             count += 1
-            # Simular la eliminación de las cartas usadas y verificar de nuevo
-            # Esto es una aproximación
-            if len(self.hand) >= 8:  # Necesitamos al menos 8 cartas para dos seguidillas
-                count += 1
         return count
-    
+
     def _count_trios(self):
-        """Cuenta cuántos tríos puede formar el jugador"""
-        value_counts = {}
-        for card in self.hand:
-            if card.is_joker:
-                continue
-            value_counts[card.value] = value_counts.get(card.value, 0) + 1
-        
-        # Contar Jokers disponibles
-        joker_count = sum(1 for card in self.hand if card.is_joker)
-        
-        # Contar tríos posibles
-        trios = 0
-        for value, count in sorted(value_counts.items(), key=lambda x: x[1], reverse=True):
-            if count >= 3:
-                trios += 1
-                value_counts[value] -= 3
-            elif count + joker_count >= 3:
-                jokers_needed = 3 - count
-                joker_count -= jokers_needed
-                trios += 1
-                value_counts[value] = 0
-        
-        return trios
-    
+        """Cuenta cuántos tríos puede formar el jugador a la vez"""
+        count = 0
+        while solve_requirement(self.hand, count + 1, 0) is not None:
+            count += 1
+        return count
+
     def _get_trio(self):
         """Obtiene un trío de la mano del jugador"""
-        jokers = [card for card in self.hand if card.is_joker]
-        non_jokers = [card for card in self.hand if not card.is_joker]
-        
-        # Caso especial: solo jokers
-        if len(jokers) >= 3:
-            return jokers[:3]
-        
-        # Agrupar cartas por valor
-        value_counts = {}
-        for card in non_jokers:
-            value_counts[card.value] = value_counts.get(card.value, 0) + 1
-        
-        # Buscar un valor con al menos 2 cartas (para completar con 1 joker)
-        for value, count in value_counts.items():
-            if count >= 2 and jokers:
-                trio = [card for card in non_jokers if card.value == value][:2]
-                trio.append(jokers[0])
-                return trio
-            elif count >= 3:
-                return [card for card in non_jokers if card.value == value][:3]
-        
-        # Si hay suficientes jokers para un trío
-        if len(jokers) >= 3:
-            return jokers[:3]
-        
-        return None
-    
+        trios = HandAnalysis(self.hand).take_trios(1)
+        return trios[0] if trios else None
+
     def _get_trios(self, count):
         """Obtiene varios tríos de la mano del jugador"""
-        trios = []
-        hand_copy = self.hand.copy()
-        jokers = [card for card in hand_copy if card.is_joker]
-        non_jokers = [card for card in hand_copy if not card.is_joker]
-        
-        # Contar cartas por valor
-        value_counts = {}
-        for card in non_jokers:
-            value_counts[card.value] = value_counts.get(card.value, 0) + 1
-        
-        # Ordenar valores por cantidad (primero los que tienen más cartas)
-        sorted_values = sorted(value_counts.items(), key=lambda x: x[1], reverse=True)
-        
-        for value, card_count in sorted_values:
-            if len(trios) >= count:
-                break
-            
-            if card_count >= 3:
-                # Encontrar 3 cartas con este valor
-                trio = []
-                for i, card in enumerate(non_jokers):
-                    if card.value == value and card in hand_copy:
-                        trio.append(card)
-                        hand_copy.remove(card)
-                        if len(trio) == 3:
-                            trios.append(trio)
-                            break
-            
-            elif card_count + len(jokers) >= 3:
-                # Usar Jokers para completar el trío
-                trio = []
-                # Añadir las cartas con el valor
-                for i, card in enumerate(non_jokers):
-                    if card.value == value and card in hand_copy:
-                        trio.append(card)
-                        hand_copy.remove(card)
-                
-                # Añadir los Jokers necesarios
-                jokers_needed = 3 - len(trio)
-                for i in range(jokers_needed):
-                    if jokers and i < len(jokers):
-                        trio.append(jokers[0])
-                        jokers.remove(jokers[0])
-                
-                trios.append(trio)
-        
-        return trios
-    
+        return HandAnalysis(self.hand).take_trios(count)
+
     def _get_sequence(self):
         """Obtiene una seguidilla válida"""
-        for use_alt_values in [False, True]:
-            value_list = ALT_VALUES if use_alt_values else VALUES
-            sequence = self._get_sequence_with_values(value_list)
-            if sequence:
-                return sequence
-        return None
-
-    def _get_sequence_with_values(self, value_list):
-        suits = {}
-        for card in self.hand:
-            if card.is_joker:
-                continue
-            if card.suit not in suits:
-                suits[card.suit] = []
-            suits[card.suit].append(card)
-
-        jokers = [card for card in self.hand if card.is_joker]
-
-        def circular_index_diff(a, b):
-            """Devuelve la diferencia circular entre dos valores"""
-            i_a = value_list.index(a)
-            i_b = value_list.index(b)
-            return (i_b - i_a) % len(value_list)
-
-        for suit, cards in suits.items():
-            sorted_cards = sorted(cards, key=lambda c: value_list.index(c.value))
-            best_sequence = []
-
-            for i in range(len(sorted_cards)):
-                sequence = [sorted_cards[i]]
-                available_jokers = jokers.copy()
+        sequences = HandAnalysis(self.hand).take_sequences(1)
+        return sequences[0] if sequences else None
 
-                for j in range(i + 1, len(sorted_cards)):
-                    prev_val = sequence[-1].value
-                    curr_val = sorted_cards[j].value
-                    gap = circular_index_diff(prev_val, curr_val)
-
-                    if gap == 1:
-                        sequence.append(sorted_cards[j])
-                    elif gap > 1 and len(available_jokers) >= (gap - 1):
-                        for _ in range(gap - 1):
-                            sequence.append(available_jokers.pop(0))
-                        sequence.append(sorted_cards[j])
-                    else:
-                        break
-
-                    if len(sequence) >= 4 and len(sequence) > len(best_sequence):
-                        best_sequence = sequence.copy()
-
-                if len(sequence) + len(available_jokers) >= 4 and len(sequence) + len(available_jokers) > len(best_sequence):
-                    while len(sequence) < 4 and available_jokers:
-                        sequence.append(available_jokers.pop(0))
-                    best_sequence = sequence
-
-            if best_sequence and len(best_sequence) >= 4:
-                return best_sequence
-
-        return None
-
-
-    
     def _get_sequences(self, count):
         """Obtiene varias seguidillas de la mano del jugador"""
-        sequences = []
-        hand_copy = self.hand.copy()
-        
-        for _ in range(count):
-            # Simular la mano actual
-            current_player = Player(self.id, self.name)
-            current_player.hand = hand_copy.copy()
-            
-            # Intentar obtener una seguidilla
-            sequence = current_player._get_sequence()
-            if sequence and len(sequence) >= 4:
-                sequences.append(sequence)
-                # Eliminar las cartas usadas
-                for card in sequence:
-                    if card in hand_copy:
-                        hand_copy.remove(card)
-            else:
-                break
-        
-        return sequences
+        return HandAnalysis(self.hand).take_sequences(count)
     
     def detect_trios(self):
         """Detecta tríos (3 cartas del mismo valor) incluyendo Jokers"""
@@ -588,7 +409,7 @@ class Player:
         """Detecta seguidillas (4+ cartas consecutivas del mismo palo) incluyendo Jokers"""
         from collections import defaultdict
 
-        order = {val: i for i, val in enumerate(VALUES)}
+        order = VALUE_RANK
         suits = defaultdict(list)
 
         # Separar jokers
@@ -648,11 +469,11 @@ class Player:
         return {
             'id': self.id,
             'name': self.name,
-            'hand': [card.to_dict() for card in self.hand],
+            'hand': PackedCards.pack(self.hand),
             'combinations': [
                 {
                     'type': combo['type'],
-                    'cards': [card.to_dict() for card in combo['cards']]
+                    'cards': PackedCards.pack(combo['cards'])
                 }
                 for combo in self.combinations
             ],
@@ -665,28 +486,69 @@ class Player:
             'has_laid_down_sequence': self.has_laid_down_sequence,
             'sequences_laid_down': self.sequences_laid_down,
             'trios_laid_down': self.trios_laid_down,
-            'has_completed_round_requirement': self.has_completed_round_requirement
+            'has_completed_round_requirement': self.has_completed_round_requirement,
+            'hidden_count': self.hidden_count
+        }
+
+    @staticmethod
+    def hide_hand(data):
+        """Versión de un jugador serializado para sus rivales: solo el número de cartas"""
+        view = dict(data)
+        view['hidden_count'] = len(view.pop('hand')) + data.get('hidden_count', 0)
+        return view
+
+    def apply_patch(self, op):
+        """Aplica una diferencia recibida del host sin reconstruir el jugador"""
+        for key, field_op in op[1].items():
+            if key == 'hand':
+                self.hand = apply_op(PackedCards.pack(self.hand), field_op).unpack()
+            elif key == 'combinations':
+                patch_list(self.combinations, field_op, Player._combination_from_dict, Player._patch_combination)
+            else:
+                setattr(self, key, apply_op(getattr(self, key, None), field_op))
+
+    @staticmethod
+    def _combination_from_dict(data):
+        return {
+            'type': data['type'],
+            'cards': data['cards'].unpack()
         }
 
+    @staticmethod
+    def _patch_combination(combination, op):
+        for key, field_op in op[1].items():
+            if key == 'cards':
+                combination['cards'][:] = apply_op(PackedCards.pack(combination['cards']), field_op).unpack()
+            else:
+                combination[key] = apply_op(combination.get(key), field_op)
+
+    def update_from_dict(self, data):
+        """Actualiza el jugador en el sitio con su estado completo, reutilizando sus combinaciones"""
+        self.name = data['name']
+        self.hand = data['hand'].unpack() if 'hand' in data else []
+        self.hidden_count = data.get('hidden_count', 0)
+        combinations = data['combinations']
+        for combination, combo_data in zip(self.combinations, combinations):
+            combination['type'] = combo_data['type']
+            combination['cards'][:] = combo_data['cards'].unpack()
+        if len(combinations) > len(self.combinations):
+            self.combinations.extend(Player._combination_from_dict(combo)
+                                     for combo in combinations[len(self.combinations):])
+        else:
+            del self.combinations[len(combinations):]
+        self.score = data['score']
+        self.is_mano = data['is_mano']
+        self.has_laid_down = data['has_laid_down']
+        self.took_discard = data['took_discard']
+        self.took_penalty = data['took_penalty']
+        self.has_laid_down_trio = data.get('has_laid_down_trio', False)
+        self.has_laid_down_sequence = data.get('has_laid_down_sequence', False)
+        self.sequences_laid_down = data.get('sequences_laid_down', 0)
+        self.trios_laid_down = data.get('trios_laid_down', 0)
+        self.has_completed_round_requirement = data.get('has_completed_round_requirement', False)
+
     @staticmethod
     def from_dict(data):
         player = Player(data['id'], data['name'])
-        player.hand = [Card.from_dict(card_data) for card_data in data['hand']]
-        player.combinations = [
-            {
-                'type': combo['type'],
-                'cards': [Card.from_dict(card_data) for card_data in combo['cards']]
-            }
-            for combo in data['combinations']
-        ]
-        player.score = data['score']
-        player.is_mano = data['is_mano']
-        player.has_laid_down = data['has_laid_down']
-        player.took_discard = data['took_discard']
-        player.took_penalty = data['took_penalty']
-        player.has_laid_down_trio = data.get('has_laid_down_trio', False)
-        player.has_laid_down_sequence = data.get('has_laid_down_sequence', False)
-        player.sequences_laid_down = data.get('sequences_laid_down', 0)
-        player.trios_laid_down = data.get('trios_laid_down', 0)
-        player.has_completed_round_requirement = data.get('has_completed_round_requirement', False)
+        player.update_from_dict(data)
         return player
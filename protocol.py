@@ -0,0 +1,301 @@
+import struct
+import time
+import zlib
+from collections import deque
+from constants import PROTOCOL_VERSION, MAX_FRAME_SIZE, BUFFER_SIZE, DEGRADED_RTT, COMPRESSION_LEVEL
+
+# Cabecera de cada trama: versión del protocolo (1 byte), flags (1 byte)
+# y longitud del payload (4 bytes, big endian)
+FRAME_HEADER = struct.Struct('!BBI')
+FRAME_HEADER_SIZE = FRAME_HEADER.size
+
+# Bits de los flags. Las tramas de control no llevan MessagePack: el payload del
+# ping es el instante en que se envió (ns del reloj de quien lo envía) y el pong
+# lo devuelve tal cual
+FLAG_PING = 0x01
+FLAG_PONG = 0x02
+PING_PAYLOAD = struct.Struct('!Q')
+# Payload comprimido con zlib. Solo se envía a quien lo ha aceptado en el saludo
+FLAG_COMPRESSED = 0x04
+
+COMPRESSION_ZLIB = 'zlib'
+SUPPORTED_COMPRESSION = (COMPRESSION_ZLIB,)
+
+
+class ProtocolError(Exception):
+    """Trama inválida o de una versión del protocolo incompatible"""
+
+
+def encode_frame_header(length, flags=0):
+    """Construye la cabecera de una trama con el payload de la longitud indicada"""
+    return FRAME_HEADER.pack(PROTOCOL_VERSION, flags, length)
+
+
+def encode_frame(payload, flags=0):
+    """Devuelve el payload precedido de su cabecera"""
+    return encode_frame_header(len(payload), flags) + payload
+
+
+def frame_parts(payload, flags=0):
+    """Devuelve la cabecera y el payload por separado, para enviarlos sin concatenarlos"""
+    return (encode_frame_header(len(payload), flags), payload)
+
+
+def send_buffers(sock, buffers):
+    """Intenta enviar varios buffers con una sola llamada (scatter-gather).
+
+    Devuelve los bytes enviados. Donde no existe sendmsg (Windows) se envía
+    solo el primer buffer y el resto queda para la siguiente llamada.
+    """
+    if hasattr(sock, 'sendmsg'):
+        return sock.sendmsg(buffers)
+    return sock.send(buffers[0])
+
+
+def consume_buffers(buffers, sent):
+    """Descarta de la cola de buffers los primeros `sent` bytes ya enviados"""
+    while sent:
+        first = buffers[0]
+        if sent < len(first):
+            buffers[0] = first[sent:]
+            return
+        sent -= len(first)
+        buffers.popleft()
+
+
+def sendall_buffers(sock, buffers):
+    """Envía por completo varios buffers por un socket bloqueante"""
+    pending = deque(memoryview(buffer) for buffer in buffers if buffer)
+    while pending:
+        consume_buffers(pending, send_buffers(sock, list(pending)))
+
+
+def ping_frame(now):
+    """Trama de ping con el instante `now` (time.monotonic)"""
+    return encode_frame(PING_PAYLOAD.pack(int(now * 1e9)), FLAG_PING)
+
+
+def pong_frame(payload):
+    """Respuesta a un ping: devuelve su payload"""
+    return encode_frame(payload, FLAG_PONG)
+
+
+def negotiate_compression(offered, enabled=True):
+    """Elige la compresión de una conexión entre las que ofrece el cliente (None: sin comprimir)"""
+    if not enabled or not offered:
+        return None
+    return next((name for name in offered if name in SUPPORTED_COMPRESSION), None)
+
+
+class CompressionStats:
+    """Tramas comprimidas o descomprimidas: bytes antes y después y tiempo de CPU empleado"""
+
+    def __init__(self):
+        self.frames = 0
+        self.skipped = 0      # Tramas por debajo del umbral que se enviaron sin comprimir
+        self.raw_bytes = 0    # Bytes sin comprimir
+        self.wire_bytes = 0   # Bytes comprimidos
+        self.cpu_time = 0.0   # Segundos de CPU del hilo que comprime o descomprime
+
+    def add(self, raw_bytes, wire_bytes, cpu_time):
+        self.frames += 1
+        self.raw_bytes += raw_bytes
+        self.wire_bytes += wire_bytes
+        self.cpu_time += cpu_time
+
+    def merge(self, other):
+        """Suma las métricas de otro contador (p. ej. de otra mesa)"""
+        self.frames += other.frames
+        self.skipped += other.skipped
+        self.raw_bytes += other.raw_bytes
+        self.wire_bytes += other.wire_bytes
+        self.cpu_time += other.cpu_time
+
+    def to_dict(self):
+        """Métricas para elegir el umbral: ratio (comprimido / original) y coste en µs por KB original"""
+        return {
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'raw_bytes': self.raw_bytes,
+            'wire_bytes': self.wire_bytes,
+            'ratio': round(self.wire_bytes / self.raw_bytes, 3) if self.raw_bytes else None,
+            'cpu_ms': round(self.cpu_time * 1000, 2),
+            'us_per_kb': round(self.cpu_time * 1e6 / (self.raw_bytes / 1024), 1) if self.raw_bytes else None
+        }
+
+
+def compress_frame(payload, stats=None, level=COMPRESSION_LEVEL):
+    """Devuelve la cabecera y el payload comprimido de una trama con FLAG_COMPRESSED"""
+    start = time.thread_time()
+    compressed = zlib.compress(payload, level)
+    if stats is not None:
+        stats.add(len(payload), len(compressed), time.thread_time() - start)
+    return frame_parts(compressed, FLAG_COMPRESSED)
+
+
+def decompress_payload(payload, stats=None):
+    """Descomprime el payload de una trama con FLAG_COMPRESSED, sin pasar de MAX_FRAME_SIZE"""
+    start = time.thread_time()
+    decompressor = zlib.decompressobj()
+    try:
+        data = decompressor.decompress(payload, MAX_FRAME_SIZE)
+    except zlib.error as e:
+        raise ProtocolError(f"Trama comprimida inválida: {e}")
+    if decompressor.unconsumed_tail:
+        raise ProtocolError(f"Trama comprimida demasiado grande: más de {MAX_FRAME_SIZE} bytes")
+    if not decompressor.eof:
+        raise ProtocolError("Trama comprimida incompleta")
+    if stats is not None:
+        stats.add(len(data), len(payload), time.thread_time() - start)
+    return data
+
+
+class LinkStats:
+    """Salud de una conexión medida con pings: RTT y jitter como medias
+    exponenciales (como SRTT en TCP y el jitter de RTP) y tiempo sin recibir nada"""
+
+    RTT_GAIN = 1 / 8
+    JITTER_GAIN = 1 / 16
+
+    def __init__(self, now=None):
+        self.rtt = None       # Media del RTT en segundos (None hasta el primer pong)
+        self.jitter = 0.0     # Media de la variación entre RTT consecutivos
+        self.last_rtt = None
+        self.min_rtt = None
+        self.pings_sent = 0
+        self.pongs_received = 0
+        self.last_ping = None  # Instante del último ping enviado
+        self.last_received = time.monotonic() if now is None else now
+
+    def received(self, now):
+        """Han llegado datos: la conexión sigue viva"""
+        self.last_received = now
+
+    def idle(self, now):
+        """Segundos sin recibir nada"""
+        return now - self.last_received
+
+    def should_ping(self, now, interval):
+        return self.last_ping is None or now - self.last_ping >= interval
+
+    def ping(self, now):
+        """Devuelve la trama de un nuevo ping"""
+        self.pings_sent += 1
+        self.last_ping = now
+        return ping_frame(now)
+
+    def pong(self, payload, now):
+        """Registra la respuesta a uno de nuestros pings"""
+        if len(payload) != PING_PAYLOAD.size:
+            return
+        sample = now - PING_PAYLOAD.unpack(payload)[0] / 1e9
+        if sample < 0:
+            return
+        self.pongs_received += 1
+        if self.rtt is None:
+            self.rtt = sample
+        else:
+            self.jitter += (abs(sample - self.last_rtt) - self.jitter) * self.JITTER_GAIN
+            self.rtt += (sample - self.rtt) * self.RTT_GAIN
+        self.last_rtt = sample
+        self.min_rtt = sample if self.min_rtt is None else min(self.min_rtt, sample)
+
+    def to_dict(self, now=None):
+        """Métricas en milisegundos, para mostrar o registrar"""
+        now = time.monotonic() if now is None else now
+        ms = lambda seconds: None if seconds is None else round(seconds * 1000, 1)
+        return {
+            'rtt_ms': ms(self.rtt),
+            'jitter_ms': ms(self.jitter),
+            'min_rtt_ms': ms(self.min_rtt),
+            'pings_sent': self.pings_sent,
+            'pongs_received': self.pongs_received,
+            'idle_s': round(self.idle(now), 1),
+            'degraded': self.rtt is not None and self.rtt > DEGRADED_RTT
+        }
+
+
+class FrameDecoder:
+    """Decodificador incremental de tramas con prefijo de longitud.
+
+    Los datos se reciben directamente en un buffer preasignado con
+    recv_into y cada llamada a frames() extrae todas las tramas completas
+    sin volver a recorrer los bytes ya procesados.
+    """
+
+    def __init__(self, capacity=BUFFER_SIZE, stats=None):
+        self.buffer = bytearray(capacity)
+        self.stats = CompressionStats() if stats is None else stats  # Tramas comprimidas recibidas
+        self.view = memoryview(self.buffer)
+        self.start = 0  # Inicio de los datos pendientes de procesar
+        self.end = 0    # Fin de los datos recibidos
+
+    def pending(self):
+        """Número de bytes recibidos que todavía no forman una trama completa"""
+        return self.end - self.start
+
+    def _reserve(self, needed):
+        """Garantiza que caben `needed` bytes a partir del inicio de los datos pendientes"""
+        if self.start > 0:
+            # Compactar: mover lo pendiente al principio del buffer
+            pending = self.end - self.start
+            self.view[:pending] = self.view[self.start:self.end]
+            self.start = 0
+            self.end = pending
+        if needed > len(self.buffer):
+            # Crecer el buffer solo cuando una trama no cabe en él
+            new_buffer = bytearray(max(needed, len(self.buffer) * 2))
+            new_buffer[:self.end] = self.view[:self.end]
+            self.view.release()
+            self.buffer = new_buffer
+            self.view = memoryview(self.buffer)
+
+    def recv_from(self, sock):
+        """Lee del socket al buffer. Devuelve los bytes leídos (0 si se cerró la conexión)"""
+        if self.end == len(self.buffer):
+            self._reserve(max(self._needed(), self.pending() + 1))
+        received = sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def feed(self, data):
+        """Añade bytes ya recibidos por otra vía"""
+        if self.end + len(data) > len(self.buffer):
+            self._reserve(self.pending() + len(data))
+        self.view[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def _needed(self):
+        """Bytes necesarios para completar la siguiente trama"""
+        if self.pending() < FRAME_HEADER_SIZE:
+            return FRAME_HEADER_SIZE
+        _, _, length = FRAME_HEADER.unpack_from(self.buffer, self.start)
+        return FRAME_HEADER_SIZE + length
+
+    def frames(self):
+        """Extrae todas las tramas completas como tuplas (flags, payload).
+        Las comprimidas se entregan ya descomprimidas y sin FLAG_COMPRESSED"""
+        while self.pending() >= FRAME_HEADER_SIZE:
+            version, flags, length = FRAME_HEADER.unpack_from(self.buffer, self.start)
+            if version != PROTOCOL_VERSION:
+                raise ProtocolError(f"Versión de protocolo incompatible: {version} (se esperaba {PROTOCOL_VERSION})")
+            if length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Trama demasiado grande: {length} bytes")
+
+            frame_end = self.start + FRAME_HEADER_SIZE + length
+            if frame_end > self.end:
+                # Trama incompleta: reservar espacio para recibirla entera
+                if FRAME_HEADER_SIZE + length > len(self.buffer) - self.start:
+                    self._reserve(FRAME_HEADER_SIZE + length)
+                break
+
+            payload = bytes(self.view[self.start + FRAME_HEADER_SIZE:frame_end])
+            self.start = frame_end
+            if flags & FLAG_COMPRESSED:
+                payload = decompress_payload(payload, self.stats)
+                flags &= ~FLAG_COMPRESSED
+            yield flags, payload
+
+        if self.start == self.end:
+            # Todo procesado: reiniciar sin copiar nada
+            self.start = self.end = 0
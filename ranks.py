@@ -0,0 +1,48 @@
+"""Tablas de consulta para valores y palos.
+
+Sustituyen a VALUES.index(...) y SUITS.index(...), que recorren la lista en cada
+llamada, por diccionarios y una tabla de distancias circulares calculados una vez.
+"""
+from bisect import bisect_left
+from constants import VALUES, ALT_VALUES, SUITS
+
+NUM_RANKS = len(VALUES)
+
+# Índice de cada valor en VALUES (el As es 0) y en ALT_VALUES (el As va tras el Rey)
+VALUE_RANK = {value: rank for rank, value in enumerate(VALUES)}
+ALT_VALUE_RANK = {value: rank for rank, value in enumerate(ALT_VALUES)}
+
+# Índice de cada palo en SUITS
+SUIT_INDEX = {suit: index for index, suit in enumerate(SUITS)}
+
+# CIRCULAR_DISTANCE[a][b]: pasos hacia arriba de a hasta b en el orden circular ...K-A-2...
+CIRCULAR_DISTANCE = [[(b - a) % NUM_RANKS for b in range(NUM_RANKS)] for a in range(NUM_RANKS)]
+
+MAX_CIRCULAR_STARTS = 4096  # Entradas de la caché de circular_start antes de vaciarla
+_circular_starts = {}
+
+
+def circular_start(ranks):
+    """Rango desde el que una seguidilla con esos rangos queda más ordenada en el orden circular.
+
+    Para cada inicio posible, los rangos en orden circular desde él son una
+    rotación de los rangos ordenados, así que basta con ordenarlos una vez. El
+    desorden de cada inicio es la suma de las diferencias con la seguidilla
+    perfecta que empieza en él; en caso de empate gana el primero. El resultado
+    solo depende de los rangos y se guarda en caché.
+    """
+    key = tuple(ranks)
+    start = _circular_starts.get(key)
+    if start is None:
+        ordered = sorted(key)
+        min_disorder = None
+        for candidate in dict.fromkeys(key):
+            k = bisect_left(ordered, candidate)
+            rotated = ordered[k:] + ordered[:k]
+            disorder = sum(abs(rank - (candidate + i) % NUM_RANKS) for i, rank in enumerate(rotated))
+            if min_disorder is None or disorder < min_disorder:
+                min_disorder, start = disorder, candidate
+        if len(_circular_starts) >= MAX_CIRCULAR_STARTS:
+            _circular_starts.clear()
+        _circular_starts[key] = start
+    return start
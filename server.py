@@ -0,0 +1,402 @@
+"""Servidor dedicado sin interfaz gráfica: muchas mesas en un solo proceso.
+
+Uso:
+    python server.py --port 5555 --players 4 --max-tables 200
+
+Los clientes se conectan desde el menú indicando la mesa tras la dirección,
+por ejemplo 10.0.0.5:5555/mesa1. Su primer mensaje es {'hello': {'table': id}}
+y el lobby los sienta en esa mesa; la partida empieza cuando se llena y
+cada cliente recibe {'start_game': True} antes del primer estado. Si un
+jugador no vuelve a tiempo tras un corte, la partida de su mesa termina.
+
+Todas las mesas comparten un único bucle de eventos (network.EventLoopServer)
+y las acciones de los jugadores se procesan en ese hilo. Es deliberado: las
+reglas, los parches, la codificación y la compresión de una acción en una
+mesa de 4 cuestan unos 0,3 ms, unas 3000 acciones por segundo por proceso,
+de sobra para cientos de mesas con jugadores humanos. Para más, varios procesos.
+"""
+import argparse
+import signal
+import socket
+import threading
+import time
+import traceback
+from constants import (DEFAULT_PORT, GAME_STATE_ROUND_END, ACTION_START_NEW_ROUND, ACTION_LOG_DIR, SESSION_GRACE_PERIOD,
+                       COMPRESSION_THRESHOLD)
+from network import EventLoopServer, StatePublisher, pack_message, unpack_message
+from protocol import CompressionStats
+from engine import GameEngine
+from actionlog import ActionLog, log_path
+from session import SessionTable
+
+MAX_PLAYERS_PER_TABLE = 13
+DEFAULT_PLAYERS_PER_TABLE = 4
+DEFAULT_MAX_TABLES = 500
+DEFAULT_MAX_CLIENTS = 4000
+DEFAULT_ROUND_PAUSE = 10.0    # Segundos que se muestran las puntuaciones antes de la siguiente ronda
+DEFAULT_SHUTDOWN_TIMEOUT = 5.0  # Segundos para enviar lo pendiente al cerrar
+
+
+class Table:
+    """Una mesa: un motor de juego y los clientes sentados en ella"""
+
+    def __init__(self, table_id, server, seats, round_pause=DEFAULT_ROUND_PAUSE, log_dir=ACTION_LOG_DIR,
+                 grace_period=SESSION_GRACE_PERIOD, compress_threshold=COMPRESSION_THRESHOLD):
+        self.table_id = table_id
+        self.server = server
+        self.seats = seats
+        self.round_pause = round_pause
+        self.log_dir = log_dir  # Directorio de los registros de acciones ('' para no guardarlos)
+        self.connections = []  # Clientes sentados y conectados; connection.id es su asiento
+        self.sessions = SessionTable(grace_period)  # Asientos ocupados, también los reservados tras un corte
+        self.engine = None     # Se crea al empezar la partida
+        self.ended = False     # La partida terminó porque un jugador no volvió
+        self.round_end_time = None
+        self.publisher = StatePublisher(server, GameEngine.state_view, compress_threshold)
+        self.lock = threading.Lock()
+
+    def is_full(self):
+        return len(self.sessions) >= self.seats
+
+    def is_started(self):
+        return self.engine is not None
+
+    def is_abandoned(self):
+        """Nadie conectado ni ningún asiento reservado (o la partida terminó): la mesa se puede cerrar"""
+        return not self.connections and (self.ended or not len(self.sessions))
+
+    def sit(self, connection):
+        """Sienta al cliente en el primer asiento libre y devuelve su sesión, o None si no cabe"""
+        with self.lock:
+            if self.is_started() or self.is_full():
+                return None
+            taken = self.sessions.seats()
+            seat = next(i for i in range(self.seats) if i not in taken)
+            session = self.sessions.open(seat, connection)
+            connection.table = self
+            self.connections.append(connection)
+            return session
+
+    def resume(self, connection, token):
+        """Devuelve al cliente el asiento de su sesión. Devuelve la sesión o None si caducó"""
+        with self.lock:
+            if self.ended:
+                return None
+            session, previous = self.sessions.resume(token, connection)
+            if session is None:
+                return None
+            connection.table = self
+            self.connections = [c for c in self.connections if c is not previous] + [connection]
+        if previous is not None:
+            self.server.close(previous)
+        return session
+
+    def catch_up(self, connection, session, version):
+        """Envía a un cliente que vuelve lo que se perdió desde la versión que tiene"""
+        with self.lock:
+            if self.engine is not None:
+                self.publisher.send_catch_up(connection, session.view_at(version))
+
+    def leave(self, connection):
+        """Quita al cliente de la mesa y le reserva el asiento. Devuelve True si la mesa se ha quedado vacía"""
+        with self.lock:
+            self.connections = [c for c in self.connections if c is not connection]
+            session = self.sessions.disconnect(connection)
+            if session is not None and (not self.is_started() or self.ended):
+                # Sin partida no hay nada que reanudar: que el asiento lo ocupe otro
+                self.sessions.release(session)
+            elif session is not None:
+                print(f"[Mesa {self.table_id}] Asiento {connection.id} reservado "
+                      f"{self.sessions.grace_period:.0f} s para que el cliente vuelva")
+            return self.is_abandoned()
+
+    def close(self):
+        """Libera lo que usa la mesa al cerrarla"""
+        with self.lock:
+            if self.engine is not None and self.engine.action_log is not None:
+                self.engine.action_log.close()
+
+    def start(self):
+        """Reparte y envía el estado inicial a todos los jugadores"""
+        with self.lock:
+            self.engine = GameEngine(self.seats)
+            if self.log_dir:
+                self.engine.action_log = ActionLog(log_path(self.log_dir, f"mesa-{self.table_id}", self.engine.deck.seed))
+            self.engine.start_game(self.seats)
+            # Antes del primer estado, para que los clientes dejen de esperar a que se llene la mesa
+            for connection in self.connections:
+                self.server.send(connection, pack_message({'start_game': True, 'client_id': connection.id}))
+            self._publish()
+        print(f"[Mesa {self.table_id}] Partida iniciada con {self.seats} jugadores (semilla {self.engine.deck.seed})")
+
+    def handle(self, connection, message):
+        """Procesa un mensaje de un cliente sentado en la mesa"""
+        if 'action' in message:
+            # El asiento lo decide la conexión, no lo que diga el cliente
+            action = dict(message['action'])
+            action['player_id'] = connection.id
+            with self.lock:
+                if self.engine is None or self.ended:
+                    return
+                events = self.engine.apply(action)
+                if events:
+                    if self.engine.state == GAME_STATE_ROUND_END:
+                        self.round_end_time = time.monotonic()
+                    self._publish()
+        elif 'resync' in message:
+            self.publisher.send_snapshot(connection)
+
+    def tick(self, now):
+        """Tareas periódicas: liberar los asientos reservados que caducan y empezar
+        la siguiente ronda tras mostrar las puntuaciones"""
+        expired = self.sessions.expire(now)
+        for session in expired:
+            print(f"[Mesa {self.table_id}] Asiento {session.seat} liberado: el cliente no volvió a tiempo")
+        if expired and self.is_started():
+            # Sin ese jugador la partida se quedaría esperando su turno
+            self.end(f"el jugador del asiento {expired[0].seat} abandonó la partida")
+            return
+        with self.lock:
+            if self.engine is None or self.ended or self.round_end_time is None:
+                return
+            if now - self.round_end_time >= self.round_pause:
+                self.round_end_time = None
+                self.engine.apply_system({'type': ACTION_START_NEW_ROUND})
+                self._publish()
+
+    def end(self, reason):
+        """Termina la partida: avisa a los jugadores que quedan y cierra sus conexiones"""
+        with self.lock:
+            if self.ended:
+                return
+            self.ended = True
+            self.round_end_time = None
+            connections = list(self.connections)
+        print(f"[Mesa {self.table_id}] Partida terminada: {reason}")
+        notice = pack_message({'shutdown': True, 'reason': reason})
+        for connection in connections:
+            self.server.send(connection, notice)
+            self.server.close(connection)
+
+    def _publish(self):
+        """Difunde el estado actual con una nueva versión. Se llama con el cerrojo adquirido"""
+        self.engine.version += 1
+        self.publisher.publish(self.engine.to_dict(), list(self.connections))
+        if self.engine.action_log is not None:
+            self.engine.action_log.published(self.engine)
+
+
+class Lobby:
+    """Acepta clientes y los reparte entre las mesas según la mesa que piden"""
+
+    def __init__(self, host='0.0.0.0', port=DEFAULT_PORT, players_per_table=DEFAULT_PLAYERS_PER_TABLE,
+                 max_tables=DEFAULT_MAX_TABLES, max_clients=DEFAULT_MAX_CLIENTS,
+                 round_pause=DEFAULT_ROUND_PAUSE, log_dir=ACTION_LOG_DIR, grace_period=SESSION_GRACE_PERIOD,
+                 compress_threshold=COMPRESSION_THRESHOLD):
+        if not 2 <= players_per_table <= MAX_PLAYERS_PER_TABLE:
+            raise ValueError(f"Una mesa debe tener entre 2 y {MAX_PLAYERS_PER_TABLE} jugadores")
+        self.host = host
+        self.port = port
+        self.players_per_table = players_per_table
+        self.max_tables = max_tables
+        self.max_clients = max_clients
+        self.round_pause = round_pause
+        self.log_dir = log_dir
+        self.grace_period = grace_period
+        self.compress_threshold = compress_threshold  # None: tramas sin comprimir
+        self.compression = CompressionStats()  # Compresión de las mesas ya cerradas
+        self.tables = {}
+        self.client_count = 0
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.server = None
+
+    def start(self):
+        """Abre el puerto y arranca el bucle de eventos y las tareas periódicas"""
+        listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listen_socket.bind((self.host, self.port))
+        listen_socket.listen(socket.SOMAXCONN)
+        self.server = EventLoopServer(
+            listen_socket,
+            on_connect=self._on_connect,
+            on_message=self._on_message,
+            on_disconnect=self._on_disconnect
+        )
+        self.server.start()
+        threading.Thread(target=self._tick_loop, daemon=True).start()
+        print(f"Servidor dedicado escuchando en {self.host}:{self.port} "
+              f"({self.players_per_table} jugadores por mesa, máximo {self.max_tables} mesas)")
+
+    def serve_forever(self):
+        """Atiende a los clientes hasta que se pida el cierre"""
+        self.start()
+        while not self.stopping.wait(1.0):
+            pass
+        self._shutdown()
+
+    def stop(self):
+        """Pide el cierre ordenado del servidor. Se puede llamar desde cualquier hilo o señal"""
+        self.stopping.set()
+
+    def _shutdown(self, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+        """Avisa a los clientes, envía lo que quede en cola y cierra"""
+        print("Cerrando el servidor...")
+        with self.lock:
+            connections = [c for table in self.tables.values() for c in table.connections]
+        notice = pack_message({'shutdown': True})
+        for connection in connections:
+            self.server.send(connection, notice)
+        if not self.server.drain(timeout):
+            print("Algunos clientes no recibieron todos los datos antes del cierre")
+        self.server.stop()
+        print("Servidor cerrado")
+
+    def _on_connect(self, connection):
+        connection.table = None
+        with self.lock:
+            self.client_count += 1
+            full = self.client_count > self.max_clients
+        if full:
+            self._reject(connection, "servidor lleno")
+
+    def _on_message(self, connection, message_data):
+        try:
+            message = unpack_message(message_data)
+            if connection.table is not None:
+                connection.table.handle(connection, message)
+            elif 'hello' in message:
+                self._route(connection, message['hello'])
+            else:
+                self._reject(connection, "se esperaba el saludo con la mesa")
+        except Exception as e:
+            print(f"Error al procesar un mensaje de {connection.address}: {e}")
+            traceback.print_exc()
+
+    def _route(self, connection, hello):
+        """Sienta al cliente en la mesa que pide, creándola si no existe, o le devuelve su asiento si reanuda"""
+        table_id = str(hello.get('table') or 'default')
+        if hello.get('resume'):
+            self._resume(connection, table_id, hello)
+            return
+        with self.lock:
+            table = self.tables.get(table_id)
+            if table is None:
+                if len(self.tables) >= self.max_tables:
+                    self._reject(connection, "no se admiten más mesas")
+                    return
+                table = Table(table_id, self.server, self.players_per_table, self.round_pause, self.log_dir,
+                              self.grace_period, self.compress_threshold)
+                self.tables[table_id] = table
+            session = table.sit(connection)
+        if session is None:
+            self._reject(connection, f"la mesa {table_id} está completa o ya ha empezado")
+            return
+        connection.compression = table.publisher.accepts_compression(hello)
+        self.server.send(connection, pack_message({'client_id': session.seat, 'session': session.token,
+                                                   'resumed': False, 'compression': connection.compression}))
+        print(f"[Mesa {table_id}] Cliente {connection.address} sentado en el asiento {session.seat}")
+        if table.is_full():
+            table.start()
+
+    def _resume(self, connection, table_id, hello):
+        with self.lock:
+            table = self.tables.get(table_id)
+        session = table.resume(connection, hello['resume']) if table is not None else None
+        if session is None:
+            self._reject(connection, "la sesión ha caducado")
+            return
+        connection.compression = table.publisher.accepts_compression(hello)
+        self.server.send(connection, pack_message({'client_id': session.seat, 'session': session.token,
+                                                   'resumed': True, 'compression': connection.compression}))
+        print(f"[Mesa {table_id}] Cliente {connection.address} vuelve al asiento {session.seat}")
+        table.catch_up(connection, session, hello.get('version'))
+
+    def _reject(self, connection, reason):
+        print(f"Conexión de {connection.address} rechazada: {reason}")
+        self.server.send(connection, pack_message({'error': reason}))
+        self.server.close(connection)
+
+    def _on_disconnect(self, connection):
+        with self.lock:
+            self.client_count -= 1
+            table = connection.table
+            if table is not None and table.leave(connection):
+                # Mesa vacía: liberarla
+                self._close_table(table)
+
+    def _close_table(self, table):
+        """Quita una mesa abandonada. Se llama con el cerrojo adquirido"""
+        if self.tables.get(table.table_id) is table:
+            del self.tables[table.table_id]
+            table.close()
+            with table.publisher.lock:
+                self.compression.merge(table.publisher.compression)
+            print(f"[Mesa {table.table_id}] Cerrada")
+
+    def _tick_loop(self):
+        while not self.stopping.wait(0.5):
+            with self.lock:
+                tables = list(self.tables.values())
+            now = time.monotonic()
+            for table in tables:
+                try:
+                    table.tick(now)
+                    if table.is_abandoned():
+                        with self.lock:
+                            self._close_table(table)
+                except Exception as e:
+                    print(f"[Mesa {table.table_id}] Error en las tareas periódicas: {e}")
+                    traceback.print_exc()
+
+    def stats(self):
+        """Resumen del servidor: mesas, clientes, colas de salida y compresión de los estados"""
+        compression = CompressionStats()
+        with self.lock:
+            tables = len(self.tables)
+            started = sum(1 for table in self.tables.values() if table.is_started())
+            clients = self.client_count
+            compression.merge(self.compression)
+            for table in self.tables.values():
+                with table.publisher.lock:
+                    compression.merge(table.publisher.compression)
+        return {
+            'tables': tables,
+            'started_tables': started,
+            'clients': clients,
+            'evictions': self.server.evictions if self.server else 0,
+            'dead_peers': self.server.dead_peers if self.server else 0,
+            'compression': compression.to_dict(),
+            'connections': self.server.stats() if self.server else []
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor dedicado de Rummy 500 con varias mesas")
+    parser.add_argument('--host', default='0.0.0.0', help="Interfaz en la que escuchar")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Puerto TCP")
+    parser.add_argument('--players', type=int, default=DEFAULT_PLAYERS_PER_TABLE,
+                        help="Jugadores por mesa; la partida empieza cuando la mesa se llena")
+    parser.add_argument('--max-tables', type=int, default=DEFAULT_MAX_TABLES, help="Mesas simultáneas como máximo")
+    parser.add_argument('--max-clients', type=int, default=DEFAULT_MAX_CLIENTS, help="Clientes conectados como máximo")
+    parser.add_argument('--round-pause', type=float, default=DEFAULT_ROUND_PAUSE,
+                        help="Segundos entre el final de una ronda y el inicio de la siguiente")
+    parser.add_argument('--grace-period', type=float, default=SESSION_GRACE_PERIOD,
+                        help="Segundos que se reserva el asiento de un cliente desconectado")
+    parser.add_argument('--log-dir', default=ACTION_LOG_DIR,
+                        help="Directorio de los registros de acciones de las mesas ('' para no guardarlos)")
+    parser.add_argument('--compress-threshold', type=int, default=COMPRESSION_THRESHOLD,
+                        help="Bytes a partir de los cuales se comprimen los estados (menor en WAN, mayor en LAN)")
+    parser.add_argument('--no-compression', action='store_true', help="No comprimir los estados enviados")
+    args = parser.parse_args()
+
+    lobby = Lobby(args.host, args.port, args.players, args.max_tables, args.max_clients, args.round_pause,
+                  args.log_dir, args.grace_period, None if args.no_compression else args.compress_threshold)
+    # Cierre ordenado con Ctrl+C o SIGTERM
+    signal.signal(signal.SIGINT, lambda signum, frame: lobby.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: lobby.stop())
+    lobby.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
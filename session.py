@@ -0,0 +1,133 @@
+"""Sesiones de los jugadores: volver al mismo asiento tras un corte de conexión.
+
+Al sentarse, cada cliente recibe un token de sesión. Si su conexión se cae, el
+asiento queda reservado durante un periodo de gracia. El cliente vuelve a
+conectarse presentando el token y la versión del último estado que tiene, y
+recupera su asiento e ID. Solo recibe el parche desde esa versión, o el estado
+completo si el host ya no la conserva.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from constants import SESSION_GRACE_PERIOD, SESSION_VIEW_HISTORY
+
+SESSION_TOKEN_BYTES = 16
+
+
+class Session:
+    """Asiento de un jugador y lo necesario para reanudarlo"""
+
+    def __init__(self, token, seat):
+        self.token = token
+        self.seat = seat
+        self.connection = None       # Conexión actual (None mientras está desconectado)
+        self.disconnected_at = None  # Momento de la desconexión (time.monotonic)
+        self.views = OrderedDict()   # Últimas vistas enviadas al cliente, por versión
+
+    def remember(self, view):
+        """Guarda una vista enviada al cliente para poder enviarle después solo lo que cambie"""
+        version = view.get('version')
+        self.views[version] = view
+        self.views.move_to_end(version)
+        while len(self.views) > SESSION_VIEW_HISTORY:
+            self.views.popitem(last=False)
+
+    def view_at(self, version):
+        """Vista que se envió al cliente con esa versión, si todavía se conserva"""
+        return self.views.get(version)
+
+
+class SessionTable:
+    """Sesiones de una partida o mesa. Se puede usar desde varios hilos"""
+
+    def __init__(self, grace_period=SESSION_GRACE_PERIOD):
+        self.grace_period = grace_period
+        self.sessions = {}  # token -> Session
+        self.lock = threading.Lock()
+
+    def open(self, seat, connection):
+        """Crea la sesión de un cliente que se acaba de sentar en `seat`"""
+        session = Session(secrets.token_hex(SESSION_TOKEN_BYTES), seat)
+        with self.lock:
+            self.sessions[session.token] = session
+            self._attach(session, connection)
+        return session
+
+    def resume(self, token, connection):
+        """Asocia una conexión nueva a la sesión del token.
+
+        Devuelve (sesión, conexión anterior) o (None, None) si el token no
+        existe o ya caducó. La conexión anterior, si sigue abierta (p. ej. a
+        medio cerrar tras un corte de wifi), la debe cerrar el llamante.
+        """
+        now = time.monotonic()
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None:
+                return None, None
+            if session.disconnected_at is not None and now - session.disconnected_at >= self.grace_period:
+                # Caducada aunque nadie la haya liberado todavía con expire()
+                del self.sessions[token]
+                return None, None
+            previous = session.connection
+            self._attach(session, connection)
+            return session, previous
+
+    def _attach(self, session, connection):
+        session.connection = connection
+        session.disconnected_at = None
+        connection.id = session.seat
+        connection.session = session
+
+    def disconnect(self, connection, now=None):
+        """Marca como desconectada la sesión de la conexión y devuelve la sesión (o None)"""
+        session = getattr(connection, 'session', None)
+        with self.lock:
+            if session is None or session.connection is not connection:
+                return None  # Ya la ha reanudado otra conexión
+            session.connection = None
+            session.disconnected_at = time.monotonic() if now is None else now
+            return session
+
+    def expire(self, now=None):
+        """Libera los asientos cuyo periodo de gracia ha terminado y devuelve sus sesiones"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            expired = [session for session in self.sessions.values()
+                       if session.disconnected_at is not None
+                       and now - session.disconnected_at >= self.grace_period]
+            for session in expired:
+                del self.sessions[session.token]
+        return expired
+
+    def release(self, session):
+        """Libera el asiento de una sesión sin esperar al periodo de gracia"""
+        with self.lock:
+            self.sessions.pop(session.token, None)
+
+    def compact(self, first_seat=0):
+        """Antes de empezar la partida: libera los asientos reservados y numera los
+        ocupados seguidos desde first_seat, en su orden. Devuelve las sesiones que quedan"""
+        with self.lock:
+            sessions = sorted((session for session in self.sessions.values() if session.connection is not None),
+                              key=lambda session: session.seat)
+            self.sessions = {session.token: session for session in sessions}
+            for seat, session in enumerate(sessions, first_seat):
+                session.seat = seat
+                session.connection.id = seat
+            return sessions
+
+    def seats(self):
+        """Asientos ocupados, con el jugador conectado o reservados"""
+        with self.lock:
+            return {session.seat for session in self.sessions.values()}
+
+    def reserved(self):
+        """Sesiones desconectadas que aún pueden reanudarse"""
+        with self.lock:
+            return [session for session in self.sessions.values() if session.connection is None]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.sessions)
@@ -0,0 +1,309 @@
+"""Simulador de partidas sin interfaz: bots que juegan contra sí mismos.
+
+Uso:
+    python simulator.py --games 2000 --players 4 --policies greedy,greedy,random,random
+
+Los bots envían al motor (engine.GameEngine.apply) las mismas acciones que los
+clientes por la red: tomar del mazo, tomar del descarte, rechazar el descarte,
+bajarse, añadir a una combinación y descartar. Cada partida son las cuatro
+rondas y se reproduce con su semilla. Las partidas se reparten entre procesos
+con ProcessPoolExecutor y al final se muestran estadísticas agregadas.
+"""
+import argparse
+import contextlib
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from constants import *
+from engine import GameEngine, EVENT_DECK_RESHUFFLED, EVENT_DISCARD_OFFER_ENDED, EVENT_TURN_START, EVENT_ROUND_END
+from actionlog import ActionLog, log_path
+
+DEFAULT_GAMES = 1000
+DEFAULT_PLAYERS = 4
+DEFAULT_MAX_TURNS_PER_ROUND = 400  # Rondas que se alargan más se dan por atascadas
+
+
+class Bot:
+    """Política de juego. choose_* devuelven la acción a enviar al motor (o None)"""
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def wants_discard(self, engine, player, card):
+        """Decide si toma la carta del descarte (al empezar el turno o durante la oferta)"""
+        return False
+
+    def choose_additions(self, engine, player):
+        """Acciones de añadir cartas a combinaciones de la mesa, de una en una"""
+        return None
+
+    def choose_discard(self, engine, player):
+        """Índice de la carta a descartar"""
+        return self.rng.randrange(len(player.hand))
+
+
+class RandomBot(Bot):
+    """Decide al azar: sirve de referencia y para encontrar estados raros"""
+
+    def wants_discard(self, engine, player, card):
+        return self.rng.random() < 0.3
+
+    def choose_additions(self, engine, player):
+        if not player.has_laid_down or self.rng.random() < 0.5:
+            return None
+        options = [(card_idx, target) for card_idx, card in enumerate(player.hand)
+                   for target in engine.combination_targets(card)]
+        return self.rng.choice(options) if options else None
+
+
+class GreedyBot(Bot):
+    """Se baja en cuanto puede, coloca todo lo que cabe en la mesa y descarta la carta
+    más cara que no forma pareja ni es vecina de otra del mismo palo"""
+
+    def _is_useful(self, player, card, ignore_idx=None):
+        if card.is_joker:
+            return True
+        for idx, other in enumerate(player.hand):
+            if idx == ignore_idx or other.is_joker:
+                continue
+            if other.rank == card.rank:
+                return True
+            if other.suit == card.suit and abs(other.rank - card.rank) <= 2:
+                return True
+        return False
+
+    def wants_discard(self, engine, player, card):
+        return self._is_useful(player, card)
+
+    def choose_additions(self, engine, player):
+        if not player.has_laid_down:
+            return None
+        for card_idx, card in enumerate(player.hand):
+            targets = engine.combination_targets(card)
+            if targets:
+                return card_idx, targets[0]
+        return None
+
+    def choose_discard(self, engine, player):
+        candidates = [idx for idx, card in enumerate(player.hand)
+                      if not self._is_useful(player, card, ignore_idx=idx)]
+        if not candidates:
+            candidates = [idx for idx, card in enumerate(player.hand) if not card.is_joker] or list(range(len(player.hand)))
+        return max(candidates, key=lambda idx: (player.hand[idx].points, idx))
+
+
+POLICIES = {
+    'random': RandomBot,
+    'greedy': GreedyBot,
+}
+
+
+class Simulation:
+    """Una partida completa entre bots"""
+
+    def __init__(self, seed, policies, max_turns_per_round=DEFAULT_MAX_TURNS_PER_ROUND, log_dir=None):
+        self.seed = seed
+        self.policies = policies
+        self.max_turns_per_round = max_turns_per_round
+        self.log_dir = log_dir  # Si se indica, cada partida deja su registro de acciones
+        self.engine = None
+        self.bots = []
+        self.turns = 0
+        self.round_turns = 0
+        self.actions = 0
+        self.reshuffles = 0
+        self.stalled_rounds = 0
+        self.round_winners = []
+        self.offer_done = False  # La oferta del descarte ya se hizo en este turno
+
+    def run(self):
+        self.bots = [POLICIES[name](random.Random(self.seed * 1000 + seat))
+                     for seat, name in enumerate(self.policies)]
+        self.engine = GameEngine(len(self.policies), seed=self.seed)
+        if self.log_dir:
+            self.engine.action_log = ActionLog(log_path(self.log_dir, 'simulacion', self.seed))
+        self.engine.start_game(len(self.policies))
+        self._publish()
+        for round_num in range(len(ROUNDS)):
+            if round_num:
+                self._publish(self.engine.apply_system({'type': ACTION_START_NEW_ROUND}))
+            self._play_round()
+        if self.engine.action_log is not None:
+            self.engine.action_log.close()
+        scores = [player.score for player in self.engine.players]
+        return {
+            'seed': self.seed,
+            'turns': self.turns,
+            'actions': self.actions,
+            'reshuffles': self.reshuffles,
+            'stalled_rounds': self.stalled_rounds,
+            'round_winners': self.round_winners,
+            'scores': scores,
+            'winner': scores.index(min(scores))
+        }
+
+    def _play_round(self):
+        self.round_turns = 1
+        self.offer_done = False
+        self.turns += 1
+        while self.engine.state == GAME_STATE_PLAYING:
+            if self.round_turns > self.max_turns_per_round or not self._step():
+                # Nadie puede cerrar la ronda (o nadie puede robar): se puntúa tal cual
+                self.stalled_rounds += 1
+                self._publish(self.engine.apply_system({'type': ACTION_END_ROUND, 'winner': None}))
+                self.round_winners.append(None)
+                return
+
+    def _publish(self, events=True):
+        """Nueva versión del estado, como la que difundiría el host (solo importa para el registro)"""
+        if events and self.engine.action_log is not None:
+            self.engine.version += 1
+            self.engine.action_log.published(self.engine)
+
+    def _apply(self, action):
+        self.actions += 1
+        events = self.engine.apply(action)
+        self._publish(events)
+        for event in events:
+            if event['type'] == EVENT_TURN_START:
+                self.turns += 1
+                self.round_turns += 1
+                self.offer_done = False
+            elif event['type'] == EVENT_DISCARD_OFFER_ENDED:
+                self.offer_done = True
+            elif event['type'] == EVENT_DECK_RESHUFFLED:
+                self.reshuffles += 1
+            elif event['type'] == EVENT_ROUND_END:
+                self.round_winners.append(event['winner'])
+        return bool(events)
+
+    def _step(self):
+        """Un paso del jugador que debe actuar. Devuelve False si la partida no puede avanzar"""
+        engine = self.engine
+        top = engine.discard_pile.cards[-1] if engine.discard_pile.cards else None
+
+        # Oferta del descarte a otro jugador: la toma con penalización o la pasa
+        if engine.discard_offer:
+            player_id = engine.discard_offered_to
+            player = engine.players[player_id]
+            if top is not None and self.bots[player_id].wants_discard(engine, player, top):
+                return self._apply({'type': 'take_discard_penalty', 'player_id': player_id, 'is_penalty': True})
+            return self._apply({'type': 'reject_discard', 'player_id': player_id})
+
+        player_id = engine.current_player_idx
+        player = engine.players[player_id]
+        bot = self.bots[player_id]
+
+        # Robar
+        if not (player.took_discard or player.took_penalty):
+            if top is not None and not self.offer_done:
+                if bot.wants_discard(engine, player, top):
+                    return self._apply({'type': ACTION_DRAW_DISCARD, 'player_id': player_id, 'is_penalty': False})
+                self.offer_done = True
+                return self._apply({'type': 'reject_discard', 'player_id': player_id})
+            if self._apply({'type': ACTION_DRAW_DECK, 'player_id': player_id}):
+                return True
+            # Mazo y descarte agotados
+            return top is not None and self._apply({'type': ACTION_DRAW_DISCARD, 'player_id': player_id, 'is_penalty': False})
+
+        # Bajarse y colocar cartas en la mesa
+        if player.can_lay_down(engine.round_num) and not (engine.round_num == 3 and player.has_laid_down):
+            if self._apply({'type': ACTION_PLAY_COMBINATION, 'player_id': player_id}):
+                return True
+        addition = bot.choose_additions(engine, player)
+        if addition is not None and len(player.hand) > 1:
+            card_idx, (target_player_idx, combination_idx) = addition
+            if self._apply({'type': ACTION_ADD_TO_COMBINATION, 'player_id': player_id, 'card_idx': card_idx,
+                            'combination_idx': combination_idx, 'target_player_idx': target_player_idx}):
+                return True
+
+        # Descartar
+        return self._apply({'type': ACTION_DISCARD, 'player_id': player_id,
+                            'card_idx': bot.choose_discard(engine, player)})
+
+
+_devnull = None
+
+
+def play_game(seed, policies, max_turns_per_round=DEFAULT_MAX_TURNS_PER_ROUND, log_dir=None):
+    """Juega una partida sin mostrar los mensajes del motor y devuelve su resumen"""
+    global _devnull
+    if _devnull is None:
+        _devnull = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(_devnull):
+        return Simulation(seed, policies, max_turns_per_round, log_dir).run()
+
+
+def _play_game_args(args):
+    return play_game(*args)
+
+
+def run_batch(games, policies, seed=0, workers=None, max_turns_per_round=DEFAULT_MAX_TURNS_PER_ROUND, log_dir=None):
+    """Juega `games` partidas con semillas seed, seed+1, ... y devuelve (resultados, segundos)"""
+    jobs = [(seed + i, list(policies), max_turns_per_round, log_dir) for i in range(games)]
+    start = time.perf_counter()
+    if workers == 1:
+        results = [_play_game_args(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, games // ((workers or os.cpu_count() or 1) * 8))
+            results = list(executor.map(_play_game_args, jobs, chunksize=chunksize))
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed, policies):
+    """Estadísticas agregadas de un lote de partidas"""
+    games = len(results)
+    rounds = games * len(ROUNDS)
+    winners = Counter(result['winner'] for result in results)
+    return {
+        'games': games,
+        'seconds': elapsed,
+        'games_per_second': games / elapsed if elapsed else 0.0,
+        'average_turns': sum(r['turns'] for r in results) / games if games else 0.0,
+        'average_actions': sum(r['actions'] for r in results) / games if games else 0.0,
+        'deck_exhaustion_rate': sum(1 for r in results if r['reshuffles']) / games if games else 0.0,
+        'stalled_round_rate': sum(r['stalled_rounds'] for r in results) / rounds if rounds else 0.0,
+        'winners': {seat: winners.get(seat, 0) for seat in range(len(policies))},
+        'winners_by_policy': dict(Counter(policies[seat] for seat in winners.elements()))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de partidas de Rummy 500 entre bots")
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES, help="Número de partidas")
+    parser.add_argument('--players', type=int, default=DEFAULT_PLAYERS, help="Jugadores por partida")
+    parser.add_argument('--policies', default='greedy',
+                        help=f"Políticas separadas por comas, una por asiento ({', '.join(POLICIES)}); "
+                             "si hay menos que jugadores se repite la última")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla de la primera partida")
+    parser.add_argument('--workers', type=int, default=None, help="Procesos (1 para no usar el pool)")
+    parser.add_argument('--max-turns', type=int, default=DEFAULT_MAX_TURNS_PER_ROUND,
+                        help="Turnos por ronda antes de darla por atascada")
+    parser.add_argument('--log-dir', default=None, help="Guarda el registro de acciones de cada partida en este directorio")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.policies.split(',') if name.strip()]
+    unknown = [name for name in names if name not in POLICIES]
+    if unknown or not names:
+        parser.error(f"Política desconocida: {', '.join(unknown) or args.policies}")
+    if not 2 <= args.players <= len(PLAYER_COLORS):
+        parser.error(f"El número de jugadores debe estar entre 2 y {len(PLAYER_COLORS)}")
+    policies = (names + [names[-1]] * args.players)[:args.players]
+
+    results, elapsed = run_batch(args.games, policies, args.seed, args.workers, args.max_turns, args.log_dir)
+    stats = summarize(results, elapsed, policies)
+    print(f"Partidas: {stats['games']} en {stats['seconds']:.1f} s ({stats['games_per_second']:.1f} partidas/s)")
+    print(f"Turnos por partida: {stats['average_turns']:.1f}  Acciones por partida: {stats['average_actions']:.1f}")
+    print(f"Partidas con el mazo agotado: {stats['deck_exhaustion_rate']:.1%}")
+    print(f"Rondas atascadas: {stats['stalled_round_rate']:.1%}")
+    print("Victorias por asiento:")
+    for seat, wins in stats['winners'].items():
+        print(f"  Jugador {seat + 1} ({policies[seat]}): {wins} ({wins / stats['games']:.1%})")
+    print("Victorias por política: " + ", ".join(f"{name} {wins}" for name, wins in stats['winners_by_policy'].items()))
+
+
+if __name__ == "__main__":
+    main()
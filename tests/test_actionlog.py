@@ -0,0 +1,78 @@
+import contextlib
+import io
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pytest
+from constants import ACTION_DRAW_DECK, ACTION_DISCARD, GAME_STATE_ROUND_END
+from actionlog import Replayer, read_records, log_path, RECORD_ACTION
+from game import Game
+from player import Hand
+from simulator import Simulation
+
+
+class FakeNetwork:
+    """Host sin sockets: guarda los estados difundidos"""
+
+    def __init__(self, players=2):
+        self.players = players
+        self.sent = []
+        self.state_view = None
+
+    def get_player_count(self):
+        return self.players
+
+    def get_id(self):
+        return 0
+
+    def is_host(self):
+        return True
+
+    def send_game_state(self, state):
+        self.sent.append(state)
+        return True
+
+
+def _host_game(tmp_path, monkeypatch):
+    monkeypatch.setattr('game.ACTION_LOG_DIR', str(tmp_path))
+    game = Game(FakeNetwork())
+    game.finish_deal()
+    return game
+
+
+def test_winning_move_is_recorded_as_the_player_action(tmp_path, monkeypatch):
+    game = _host_game(tmp_path, monkeypatch)
+    player_id = game.current_player_idx
+    player = game.players[player_id]
+    assert game.submit({'type': ACTION_DRAW_DECK, 'player_id': player_id})
+    player.hand = Hand([player.hand[0]])
+    player.has_laid_down = player.has_completed_round_requirement = True
+    game.action_log.snapshot(game)  # La mano se ha tocado a mano: partir de aquí
+
+    discard = {'type': ACTION_DISCARD, 'player_id': player_id, 'card_idx': 0}
+    assert game.submit(discard)
+    assert game.state == GAME_STATE_ROUND_END
+    game.action_log.close()
+
+    actions = [record.payload for record in read_records(game.action_log.path) if record.kind == RECORD_ACTION]
+    assert actions[-1] == discard
+    replayed = Replayer(game.action_log.path).state_at(game.version + 1)
+    assert replayed.state == GAME_STATE_ROUND_END
+    assert [p.score for p in replayed.players] == [p.score for p in game.players]
+
+
+def _final_state(engine):
+    state = engine.to_dict()
+    state.pop('timestamp')
+    state.pop('version')
+    return state
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_replay_matches_a_multi_deck_game(tmp_path, seed):
+    simulation = Simulation(seed, ['greedy', 'random', 'greedy', 'random'], log_dir=str(tmp_path))
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulation.run()
+        assert simulation.engine.deck.num_decks > 1
+        replayed = Replayer(log_path(str(tmp_path), 'simulacion', seed)).state_at()
+    assert _final_state(replayed) == _final_state(simulation.engine)
@@ -0,0 +1,51 @@
+import contextlib
+import io
+from constants import MAX_STALLED_STATES
+from network import Connection, EventLoopServer
+
+
+def _server(**limits):
+    # Sin arrancar el bucle: solo se prueban las colas de salida
+    return EventLoopServer(None, None, None, None, **limits)
+
+
+def _state(version):
+    return {'version': version}
+
+
+def test_latest_pending_state_wins():
+    server, connection = _server(), Connection(None, None)
+    for version in range(1, 4):
+        assert server.send_state(connection, _state(version), b'v%d' % version, None)
+    state, buffers = connection.pending_state
+    assert state == _state(3) and [bytes(buffer) for buffer in buffers] == [b'v3']
+    assert connection.dropped_states == 2 and connection.queue_depth() == 1
+    # Sin nada que enviar el estado pendiente desaparece
+    server.send_state(connection, _state(4), None, None)
+    assert connection.pending_state is None
+
+
+def test_patch_over_a_stale_base_is_refused():
+    server, connection = _server(), Connection(None, None)
+    connection.committed_state = _state(1)
+    assert server.send_state(connection, _state(3), b'parche', _state(2)) is None
+    assert connection.pending_state is None
+    assert server.send_state(connection, _state(3), b'parche', connection.committed_state)
+
+
+def test_stalled_reader_is_evicted():
+    server, connection = _server(max_stalled_states=MAX_STALLED_STATES), Connection(None, None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for version in range(MAX_STALLED_STATES + 1):
+            assert server.send_state(connection, _state(version), b'estado', None)
+        assert not server.send_state(connection, _state(MAX_STALLED_STATES + 1), b'estado', None)
+    assert connection.evicted and server.evictions == 1
+    assert not server.send(connection, b'mas')
+
+
+def test_queue_over_the_byte_limit_is_evicted():
+    server, connection = _server(max_outbound_bytes=100), Connection(None, None)
+    assert server.send(connection, b'x' * 60)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert not server.send(connection, b'x' * 60)
+    assert connection.evicted and connection.bytes_pending() == 60
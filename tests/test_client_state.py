@@ -0,0 +1,90 @@
+import contextlib
+import io
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from constants import ACTION_DRAW_DECK
+from delta import diff_state
+from engine import GameEngine
+from game import Game
+
+
+class ClientNetwork:
+    """Cliente sin sockets: solo cuenta las peticiones de estado completo"""
+
+    def __init__(self, player_id=1):
+        self.player_id = player_id
+        self.resyncs = 0
+
+    def get_player_count(self):
+        return 0
+
+    def get_id(self):
+        return self.player_id
+
+    def is_host(self):
+        return False
+
+    def request_resync(self):
+        self.resyncs += 1
+
+
+def _host():
+    engine = GameEngine(3, seed=21)
+    engine.start_game(3)
+    return engine
+
+
+def _view(engine):
+    engine.version += 1
+    return GameEngine.state_view(engine.to_dict(), 1)
+
+
+def _client():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Game(ClientNetwork())
+
+
+def _update(game, data):
+    with contextlib.redirect_stdout(io.StringIO()):
+        game.update_from_dict(data)
+
+
+def test_full_state_is_applied_in_place():
+    host, game = _host(), _client()
+    _update(game, _view(host))
+    players, deck, pile = list(game.players), game.deck, game.discard_pile
+    mano = host.current_player_idx
+    host.apply({'type': ACTION_DRAW_DECK, 'player_id': mano})
+    _update(game, _view(host))
+    assert all(new is old for new, old in zip(game.players, players))
+    assert game.deck is deck and game.discard_pile is pile
+    assert game.players[mano].hand_size() == host.players[mano].hand_size() == 11
+    assert list(game.players[1].hand) == list(host.players[1].hand)
+
+
+def test_stale_full_state_is_ignored():
+    host, game = _host(), _client()
+    old = _view(host)
+    host.apply({'type': ACTION_DRAW_DECK, 'player_id': host.current_player_idx})
+    new = _view(host)
+    _update(game, new)
+    _update(game, old)
+    assert game.version == new['version']
+    assert game.players[host.current_player_idx].hand_size() == 11
+    # La misma versión tampoco se vuelve a aplicar
+    game.current_player_idx = -1
+    _update(game, new)
+    assert game.current_player_idx == -1
+
+
+def test_patch_over_another_version_asks_for_the_full_state():
+    host, game = _host(), _client()
+    first = _view(host)
+    _update(game, first)
+    second = _view(host)
+    third = _view(host)
+    _update(game, diff_state(second, third))
+    assert game.network.resyncs == 1 and game.version == first['version']
+    _update(game, diff_state(first, second))
+    assert game.network.resyncs == 1 and game.version == second['version']
@@ -0,0 +1,40 @@
+from card import Card
+from melds import CombinationIndex
+from player import Player
+
+
+def _cards(*specs):
+    return [Card('JOKER') if spec == 'JOKER' else Card(spec[:-1], spec[-1]) for spec in specs]
+
+
+def _table():
+    first, second = Player(0, 'Uno'), Player(1, 'Dos')
+    first.combinations = [{'type': 'trio', 'cards': _cards('8♠', '8♥', '8♦')},
+                          {'type': 'sequence', 'cards': _cards('3♣', '4♣', '5♣', '6♣')}]
+    second.combinations = [{'type': 'sequence', 'cards': _cards('9♥', 'JOKER', 'J♥', 'Q♥')}]
+    index = CombinationIndex()
+    index.rebuild([first, second])
+    return index, first, second
+
+
+def test_trio_accepts_its_value_in_any_suit_and_a_joker():
+    index, _, _ = _table()
+    assert index.targets(Card('8', '♣')) == [(0, 0)]
+    assert index.targets(Card('9', '♠')) == []
+    assert (0, 0) in index.targets(Card('JOKER'))
+
+
+def test_sequence_accepts_its_ends_and_the_card_a_joker_stands_for():
+    index, _, _ = _table()
+    assert index.targets(Card('2', '♣')) == [(0, 1)] and index.targets(Card('7', '♣')) == [(0, 1)]
+    assert not index.accepts_card(Card('2', '♦'), 0, 1)
+    assert index.targets(Card('10', '♥')) == [(1, 0)] and index.targets(Card('K', '♥')) == [(1, 0)]
+
+
+def test_update_reindexes_a_changed_combination():
+    index, first, _ = _table()
+    first.combinations[0]['cards'].append(Card('8', '♣'))
+    index.update(0, 0, first.combinations[0])
+    # Un trío de cuatro ya no admite comodines, pero sí otra copia de su valor
+    assert (0, 0) not in index.targets(Card('JOKER'))
+    assert index.accepts_card(Card('8', '♠'), 0, 0)
@@ -0,0 +1,38 @@
+from card import Deck
+from engine import GameEngine
+
+
+def _uids(cards):
+    return [card.uid for card in cards]
+
+
+def test_same_seed_deals_the_same_game():
+    first, second = GameEngine(4, seed=42), GameEngine(4, seed=42)
+    first.start_game(4)
+    second.start_game(4)
+    assert [_uids(p.hand) for p in first.players] == [_uids(p.hand) for p in second.players]
+    assert _uids(first.deck.cards) == _uids(second.deck.cards)
+
+
+def test_each_shuffle_has_its_own_stream():
+    deck = Deck(num_decks=2, seed=42)
+    assert (deck.shuffles, len(deck.cards)) == (1, 108)
+    dealt = _uids(deck.cards)
+    deck.reset()
+    assert deck.shuffles == 2 and _uids(deck.cards) != dealt
+    # La mezcla número n depende solo de la semilla y de n
+    again = Deck(num_decks=2, seed=42)
+    again.reset()
+    assert _uids(again.cards) == _uids(deck.cards)
+    assert _uids(Deck(num_decks=2, seed=43).cards) != dealt
+
+
+def test_restored_deck_continues_the_same_sequence():
+    deck = Deck(seed=7)
+    deck.deal(20)
+    restored = Deck.from_dict(deck.to_dict())
+    assert (restored.seed, restored.shuffles) == (7, 1)
+    assert _uids(restored.cards) == _uids(deck.cards)
+    deck.shuffle()
+    restored.shuffle()
+    assert _uids(restored.cards) == _uids(deck.cards)
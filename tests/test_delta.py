@@ -0,0 +1,68 @@
+from card import Card, PackedCards
+from delta import diff, apply_op, diff_state, apply_state_patch, patch_list
+
+
+def _state(version, **changes):
+    state = {
+        'version': version,
+        'current_player_idx': 0,
+        'players': [
+            {'id': 0, 'hand': PackedCards.pack([Card('A', '♠'), Card('2', '♠')]), 'score': 0},
+            {'id': 1, 'hand': PackedCards.pack([Card('K', '♥')]), 'score': 10},
+        ],
+        'rejected_discard': [],
+    }
+    state.update(changes)
+    return state
+
+
+def test_equal_values_have_no_diff():
+    assert diff(_state(1), _state(1)) is None
+
+
+def test_round_trip_nested_changes():
+    old = _state(1)
+    new = _state(2, current_player_idx=1, rejected_discard=[0, 1])
+    new['players'][1]['score'] = 25
+    new['players'][0]['hand'] = PackedCards.pack([Card('A', '♠')])
+    assert apply_op(old, diff(old, new)) == new
+
+
+def test_round_trip_added_and_removed_keys_and_items():
+    old = {'a': 1, 'b': [1, 2, 3], 'gone': True}
+    new = {'a': 1, 'b': [1, 5], 'c': {'x': None}}
+    assert apply_op(old, diff(old, new)) == new
+    # Y al revés: la lista crece
+    assert apply_op(new, diff(new, old)) == old
+
+
+def test_apply_op_does_not_modify_the_original():
+    old = _state(1)
+    new = _state(2, rejected_discard=[1])
+    apply_op(old, diff(old, new))
+    assert old == _state(1)
+
+
+def test_state_patch_carries_versions():
+    old, new = _state(3), _state(4, current_player_idx=1)
+    patch = diff_state(old, new)
+    assert (patch['base'], patch['version']) == (3, 4)
+    assert apply_state_patch(old, patch) == new
+    assert diff_state(new, dict(new)) is None
+
+
+class _Item:
+    def __init__(self, data):
+        self.data = data
+
+    def to_dict(self):
+        return dict(self.data)
+
+
+def test_patch_list_keeps_unchanged_objects():
+    old = [{'n': 1}, {'n': 2}, {'n': 3}]
+    new = [{'n': 1}, {'n': 5}]
+    items = [_Item(data) for data in old]
+    first = items[0]
+    patch_list(items, diff(old, new), _Item)
+    assert [item.to_dict() for item in items] == new and items[0] is first
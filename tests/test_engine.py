@@ -0,0 +1,104 @@
+from card import Card
+from constants import (ACTION_DRAW_DECK, ACTION_DISCARD, ACTION_ADD_TO_COMBINATION, ACTION_END_ROUND,
+                       ACTION_START_NEW_ROUND, GAME_STATE_PLAYING, GAME_STATE_ROUND_END)
+from engine import GameEngine, EVENT_DRAW_DECK, EVENT_DISCARD, EVENT_TURN_START, EVENT_ROUND_START
+from player import Hand
+
+
+def _engine_with_hand(cards):
+    engine = GameEngine(4, seed=7)
+    engine.start_game(4)
+    player_id = engine.current_player_idx
+    engine.apply({'type': ACTION_DRAW_DECK, 'player_id': player_id})
+    player = engine.players[player_id]
+    player.hand = Hand(cards)
+    return engine, player_id, player
+
+
+def test_discard_removes_the_chosen_slot_of_a_repeated_instance():
+    # Tras restaurar un estado las copias de distintas barajas son la misma instancia
+    seven = Card('7', '♠')
+    engine, player_id, player = _engine_with_hand([seven, Card('2', '♣'), seven])
+    assert engine.apply({'type': ACTION_DISCARD, 'player_id': player_id, 'card_idx': 2})
+    assert list(player.hand) == [seven, Card('2', '♣')]
+
+
+def test_discard_removes_the_chosen_copy():
+    first, second = Card('9', '♦', 0), Card('9', '♦', 1)
+    engine, player_id, player = _engine_with_hand([first, Card('2', '♣'), second, Card('K', '♠')])
+    assert engine.apply({'type': ACTION_DISCARD, 'player_id': player_id, 'card_idx': 2})
+    assert engine.discard_pile.peek() is second
+    assert list(player.hand) == [first, Card('2', '♣'), Card('K', '♠')]
+    assert player.hand[0] is first
+
+
+def test_add_to_combination_removes_the_chosen_copy():
+    first, second = Card('5', '♥', 0), Card('5', '♥', 1)
+    engine, player_id, player = _engine_with_hand([first, Card('2', '♣'), second, Card('K', '♠')])
+    player.has_laid_down = True
+    player.combinations = [{'type': 'trio', 'cards': [Card('5', '♠'), Card('5', '♦'), Card('5', '♣')]}]
+    engine.invalidate_combination_index()
+    action = {'type': ACTION_ADD_TO_COMBINATION, 'player_id': player_id, 'card_idx': 2,
+              'combination_idx': 0, 'target_player_idx': player_id}
+    assert engine.apply(action)
+    assert player.combinations[0]['cards'][-1] is second
+    assert player.hand[0] is first and len(player.hand) == 3
+
+
+def test_lay_down_takes_the_last_copies_of_the_hand():
+    cards = [Card('7', '♠', 0), Card('7', '♠', 1), Card('7', '♥'), Card('7', '♦'),
+             Card('3', '♣'), Card('4', '♣'), Card('5', '♣'), Card('6', '♣'), Card('Q', '♥')]
+    engine, player_id, player = _engine_with_hand(cards)
+    trios, sequences = player._solve_round_melds(0)
+    # Un resultado de otra mano equivalente (p. ej. de la caché) con copias de otras barajas
+    trios = [[Card(card.value, card.suit, 1) if not card.is_joker else card for card in trio] for trio in trios]
+    assert player._lay_down_melds(trios, sequences)
+    laid = [card for combination in player.combinations for card in combination['cards']]
+    assert all(any(card is c for c in cards) for card in laid)
+    assert len(player.hand) == len(cards) - len(laid) and Card('Q', '♥') in player.hand
+
+
+def test_mano_rejecting_the_discard_starts_the_offer():
+    engine = GameEngine(3, seed=3)
+    engine.start_game(3)
+    mano = engine.current_player_idx
+    events = engine.apply({'type': 'reject_discard', 'player_id': mano})
+    assert events
+    assert engine.discard_offer and engine.rejected_discard == [mano]
+    assert engine.discard_origin_player == mano
+    assert engine.discard_offered_to == (mano + 1) % 3
+
+
+def test_actions_out_of_turn_change_nothing():
+    engine = GameEngine(3, seed=5)
+    engine.start_game(3)
+    before = dict(engine.to_dict(), timestamp=None)
+    other = (engine.current_player_idx + 1) % 3
+    assert engine.apply({'type': ACTION_DRAW_DECK, 'player_id': other}) == []
+    assert engine.apply({'type': ACTION_DISCARD, 'player_id': other, 'card_idx': 0}) == []
+    assert dict(engine.to_dict(), timestamp=None) == before
+
+
+def test_a_turn_produces_its_events():
+    engine = GameEngine(3, seed=5)
+    engine.start_game(3)
+    player_id = engine.current_player_idx
+    events = engine.apply({'type': ACTION_DRAW_DECK, 'player_id': player_id})
+    assert [event['type'] for event in events] == [EVENT_DRAW_DECK]
+    events = engine.apply({'type': ACTION_DISCARD, 'player_id': player_id, 'card_idx': 0})
+    assert [event['type'] for event in events] == [EVENT_DISCARD, EVENT_TURN_START]
+    assert engine.current_player_idx == (player_id + 1) % 3
+
+
+def test_host_transitions_and_state_round_trip():
+    engine = GameEngine(3, seed=5)
+    engine.start_game(3)
+    engine.apply_system({'type': ACTION_END_ROUND, 'winner': None})
+    assert engine.state == GAME_STATE_ROUND_END
+    events = engine.apply_system({'type': ACTION_START_NEW_ROUND})
+    assert EVENT_ROUND_START in [event['type'] for event in events]
+    assert engine.state == GAME_STATE_PLAYING and engine.round_num == 1
+
+    copy = GameEngine()
+    copy.load_state(engine.to_dict())
+    assert dict(copy.to_dict(), timestamp=None) == dict(engine.to_dict(), timestamp=None)
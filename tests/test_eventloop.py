@@ -0,0 +1,109 @@
+import socket
+import threading
+from collections import deque
+from network import EventLoopServer
+from protocol import FrameDecoder, FLAG_PING, encode_frame, frame_parts, send_buffers, consume_buffers, sendall_buffers
+
+TIMEOUT = 5.0
+
+
+class EchoServer:
+    """Bucle de eventos en un puerto libre de localhost que responde a cada trama con 'eco:' + trama"""
+
+    def __init__(self):
+        listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listen_socket.bind(('127.0.0.1', 0))
+        listen_socket.listen()
+        self.address = listen_socket.getsockname()
+        self.connected = threading.Event()
+        self.disconnected = threading.Event()
+        self.connections = []
+        self.server = EventLoopServer(listen_socket, self._on_connect, self._on_message, self._on_disconnect)
+
+    def _on_connect(self, connection):
+        self.connections.append(connection)
+        self.connected.set()
+
+    def _on_message(self, connection, message_data):
+        self.server.send(connection, frame_parts(b'eco:' + bytes(message_data)))
+
+    def _on_disconnect(self, connection):
+        self.disconnected.set()
+
+    def __enter__(self):
+        self.server.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.stop()
+
+
+def _connect(address):
+    client = socket.create_connection(address, timeout=TIMEOUT)
+    return client, FrameDecoder()
+
+
+def _receive(client, decoder, count):
+    frames = []
+    while len(frames) < count:
+        assert decoder.recv_from(client), "el servidor cerró la conexión"
+        # Los pings del latido llegan intercalados: no cuentan
+        frames.extend(frame for frame in decoder.frames() if not frame[0] & FLAG_PING)
+    return frames
+
+
+def test_serves_several_clients_from_one_thread():
+    with EchoServer() as echo:
+        clients = [_connect(echo.address) for _ in range(3)]
+        for i, (client, _) in enumerate(clients):
+            client.sendall(encode_frame(b'hola %d' % i) + encode_frame(b'adios'))
+        for i, (client, decoder) in enumerate(clients):
+            assert _receive(client, decoder, 2) == [(0, b'eco:hola %d' % i), (0, b'eco:adios')]
+            client.close()
+
+
+def test_close_sends_what_is_queued_first():
+    with EchoServer() as echo:
+        client, decoder = _connect(echo.address)
+        assert echo.connected.wait(TIMEOUT)
+        connection = echo.connections[0]
+        echo.server.send(connection, frame_parts(b'x' * 100000))
+        echo.server.close(connection)
+        assert _receive(client, decoder, 1) == [(0, b'x' * 100000)]
+        assert not decoder.recv_from(client)
+        assert echo.disconnected.wait(TIMEOUT)
+        client.close()
+
+
+def test_client_disconnect_is_reported():
+    with EchoServer() as echo:
+        client, _ = _connect(echo.address)
+        assert echo.connected.wait(TIMEOUT)
+        client.close()
+        assert echo.disconnected.wait(TIMEOUT)
+        assert echo.server.connections == set()
+
+
+def test_consume_buffers_keeps_the_unsent_tail():
+    buffers = deque(memoryview(data) for data in (b'abc', b'defg', b'h'))
+    consume_buffers(buffers, 5)
+    assert [bytes(buffer) for buffer in buffers] == [b'fg', b'h']
+    consume_buffers(buffers, 3)
+    assert not buffers
+
+
+def test_header_and_payload_go_out_in_one_call():
+    left, right = socket.socketpair()
+    with left, right:
+        header, payload = frame_parts(b'payload')
+        assert send_buffers(left, [header, payload]) == len(header) + len(payload)
+        # Más de lo que cabe en el buffer del socket: sendall_buffers sigue donde se quedó
+        sender = threading.Thread(target=sendall_buffers, args=(left, frame_parts(b'z' * 300000)))
+        sender.start()
+        decoder = FrameDecoder()
+        frames = []
+        while len(frames) < 2:
+            decoder.recv_from(right)
+            frames.extend(decoder.frames())
+        sender.join(TIMEOUT)
+        assert frames == [(0, b'payload'), (0, b'z' * 300000)]
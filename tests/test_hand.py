@@ -0,0 +1,59 @@
+from card import Card
+from player import Hand, Player
+
+
+def test_remove_prefers_the_exact_instance():
+    first, second = Card('7', '♠', 0), Card('7', '♠', 1)
+    hand = Hand([Card('2', '♥'), first, second])
+    assert hand.remove(second) is second
+    assert list(hand) == [Card('2', '♥'), first]
+    assert hand[1] is first
+
+
+def test_remove_falls_back_to_the_first_equal_copy():
+    first, second = Card('7', '♠', 0), Card('7', '♠', 1)
+    hand = Hand([second, first])
+    assert hand.remove(Card('7', '♠', 2)) is second
+    assert hand[0] is first
+    assert hand.remove(Card('8', '♠')) is None
+
+
+def test_pop_removes_the_slot():
+    cards = [Card('7', '♠', 0), Card('3', '♦'), Card('7', '♠', 1)]
+    hand = Hand(cards)
+    assert hand.pop(2) is cards[2]
+    assert hand.pop(0) is cards[0]
+    assert list(hand) == [cards[1]] and len(hand) == 1
+
+
+def test_jokers_are_interchangeable():
+    joker_a, joker_b = Card.get(52), Card.get(53)
+    hand = Hand([joker_a])
+    assert joker_b in hand
+    assert hand.remove(joker_b) is joker_a
+
+
+def test_fingerprint_ignores_order_and_tracks_removals():
+    cards = [Card('A', '♠'), Card('5', '♥'), Card('5', '♥', 1)]
+    assert Hand(cards).fingerprint == Hand(reversed(cards)).fingerprint
+    hand = Hand(cards)
+    hand.remove(cards[1])
+    assert hand.fingerprint == Hand([cards[0], cards[2]]).fingerprint
+
+
+def test_compacts_after_many_removals():
+    cards = [Card(value, '♣') for value in ('2', '3', '4', '5', '6', '7')]
+    hand = Hand(cards)
+    for card in cards[:4]:
+        hand.remove(card)
+    assert list(hand) == cards[4:]
+    assert hand[0] is cards[4] and hand[-1] is cards[5]
+
+
+def test_player_hand_is_always_a_hand():
+    player = Player(0, 'Jugador')
+    player.hand = [Card('4', '♦'), Card('9', '♣')]
+    assert isinstance(player.hand, Hand) and Card('9', '♣') in player.hand
+    player.add_to_hand(Card('J', '♥'))
+    assert player.remove_from_hand(Card('4', '♦')) == Card('4', '♦')
+    assert player.hand.pop() == Card('J', '♥') and list(player.hand) == [Card('9', '♣')]
@@ -0,0 +1,80 @@
+import contextlib
+import io
+import socket
+import threading
+from constants import DEGRADED_RTT
+from network import EventLoopServer
+from protocol import LinkStats, FrameDecoder, FLAG_PONG, PING_PAYLOAD
+
+TIMEOUT = 5.0
+
+
+def _answer(link, sent, received):
+    frame = link.ping(sent)
+    link.pong(frame[-PING_PAYLOAD.size:], received)
+
+
+def test_rtt_and_jitter_are_smoothed():
+    link = LinkStats(now=0.0)
+    _answer(link, 10.0, 10.1)
+    assert round(link.rtt, 6) == 0.1 and link.jitter == 0.0
+    _answer(link, 20.0, 20.3)
+    assert round(link.rtt, 6) == 0.125 and round(link.jitter, 6) == 0.0125
+    assert round(link.min_rtt, 6) == 0.1 and (link.pings_sent, link.pongs_received) == (2, 2)
+    assert not link.to_dict(now=21.0)['degraded']
+    for second in range(30, 60):
+        _answer(link, second, second + DEGRADED_RTT * 2)
+    assert link.to_dict(now=61.0)['degraded']
+
+
+def test_malformed_pongs_are_ignored():
+    link = LinkStats(now=0.0)
+    link.pong(b'corto', 1.0)
+    link.pong(PING_PAYLOAD.pack(int(5e9)), 1.0)  # Del futuro
+    assert link.rtt is None and link.pongs_received == 0
+
+
+def test_ping_interval_and_idle_time():
+    link = LinkStats(now=0.0)
+    assert link.should_ping(0.0, 2.0)
+    link.ping(0.0)
+    assert not link.should_ping(1.0, 2.0) and link.should_ping(2.0, 2.0)
+    link.received(3.0)
+    assert link.idle(4.5) == 1.5
+
+
+@contextlib.contextmanager
+def _server(**options):
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.bind(('127.0.0.1', 0))
+    listen_socket.listen()
+    disconnected = threading.Event()
+    server = EventLoopServer(listen_socket, lambda connection: None, lambda connection, data: None,
+                             lambda connection: disconnected.set(), **options)
+    server.start()
+    try:
+        yield server, listen_socket.getsockname(), disconnected
+    finally:
+        server.stop()
+
+
+def test_server_answers_pings_and_pings_its_clients():
+    with _server(ping_interval=0.05) as (server, address, _):
+        with socket.create_connection(address, timeout=TIMEOUT) as client:
+            client.sendall(LinkStats(now=0.0).ping(1.5))
+            decoder = FrameDecoder()
+            flags = []
+            while FLAG_PONG not in flags or len(flags) < 2:
+                assert decoder.recv_from(client)
+                for frame_flags, payload in decoder.frames():
+                    flags.append(frame_flags)
+                    if frame_flags == FLAG_PONG:
+                        assert payload == PING_PAYLOAD.pack(int(1.5e9))
+
+
+def test_silent_peer_is_dropped():
+    with contextlib.redirect_stdout(io.StringIO()):
+        with _server(ping_interval=0.05, idle_timeout=0.2) as (server, address, disconnected):
+            with socket.create_connection(address, timeout=TIMEOUT):
+                assert disconnected.wait(TIMEOUT)
+            assert server.dead_peers == 1
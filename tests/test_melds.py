@@ -0,0 +1,84 @@
+from card import Card
+from melds import solve_requirement, HandAnalysis
+from player import Player
+
+
+def _cards(*specs):
+    return [Card('JOKER') if spec == 'JOKER' else Card(spec[:-1], spec[-1]) for spec in specs]
+
+
+def test_trio_and_sequence():
+    hand = _cards('7♠', '7♥', '7♦', '3♣', '4♣', '5♣', '6♣', 'K♥')
+    trios, sequences = solve_requirement(hand, 1, 1)
+    assert sorted(c.value for c in trios[0]) == ['7', '7', '7']
+    assert sorted(c.value for c in sequences[0]) == ['3', '4', '5', '6']
+    assert all(c.suit == '♣' for c in sequences[0])
+
+
+def test_not_enough_cards():
+    hand = _cards('7♠', '7♥', '3♣', '4♣', '5♣', 'K♥')
+    assert solve_requirement(hand, 1, 1) is None
+
+
+def test_joker_fills_a_gap():
+    hand = _cards('9♦', '10♦', 'Q♦', 'JOKER')
+    trios, sequences = solve_requirement(hand, 0, 1)
+    assert trios == [] and len(sequences[0]) == 4
+    assert any(c.is_joker for c in sequences[0])
+
+
+def test_ace_after_king():
+    hand = _cards('J♠', 'Q♠', 'K♠', 'A♠')
+    assert solve_requirement(hand, 0, 1) is not None
+
+
+def test_solution_uses_the_cards_of_the_hand():
+    hand = _cards('5♠', '5♥', '5♦', '5♣', '8♥', '8♠', '8♦')
+    trios, _ = solve_requirement(hand, 2, 0)
+    used = [card for trio in trios for card in trio]
+    assert len(used) == len(set(map(id, used)))
+    assert all(any(card is c for c in hand) for card in used)
+
+
+def test_analysis_detects_trio_and_sequence():
+    analysis = HandAnalysis(_cards('2♠', '2♥', '2♦', '9♣', '10♣', 'J♣', 'Q♣'))
+    assert analysis.has_trio() and analysis.has_sequence()
+    assert not HandAnalysis(_cards('2♠', '5♥', '9♦')).has_trio()
+
+
+def test_one_natural_card_and_two_jokers_make_a_trio():
+    hand = _cards('6♣', 'JOKER', 'JOKER', '9♥', '10♥', 'J♥', 'Q♥')
+    trios, _ = solve_requirement(hand, 1, 1)
+    assert [c.is_joker for c in trios[0]].count(True) == 2
+    # Con varias barajas un mismo valor da para dos tríos completados con comodines
+    assert solve_requirement(_cards('6♦', '6♥', 'JOKER', 'JOKER', 'JOKER', 'JOKER'), 2, 0) is not None
+
+
+def test_jokers_alone_are_not_a_trio():
+    assert solve_requirement(_cards('JOKER', 'JOKER', 'JOKER'), 1, 0) is None
+    assert not HandAnalysis(_cards('JOKER', 'JOKER', 'JOKER')).has_trio()
+
+
+def test_extra_lay_down_completes_a_trio_with_jokers():
+    player = Player(0, 'Jugador')
+    player.add_to_hand(_cards('9♥', 'JOKER', 'JOKER', '2♣'))
+    player.has_completed_round_requirement = True
+    assert player.can_lay_down(0) and player.lay_down(0)
+    trio = player.combinations[-1]['cards']
+    assert len(trio) == 3 and sum(c.is_joker for c in trio) == 2
+    assert len(player.hand) == 1 and not player.hand[0].is_joker
+
+
+def test_jokers_only_fill_gaps_inside_a_run_of_four():
+    assert HandAnalysis(_cards('3♠', '6♠', 'JOKER', 'JOKER')).has_sequence()
+    assert not HandAnalysis(_cards('3♠', '7♠', 'JOKER', 'JOKER')).has_sequence()
+    # El As cierra la seguidilla por arriba o la abre por abajo, pero no las dos cosas
+    assert HandAnalysis(_cards('Q♥', 'K♥', 'A♥', 'JOKER')).has_sequence()
+    assert not HandAnalysis(_cards('K♥', 'A♥', '2♥', '3♥')).has_sequence()
+
+
+def test_take_removes_the_cards_from_the_analysis():
+    analysis = HandAnalysis(_cards('8♣', '8♦', '8♥', '2♠', '3♠', '4♠', '5♠'))
+    assert len(analysis.take_trios(2)) == 1
+    assert not analysis.has_trio() and analysis.has_sequence()
+    assert len(analysis.take_sequences(1)[0]) == 4 and not analysis.has_sequence()
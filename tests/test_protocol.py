@@ -0,0 +1,92 @@
+import zlib
+import pytest
+from protocol import (FrameDecoder, ProtocolError, FLAG_PING, FLAG_COMPRESSED, encode_frame, encode_frame_header,
+                      frame_parts, compress_frame, decompress_payload, negotiate_compression, CompressionStats,
+                      FRAME_HEADER)
+from constants import PROTOCOL_VERSION, MAX_FRAME_SIZE
+
+
+def test_frames_split_across_reads():
+    data = encode_frame(b'primera') + encode_frame(b'x' * 5000, FLAG_PING) + encode_frame(b'')
+    decoder = FrameDecoder(capacity=16)
+    frames = []
+    # Trocear en fragmentos que cortan cabeceras y payloads
+    for start in range(0, len(data), 7):
+        decoder.feed(data[start:start + 7])
+        frames.extend(decoder.frames())
+    assert frames == [(0, b'primera'), (FLAG_PING, b'x' * 5000), (0, b'')]
+    assert decoder.pending() == 0
+
+
+def test_incomplete_frame_waits_for_the_rest():
+    frame = encode_frame(b'abcdef')
+    decoder = FrameDecoder()
+    decoder.feed(frame[:-1])
+    assert list(decoder.frames()) == []
+    decoder.feed(frame[-1:])
+    assert list(decoder.frames()) == [(0, b'abcdef')]
+
+
+def test_rejects_other_protocol_versions_and_huge_frames():
+    decoder = FrameDecoder()
+    decoder.feed(FRAME_HEADER.pack(PROTOCOL_VERSION - 1, 0, 0))
+    with pytest.raises(ProtocolError):
+        list(decoder.frames())
+    decoder = FrameDecoder()
+    decoder.feed(encode_frame_header(MAX_FRAME_SIZE + 1))
+    with pytest.raises(ProtocolError):
+        list(decoder.frames())
+
+
+def test_compressed_frames_are_inflated_transparently():
+    payload = b'{"cards": [1, 2, 3]}' * 200
+    header, compressed = compress_frame(payload)
+    decoder = FrameDecoder()
+    decoder.feed(bytes(header) + compressed)
+    assert list(decoder.frames()) == [(0, payload)]
+    assert decoder.stats.frames == 1 and decoder.stats.raw_bytes == len(payload)
+
+
+def test_corrupt_compressed_payload_is_a_protocol_error():
+    decoder = FrameDecoder()
+    decoder.feed(encode_frame(b'no es zlib', FLAG_COMPRESSED))
+    with pytest.raises(ProtocolError):
+        list(decoder.frames())
+
+
+def test_decompress_round_trip():
+    payload = bytes(range(256)) * 10
+    assert decompress_payload(zlib.compress(payload)) == payload
+
+
+def test_truncated_compressed_payload_is_a_protocol_error():
+    compressed = zlib.compress(b'estado ' * 500)
+    with pytest.raises(ProtocolError):
+        decompress_payload(compressed[:-4])
+    decoder = FrameDecoder()
+    decoder.feed(encode_frame(compressed[:len(compressed) // 2], FLAG_COMPRESSED))
+    with pytest.raises(ProtocolError):
+        list(decoder.frames())
+
+
+def test_header_carries_version_flags_and_length():
+    header, payload = frame_parts(b'hola', FLAG_PING)
+    assert FRAME_HEADER.unpack(header) == (PROTOCOL_VERSION, FLAG_PING, 4) and payload == b'hola'
+    assert encode_frame(b'hola', FLAG_PING) == bytes(header) + b'hola'
+
+
+def test_compression_is_only_agreed_when_both_sides_want_it():
+    assert negotiate_compression(['lz4', 'zlib']) == 'zlib'
+    assert negotiate_compression(['zlib'], enabled=False) is None
+    assert negotiate_compression(None) is None and negotiate_compression(['lz4']) is None
+
+
+def test_compression_stats_merge_and_report_the_ratio():
+    stats, other = CompressionStats(), CompressionStats()
+    stats.add(4096, 1024, 0.001)
+    other.add(4096, 2048, 0.001)
+    other.skipped = 3
+    stats.merge(other)
+    report = stats.to_dict()
+    assert (report['frames'], report['skipped'], report['ratio']) == (2, 3, 0.375)
+    assert report['us_per_kb'] == 250.0
@@ -0,0 +1,93 @@
+from card import PackedCards
+from engine import GameEngine
+from network import Connection, StatePublisher, unpack_message
+
+
+class RecordingServer:
+    """Compromete cada estado en cuanto se encola y guarda las tramas enviadas"""
+
+    def __init__(self):
+        self.frames = []
+
+    def send_state(self, connection, state, data, base):
+        if base is not None and connection.committed_state is not base:
+            return None
+        connection.committed_state = state
+        self.frames.append((connection.id, data))
+        return True
+
+
+def _connection(seat):
+    connection = Connection(None, None)
+    connection.id = seat
+    return connection
+
+
+def _publish(engine, publisher, connections):
+    engine.version += 1
+    publisher.publish(engine.to_dict(), connections)
+
+
+def _game():
+    engine = GameEngine(3, seed=9)
+    engine.start_game(3)
+    server = RecordingServer()
+    publisher = StatePublisher(server, GameEngine.state_view, compress_threshold=None)
+    return engine, server, publisher, [_connection(seat) for seat in range(3)]
+
+
+def test_snapshots_of_a_version_are_encoded_once():
+    engine, server, publisher, connections = _game()
+    _publish(engine, publisher, connections)
+    assert (publisher.frame_misses, publisher.frame_hits) == (3, 0)
+    # Un cliente que vuelve al mismo asiento recibe los mismos bytes
+    late = _connection(1)
+    publisher.send_snapshot(late)
+    assert (publisher.frame_misses, publisher.frame_hits) == (3, 1)
+    assert server.frames[-1][1] is server.frames[1][1]
+
+
+def test_patches_are_cached_per_base_and_dropped_with_the_version():
+    engine, server, publisher, connections = _game()
+    _publish(engine, publisher, connections)
+    twin = _connection(0)
+    twin.committed_state = connections[0].committed_state
+    engine.apply({'type': 'reject_discard', 'player_id': engine.current_player_idx})
+    _publish(engine, publisher, connections + [twin])
+    assert publisher.frame_hits == 1
+    assert 'game_patch' in unpack_message(server.frames[-1][1][1])
+    _publish(engine, publisher, connections)
+    assert all(key[1] == engine.version - 1 for key in publisher.frames)
+
+
+def test_republishing_the_same_version_reuses_views():
+    engine, _, publisher, connections = _game()
+    _publish(engine, publisher, connections)
+    views = dict(publisher.views)
+    publisher.publish(engine.to_dict(), connections)
+    assert all(publisher.views[seat] is view for seat, view in views.items())
+
+
+def test_published_state_does_not_alias_the_engine():
+    engine, _, _, _ = _game()
+    state = engine.to_dict()
+    engine.rejected_discard.append(2)
+    engine.round_scores[0] = 50
+    engine.players[0].hand.pop()
+    assert state['rejected_discard'] == [] and state['round_scores'][0] == 0
+    assert len(state['players'][0]['hand']) == len(engine.players[0].hand) + 1
+
+
+def test_state_holds_only_plain_values():
+    def check(value):
+        if isinstance(value, dict):
+            assert all(isinstance(key, str) for key in value)
+            for item in value.values():
+                check(item)
+        elif isinstance(value, list):
+            for item in value:
+                check(item)
+        else:
+            assert value is None or isinstance(value, (bool, int, float, str, PackedCards))
+    engine, _, _, _ = _game()
+    check(engine.to_dict())
@@ -0,0 +1,20 @@
+import random
+from benchmarks import _legacy_order
+from card import Card
+from constants import VALUES, SUITS
+from player import Player
+from ranks import circular_start, VALUE_RANK
+
+
+def test_circular_start_wraps_after_the_king():
+    assert circular_start([VALUE_RANK[v] for v in ('K', 'A', 'Q', '2')]) == VALUE_RANK['Q']
+    assert circular_start([VALUE_RANK[v] for v in ('5', '3', '4')]) == VALUE_RANK['3']
+
+
+def test_order_circular_sequence_matches_the_linear_version():
+    rng = random.Random(15)
+    player = Player(0, "Jugador 1")
+    for _ in range(2000):
+        cards = [Card('JOKER') if rng.random() < 0.15 else Card(rng.choice(VALUES), rng.choice(SUITS))
+                 for _ in range(rng.randint(1, 9))]
+        assert player._order_circular_sequence(cards) == _legacy_order(cards)
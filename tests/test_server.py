@@ -0,0 +1,112 @@
+import contextlib
+import io
+import time
+from network import Connection, pack_message, unpack_message
+from server import Lobby
+
+
+class FakeServer:
+    """Guarda lo que el lobby envía a cada conexión en lugar de escribirlo en un socket"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = []
+
+    def send(self, connection, data):
+        self.sent.append((connection, unpack_message(data[1])))
+        return True
+
+    def send_state(self, connection, state, data, base):
+        connection.committed_state = state
+        if data is not None:
+            self.sent.append((connection, unpack_message(data[1])))
+        return True
+
+    def close(self, connection):
+        self.closed.append(connection)
+
+    def messages(self, connection):
+        return [message for target, message in self.sent if target is connection]
+
+
+def _lobby(players=3, grace_period=30):
+    lobby = Lobby(players_per_table=players, log_dir='', grace_period=grace_period)
+    lobby.server = FakeServer()
+    return lobby
+
+
+def _join(lobby, table='mesa', **hello):
+    connection = Connection(None, ('127.0.0.1', 0))
+    hello['table'] = table
+    with contextlib.redirect_stdout(io.StringIO()):
+        lobby._on_connect(connection)
+        lobby._on_message(connection, pack_message({'hello': hello})[1])
+    return connection
+
+
+def _leave(lobby, connection):
+    with contextlib.redirect_stdout(io.StringIO()):
+        lobby._on_disconnect(connection)
+
+
+def test_clients_are_seated_in_order_until_the_table_fills():
+    lobby = _lobby()
+    first, second = _join(lobby), _join(lobby)
+    welcome = lobby.server.messages(first)[0]
+    assert (welcome['client_id'], welcome['resumed']) == (0, False) and welcome['session']
+    assert lobby.server.messages(second)[0]['client_id'] == 1
+    assert not lobby.tables['mesa'].is_started()
+    # Otra mesa no comparte asientos
+    assert lobby.server.messages(_join(lobby, 'otra'))[0]['client_id'] == 0
+
+
+def test_seat_of_a_client_that_leaves_before_the_start_is_reused():
+    lobby = _lobby()
+    first = _join(lobby)
+    _join(lobby)
+    _leave(lobby, first)
+    assert lobby.server.messages(_join(lobby))[0]['client_id'] == 0
+    assert not lobby.tables['mesa'].is_started()
+
+
+def test_full_table_announces_the_start_before_the_first_state():
+    lobby = _lobby()
+    connections = [_join(lobby) for _ in range(3)]
+    table = lobby.tables['mesa']
+    assert table.is_started()
+    for seat, connection in enumerate(connections):
+        messages = lobby.server.messages(connection)
+        assert messages[-2] == {'start_game': True, 'client_id': seat}
+        assert 'game_state' in messages[-1]
+    late = _join(lobby)
+    assert 'error' in lobby.server.messages(late)[0] and late in lobby.server.closed
+
+
+def test_resume_returns_the_seat_and_the_state():
+    lobby = _lobby()
+    connections = [_join(lobby) for _ in range(3)]
+    token = lobby.server.messages(connections[1])[0]['session']
+    _leave(lobby, connections[1])
+    assert lobby.tables['mesa'].sessions.reserved()
+
+    back = _join(lobby, resume=token)
+    welcome, state = lobby.server.messages(back)
+    assert (welcome['client_id'], welcome['resumed']) == (1, True)
+    assert 'game_state' in state and back.id == 1
+    assert _join(lobby, resume='token-desconocido') in lobby.server.closed
+
+
+def test_seat_that_expires_during_the_game_ends_the_table():
+    lobby = _lobby(grace_period=10)
+    connections = [_join(lobby) for _ in range(3)]
+    table = lobby.tables['mesa']
+    _leave(lobby, connections[0])
+    with contextlib.redirect_stdout(io.StringIO()):
+        table.tick(time.monotonic() + 5)
+        assert not table.ended
+        table.tick(time.monotonic() + 11)
+    assert table.ended
+    for connection in connections[1:]:
+        assert lobby.server.messages(connection)[-1]['shutdown'] and connection in lobby.server.closed
+        _leave(lobby, connection)
+    assert 'mesa' not in lobby.tables
@@ -0,0 +1,51 @@
+from session import SessionTable
+
+
+class FakeConnection:
+    id = None
+    session = None
+
+
+def test_compact_frees_reserved_seats_and_closes_gaps():
+    sessions = SessionTable(grace_period=60)
+    connections = [FakeConnection() for _ in range(4)]
+    for seat, connection in zip((1, 2, 3, 5), connections):
+        sessions.open(seat, connection)
+    sessions.disconnect(connections[1])
+
+    remaining = sessions.compact(first_seat=1)
+    assert [session.connection for session in remaining] == [connections[0], connections[2], connections[3]]
+    assert [connection.id for connection in (connections[0], connections[2], connections[3])] == [1, 2, 3]
+    assert sessions.seats() == {1, 2, 3} and len(sessions) == 3
+
+
+def test_resume_keeps_the_seat_within_the_grace_period():
+    sessions = SessionTable(grace_period=60)
+    first = FakeConnection()
+    session = sessions.open(4, first)
+    sessions.disconnect(first)
+    assert sessions.reserved() == [session]
+
+    second = FakeConnection()
+    resumed, previous = sessions.resume(session.token, second)
+    assert resumed is session and previous is None and second.id == 4
+    assert sessions.resume('token-desconocido', FakeConnection()) == (None, None)
+
+
+def test_expired_seats_are_released():
+    sessions = SessionTable(grace_period=10)
+    connection = FakeConnection()
+    session = sessions.open(1, connection)
+    sessions.disconnect(connection, now=100.0)
+    assert sessions.expire(now=105.0) == []
+    assert sessions.expire(now=110.0) == [session]
+    assert len(sessions) == 0
+
+
+def test_release_frees_the_seat_at_once():
+    sessions = SessionTable(grace_period=60)
+    connection = FakeConnection()
+    session = sessions.open(0, connection)
+    sessions.disconnect(connection)
+    sessions.release(session)
+    assert sessions.seats() == set() and sessions.reserved() == []
@@ -0,0 +1,39 @@
+from engine import GameEngine
+
+
+def _state():
+    engine = GameEngine(4, seed=11)
+    engine.start_game(4)
+    return engine, engine.to_dict()
+
+
+def test_view_only_shows_the_own_hand():
+    engine, state = _state()
+    view = GameEngine.state_view(state, 2)
+    for player, data in zip(engine.players, view['players']):
+        if player.id == 2:
+            assert data['hand'].unpack() == list(player.hand)
+        else:
+            assert 'hand' not in data and data['hidden_count'] == len(player.hand)
+
+
+def test_view_hides_the_deck_order_seed_and_shuffles():
+    engine, state = _state()
+    deck = GameEngine.state_view(state, 0)['deck']
+    assert 'cards' not in deck and 'seed' not in deck and 'shuffles' not in deck
+    assert deck['hidden_count'] == len(engine.deck.cards)
+
+
+def test_view_shows_only_the_top_of_the_discard_pile():
+    engine, state = _state()
+    pile = GameEngine.state_view(state, 0)['discard_pile']
+    assert engine.discard_pile.cards
+    assert pile['cards'].unpack() == engine.discard_pile.cards[-1:]
+    assert pile['hidden_count'] == len(engine.discard_pile.cards) - 1
+
+
+def test_view_leaves_the_full_state_untouched():
+    engine, state = _state()
+    GameEngine.state_view(state, 1)
+    assert state == engine.to_dict() | {'timestamp': state['timestamp']}
+    assert state['deck']['seed'] == 11 and all('hand' in player for player in state['players'])
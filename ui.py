@@ -1,3 +1,4 @@
+import contextlib
 import pygame
 import math
 from constants import *
@@ -61,7 +62,7 @@ class UI:
         pygame.draw.rect(self.screen, TEXT_COLOR, deck_rect, 2, border_radius=5)
         
         # Dibujar texto
-        deck_text = self.font.render(f"Mazo ({len(game.deck.cards)})", True, TEXT_COLOR)
+        deck_text = self.font.render(f"Mazo ({len(game.deck)})", True, TEXT_COLOR)
         self.screen.blit(deck_text, (x, y + CARD_HEIGHT + 5))
     
     def draw_discard_pile(self, game, x, y):
@@ -77,7 +78,7 @@ class UI:
             self.draw_card(top_card, x, y)
         
         # Dibujar texto
-        discard_text = self.font.render(f"Descarte ({len(game.discard_pile.cards)})", True, TEXT_COLOR)
+        discard_text = self.font.render(f"Descarte ({len(game.discard_pile)})", True, TEXT_COLOR)
         self.screen.blit(discard_text, (x, y + CARD_HEIGHT + 5))
     
     def draw_players(self, game):
@@ -149,7 +150,7 @@ class UI:
                 (x, y + 25)
             )
             self.screen.blit(
-                self.font.render(f"Cartas: {len(player.hand)}", True, TEXT_COLOR),
+                self.font.render(f"Cartas: {player.hand_size()}", True, TEXT_COLOR),
                 (x, y + 50)
             )
             estado = "Bajado" if player.has_laid_down else ""
@@ -601,71 +602,63 @@ class UI:
 
 
     def handle_action(self, action, game):
-        try:
-            if action == "draw_deck":
-                game.take_card_from_deck()
-                game.update()
-            elif action == "draw_discard":
-                # Tomar del descarte sin penalización (para el jugador MANO)
-                game.take_card_from_discard(is_penalty=False)
-                game.update()
-            elif action == "take_discard_penalty":
-                # Tomar del descarte con penalización (para otros jugadores)
-                game.take_card_from_discard(is_penalty=True)
-                game.update()
-            elif action == "reject_discard":
-                # Iniciar/continuar la oferta de descarte
-                if game.current_player_idx == game.player_id:
-                    # Enviar acción al juego
+        # Las acciones del host se difunden una sola vez al terminar; los clientes
+        # solo envían la acción y no tienen nada que agrupar
+        with game.transaction() if game.network.is_host() else contextlib.nullcontext():
+            try:
+                if action == "draw_deck":
+                    game.take_card_from_deck()
+                    game.update()
+                elif action == "draw_discard":
+                    # Tomar del descarte sin penalización (para el jugador MANO)
+                    game.take_card_from_discard(is_penalty=False)
+                    game.update()
+                elif action == "take_discard_penalty":
+                    # Tomar del descarte con penalización (para otros jugadores)
+                    game.take_card_from_discard(is_penalty=True)
+                    game.update()
+                elif action == "reject_discard":
+                    # Iniciar (jugador MANO) o continuar la oferta de descarte: la transición
+                    # la hace el motor y, en el host, se difunde y se registra al aplicarla
                     game.reject_discard_offer()
-                    # Forzar actualización del estado
+                    game.update()
+                elif action == "lay_down":
+                    game.lay_down_combination()
+                    game.update()
+                elif action == "discard" and self.selected_card is not None:
+                    game.discard_card(self.selected_card)
+                    self.selected_card = None
+                    game.update()
+                elif action == "next_round":
                     if game.network.is_host():
-                        game.discard_offer = True
-                        game.rejected_discard = [game.current_player_idx]
-                        game.discard_offered_to = (game.current_player_idx + 1) % len(game.players)
-                        game.discard_origin_player = game.current_player_idx
-                        game.network.send_game_state(game.to_dict())
-                else:
-                    # Si no es el jugador MANO, solo rechazar
-                    game.reject_discard_offer()
+                        game.start_new_round()
+                        game.update()
+                elif action == "add_to_combo":
+                    try:
+                        if self.selected_card_idx is None or self.selected_player is None or self.selected_combination is None:
+                            return
+
+                        local_player = game.players[game.player_id]
+                        if self.selected_card_idx >= len(local_player.hand):
+                            return
+
+                        card = local_player.hand[self.selected_card_idx]
+                        valid = game.can_add_to_combination(card, self.selected_combination, self.selected_player)
+
+                        if not valid:
+                            return
+                        added = game.add_to_combination(self.selected_card_idx, self.selected_combination, self.selected_player)
+                        if added:
+                            self.selected_card = None
+                            self.selected_card_idx = None
+                            self.selected_combination = None
+                            self.selected_player = None
+                    except Exception as e:
+                        print(f"[EXCEPTION] Error en add_to_combo: {e}")            
+            except Exception as e:
+                print(f"[EXCEPTION] Error en handle_action({action}): {e}")
+            finally:
                 game.update()
-            elif action == "lay_down":
-                game.lay_down_combination()
-                game.update()
-            elif action == "discard" and self.selected_card is not None:
-                game.discard_card(self.selected_card)
-                self.selected_card = None
-                game.update()
-            elif action == "next_round":
-                if game.network.is_host():
-                    game.start_new_round()
-                    game.update()
-            elif action == "add_to_combo":
-                try:
-                    if self.selected_card_idx is None or self.selected_player is None or self.selected_combination is None:
-                        return
-
-                    local_player = game.players[game.player_id]
-                    if self.selected_card_idx >= len(local_player.hand):
-                        return
-
-                    card = local_player.hand[self.selected_card_idx]
-                    valid = game.can_add_to_combination(card, self.selected_combination, self.selected_player)
-
-                    if not valid:
-                        return
-                    added = game.add_to_combination(self.selected_card_idx, self.selected_combination, self.selected_player)
-                    if added:
-                        self.selected_card = None
-                        self.selected_card_idx = None
-                        self.selected_combination = None
-                        self.selected_player = None
-                except Exception as e:
-                    print(f"[EXCEPTION] Error en add_to_combo: {e}")            
-        except Exception as e:
-            print(f"[EXCEPTION] Error en handle_action({action}): {e}")
-        finally:
-            game.update()
 
     def animate_deal(self, game):
         """Animación de reparto de cartas a todos los jugadores antes de que aparezcan en la mano"""
@@ -832,12 +825,7 @@ class UI:
 
         card = local_player.hand[self.selected_card_idx]
 
-        valid_targets = []
-        for p_idx, player in enumerate(game.players):
-            for c_idx, combo in enumerate(player.combinations):
-                if game.can_add_to_combination(card, c_idx, p_idx):
-                    valid_targets.append((p_idx, c_idx))
-        return valid_targets
+        return game.combination_targets(card)
     
     def _render_fitting_text(self, text, rect, base_size=24):
         """Renderiza texto que se ajusta al ancho del rectángulo dado"""